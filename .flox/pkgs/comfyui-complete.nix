@@ -606,6 +606,49 @@ comfyui_work:
 YAML
     echo "Created $extra_paths"
   fi
+
+  # Collect unreferenced hash-named inputs (comfyui-inputs.py) at most once
+  # a day. Runs in the background so activation is not delayed.
+  local input_gc_marker="''${FLOX_ENV_CACHE:-$work_dir/.cache}/.input_gc_last"
+  if [ "''${COMFYUI_INPUT_GC:-1}" != "0" ] && [ -x "$script_dir/comfyui-inputs.py" ]; then
+    if [ ! -f "$input_gc_marker" ] || [ -n "$(find "$input_gc_marker" -mmin +1440 2>/dev/null)" ]; then
+      touch "$input_gc_marker"
+      nohup python3 "$script_dir/comfyui-inputs.py" gc \
+        --input-dir "''${COMFYUI_INPUT_DIR:-$work_dir/input}" \
+        >> "''${FLOX_ENV_CACHE:-$work_dir/.cache}/logs/input-gc.log" 2>&1 &
+    fi
+  fi
+
+  # Keep the torch.compile cache (comfyui-compile-cache.py) under its size
+  # limit, least recently used kernels first. Also at most once a day.
+  local compile_prune_marker="''${FLOX_ENV_CACHE:-$work_dir/.cache}/.compile_cache_prune_last"
+  if [ "''${COMFYUI_COMPILE_CACHE:-1}" != "0" ] && [ -x "$script_dir/comfyui-compile-cache.py" ]; then
+    if [ ! -f "$compile_prune_marker" ] || [ -n "$(find "$compile_prune_marker" -mmin +1440 2>/dev/null)" ]; then
+      touch "$compile_prune_marker"
+      nohup python3 "$script_dir/comfyui-compile-cache.py" prune \
+        --cache-dir "''${COMFYUI_COMPILE_CACHE_DIR:-''${FLOX_ENV_CACHE:-$work_dir/.cache}/compile-cache}" \
+        >> "''${FLOX_ENV_CACHE:-$work_dir/.cache}/logs/compile-cache.log" 2>&1 &
+    fi
+  fi
+
+  # Byte-compile the runtime, custom nodes and venv into comfyui-start's
+  # PYTHONPYCACHEPREFIX once per environment generation (comfyui-precompile.py).
+  local pycache_prefix="$FLOX_ENV_CACHE/pycache/$(basename "$(readlink -f "''${FLOX_ENV:-}")")"
+  if [ "''${COMFYUI_PYCACHE:-1}" != "0" ] && [ -n "''${FLOX_ENV:-}" ] && [ -n "''${FLOX_ENV_CACHE:-}" ] && \
+     [ -x "$venv/bin/python" ] && [ ! -f "$pycache_prefix/.complete" ]; then
+    local precompile_args=(build --prefix "$pycache_prefix")
+    [ -d "$FLOX_ENV_CACHE/.flox-pkgs" ] && precompile_args+=(--path "$FLOX_ENV_CACHE/.flox-pkgs")
+    echo "Byte-compiling ComfyUI in the background (log: $FLOX_ENV_CACHE/logs/precompile.log)"
+    nohup nice -n 10 "$venv/bin/python" "$script_dir/comfyui-precompile.py" "''${precompile_args[@]}" \
+      >> "$FLOX_ENV_CACHE/logs/precompile.log" 2>&1 &
+  fi
+
+  # Precompress the installed frontend for comfyui-start's --front-end-root
+  # (comfyui-web-assets.py); a no-op while the copy is current.
+  if [ "''${COMFYUI_STATIC_ASSETS:-1}" != "0" ] && [ -n "''${FLOX_ENV_CACHE:-}" ] && [ -x "$venv/bin/python" ]; then
+    nohup nice -n 10 "$venv/bin/python" "$script_dir/comfyui-web-assets.py" build \
+      >> "$FLOX_ENV_CACHE/logs/web-assets.log" 2>&1 &
+  fi
 }
 
 setup_comfyui
@@ -627,6 +670,10 @@ echo "    comfyui-download-wan22.py --variant i2v-14b   Wan 2.2 I2V-14B   (~33 G
 echo "    comfyui-download-hunyuan15.py        HunyuanVideo 1.5 I2V       (~21 GB)"
 echo "    comfyui-download-framepack.py        FramePack I2V              (~24 GB)"
 echo ""
+echo "  Several families at once (shared connections, shared files downloaded once):"
+echo "    comfyui-download.py --families sd15,flux,wan22"
+echo "    comfyui-download.py all"
+echo ""
 echo "  Run any script with --help or --dry-run for details."
 echo ""
 SETUP
@@ -663,6 +710,15 @@ SETUP
 #   COMFYUI_USER_DIR           - User directory (--user-directory)
 #   COMFYUI_TEMP_DIR           - Temp directory (--temp-directory)
 #   COMFYUI_DATABASE_URL       - Database URL (--database-url)
+#   COMFYUI_PREFETCH           - Workflows/models to warm into the page cache
+#   COMFYUI_PREFETCH_BUDGET    - Memory budget for prefetch (default: 50%)
+#   COMFYUI_PIN                - Workflows/models to stage into the RAM-backed pin dir
+#   COMFYUI_PIN_DIR            - Pin directory (default: /dev/shm/comfyui-pinned-$USER)
+#   COMFYUI_PIN_BUDGET         - Maximum bytes pinned (default: 40%)
+#   COMFYUI_PROFILE            - Workload profile for memory/cache flags (comfyui-tune.py)
+#   COMFYUI_COMPILE_CACHE      - Set to 0 to keep torch.compile caches in /tmp
+#   COMFYUI_PYCACHE            - Set to 0 to keep bytecode next to the sources
+#   COMFYUI_STATIC_ASSETS      - Set to 0 to serve the frontend package directly
 
 set -e
 
@@ -687,6 +743,12 @@ COMFYUI_ENABLE_MANAGER="''${COMFYUI_ENABLE_MANAGER:-1}"
 # Ensure service logs appear immediately
 export PYTHONUNBUFFERED=1
 
+# Bytecode for the read-only store sources goes to a writable tree keyed by
+# the Flox env's store path (filled ahead of time by comfyui-precompile.py)
+if [ "''${COMFYUI_PYCACHE:-1}" != "0" ] && [ -n "''${FLOX_ENV:-}" ]; then
+  export PYTHONPYCACHEPREFIX="$FLOX_ENV_CACHE/pycache/$(basename "$(readlink -f "$FLOX_ENV")")"
+fi
+
 # Build a selective PYTHONPATH that combines:
 #   - CUDA/MPS torch, torchvision, etc. from the Flox env (GPU-accelerated)
 #   - scipy, numpy from the bundled pythonEnv (clean, single-version)
@@ -769,11 +831,30 @@ args=(
 [ -n "''${COMFYUI_TEMP_DIR:-}" ]     && args+=(--temp-directory "$COMFYUI_TEMP_DIR")
 [ -n "''${COMFYUI_DATABASE_URL:-}" ] && args+=(--database-url "$COMFYUI_DATABASE_URL")
 
+# Pinned models (comfyui-pin-models.py): a generated config lists the
+# RAM-backed pin directory ahead of every other model folder. Written
+# before launch; the files themselves are staged in the background below.
+pin_models="$(dirname "''${BASH_SOURCE[0]}")/comfyui-pin-models.py"
+if [ -n "''${COMFYUI_PIN:-}" ] && [ -f "$pin_models" ]; then
+  pin_config="$FLOX_ENV_CACHE/pinned_model_paths.yaml"
+  if "$PYTHON" "$pin_models" config --config "$pin_config" >/dev/null 2>&1; then
+    args+=(--extra-model-paths-config "$pin_config")
+  fi
+fi
+
 # Add extra model paths config if the file exists
 if [ -f "''${COMFYUI_EXTRA_MODEL_PATHS:-}" ]; then
   args+=(--extra-model-paths-config "$COMFYUI_EXTRA_MODEL_PATHS")
 fi
 
+# Precompressed frontend copy (comfyui-web-assets.py), used only while the
+# frontend package it was built from is still the installed one
+front_end="$FLOX_ENV_CACHE/frontend/current"
+if [ "''${COMFYUI_STATIC_ASSETS:-1}" != "0" ] && [ -f "$front_end/.source" ] && \
+   [ -d "$(cat "$front_end/.source")" ]; then
+  args+=(--front-end-root "$front_end")
+fi
+
 # Force CPU mode if detected/requested
 if [ "$DEVICE" = "cpu" ]; then
   args+=(--cpu)
@@ -828,6 +909,51 @@ echo "  Python:  $PYTHON"
 echo "  Device:  $DEVICE"
 echo "  Listen:  $COMFYUI_LISTEN:$COMFYUI_PORT"
 
+# Memory-mode and cache flags for the declared workload (comfyui-tune.py).
+# The flags come on stdout; the reason for each choice goes to the log.
+tune="$(dirname "''${BASH_SOURCE[0]}")/comfyui-tune.py"
+if [ -n "''${COMFYUI_PROFILE:-}" ] && [ "$DEVICE" != "cpu" ] && [ -f "$tune" ]; then
+  echo "  Profile: $COMFYUI_PROFILE"
+  mapfile -t tuned < <("$PYTHON" "$tune" flags --profile "$COMFYUI_PROFILE" --device "$DEVICE")
+  args+=("''${tuned[@]}")
+fi
+
+# Persistent torch.compile caches (comfyui-compile-cache.py): Inductor,
+# Triton and the CUDA JIT cache live under $FLOX_ENV_CACHE, in a directory
+# keyed by torch version, ComfyUI version and device, instead of /tmp.
+compile_cache="$(dirname "''${BASH_SOURCE[0]}")/comfyui-compile-cache.py"
+if [ "''${COMFYUI_COMPILE_CACHE:-1}" != "0" ] && [ -f "$compile_cache" ]; then
+  while IFS='=' read -r name value; do
+    export "$name=$value"
+  done < <("$PYTHON" "$compile_cache" env --device "$DEVICE" 2>/dev/null)
+  [ -n "''${TORCHINDUCTOR_CACHE_DIR:-}" ] && echo "  Compile: $(dirname "$TORCHINDUCTOR_CACHE_DIR")"
+fi
+
+# Warm the page cache with the models used by COMFYUI_PREFETCH workflows
+# (comfyui-prefetch.py). Runs in the background at low priority while
+# ComfyUI imports, so the first job does not start on cold disk reads.
+if [ -n "''${COMFYUI_PREFETCH:-}" ]; then
+  prefetch="$(dirname "''${BASH_SOURCE[0]}")/comfyui-prefetch.py"
+  if [ -f "$prefetch" ]; then
+    mkdir -p "$FLOX_ENV_CACHE/logs"
+    low_prio=(nice -n 10)
+    command -v ionice &>/dev/null && low_prio+=(ionice -c 3)
+    "''${low_prio[@]}" "$PYTHON" "$prefetch" warm >> "$FLOX_ENV_CACHE/logs/prefetch.log" 2>&1 &
+    echo "  Prefetch: $COMFYUI_PREFETCH (budget ''${COMFYUI_PREFETCH_BUDGET:-50%}, log: $FLOX_ENV_CACHE/logs/prefetch.log)"
+  fi
+fi
+
+# Stage COMFYUI_PIN models into the pin directory. Copies are renamed into
+# place when complete, so ComfyUI reads the models directory until then;
+# files that do not fit in memory are skipped and stay on their normal path.
+if [ -n "''${COMFYUI_PIN:-}" ] && [ -f "$pin_models" ]; then
+  mkdir -p "$FLOX_ENV_CACHE/logs"
+  low_prio=(nice -n 10)
+  command -v ionice &>/dev/null && low_prio+=(ionice -c 3)
+  "''${low_prio[@]}" "$PYTHON" "$pin_models" stage >> "$FLOX_ENV_CACHE/logs/pin-models.log" 2>&1 &
+  echo "  Pin:     $COMFYUI_PIN (budget ''${COMFYUI_PIN_BUDGET:-40%}, log: $FLOX_ENV_CACHE/logs/pin-models.log)"
+fi
+
 exec "$PYTHON" "''${args[@]}"
 LAUNCHER
 
@@ -904,6 +1030,34 @@ START_SCRIPT
     cp ${../../scripts}/comfyui-download-*.py $out/bin/
     chmod +x $out/bin/comfyui-download-*.py
 
+    # Install runtime tools
+    #   comfyui-bench.py      - workflow benchmark runner (per-node timings, build diff)
+    #   comfyui-outputs.py    - output archiving, index and quota eviction
+    #   comfyui-inputs.py     - content-addressed input uploads and input GC
+    #   comfyui-prefetch.py   - page-cache warming for model files (used by comfyui-start)
+    #   comfyui-pin-models.py - RAM/hugepage staging of model files (used by comfyui-start)
+    #   comfyui-result-cache.py - caching /prompt proxy for identical graphs
+    #   comfyui-download.py   - multi-family asyncio downloader (reads the download scripts' file lists)
+    #   comfyui-mirror.py     - HuggingFace-compatible model mirror for a fleet of nodes
+    #   comfyui-convert.py    - streaming fp16/bf16 -> scaled fp8 conversion (used by comfyui-download --convert)
+    #   comfyui-split-checkpoint.py - split all-in-one checkpoints into diffusion model/CLIP/VAE files
+    #   comfyui-metrics.py    - Prometheus exporter sidecar (queue, jobs, node timings, memory)
+    #   comfyui-tune.py       - memory-mode/cache flags per workload profile (used by comfyui-start)
+    #   comfyui-compile-cache.py - persistent Inductor/Triton cache (used by comfyui-start and comfyui-setup)
+    #   comfyui-precompile.py - bytecode for the read-only runtime in PYTHONPYCACHEPREFIX (used by comfyui-setup)
+    #   comfyui-web-assets.py - precompressed frontend copy for --front-end-root (used by comfyui-setup/start)
+    #   comfyui-decode-bench.py - peak RAM of VAE Decode vs the chunked decode to disk (ComfyUI-StreamingVideo)
+    #   comfyui-tile-check.py - tiled upscaler (ComfyUI-TiledUpscale) vs untiled equivalence check
+    #   comfyui-queue.py      - durable SQLite job queue with crash recovery, fair multi-tenant scheduling and seed-sweep batching
+    for tool in comfyui-bench comfyui-outputs comfyui-inputs comfyui-prefetch comfyui-pin-models \
+                comfyui-result-cache comfyui-download comfyui-mirror comfyui-convert \
+                comfyui-split-checkpoint comfyui-metrics comfyui-tune comfyui-compile-cache \
+                comfyui-precompile comfyui-web-assets comfyui-decode-bench comfyui-tile-check \
+                comfyui-queue; do
+      cp ${../../scripts}/$tool.py $out/bin/
+      chmod +x $out/bin/$tool.py
+    done
+
     runHook postInstall
   '';
 
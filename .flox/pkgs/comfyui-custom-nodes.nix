@@ -18,6 +18,13 @@
 #   - ComfyUI_IPAdapter_plus: IPAdapter image-to-image conditioning
 #   - ComfyUI-IPAdapter-Flux: IPAdapter for FLUX models
 #   - ComfyUI-SafeCLIP-SDXL: Safe CLIP encoding for SDXL (vendored)
+#   - ComfyUI-TextEncodeCache: Disk-cached text encoding for T5/UMT5 (vendored)
+#   - ComfyUI-MetricsEvents: Execution events for comfyui-metrics (vendored)
+#   - ComfyUI-StaticAssets: Caching headers for the precompressed frontend (vendored)
+#   - ComfyUI-StreamingVideo: Chunked ffmpeg video encoding and chunked VAE decode to disk (vendored)
+#   - ComfyUI-TiledUpscale: Batched tiled upscale and refine (vendored)
+#   - ComfyUI-DetectionCache: Batched, cached Ultralytics detection (vendored)
+#   - ComfyUI-SeedBatch: Per-sample seeds for batched seed sweeps (vendored)
 #   - Comfyui-LayerForge: Photoshop-like layer editor for ComfyUI
 #
 # Note: ComfyUI-Manager is excluded (ships with ComfyUI now).
@@ -182,6 +189,41 @@ in stdenv.mkDerivation rec {
     mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-SafeCLIP-SDXL
     cp ${../../sources/ComfyUI-SafeCLIP-SDXL/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-SafeCLIP-SDXL/__init__.py
 
+    # Install vendored TextEncodeCache
+    echo "Installing ComfyUI-TextEncodeCache (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-TextEncodeCache
+    cp ${../../sources/ComfyUI-TextEncodeCache/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-TextEncodeCache/__init__.py
+
+    # Install vendored MetricsEvents
+    echo "Installing ComfyUI-MetricsEvents (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-MetricsEvents
+    cp ${../../sources/ComfyUI-MetricsEvents/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-MetricsEvents/__init__.py
+
+    # Install vendored StaticAssets
+    echo "Installing ComfyUI-StaticAssets (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-StaticAssets
+    cp ${../../sources/ComfyUI-StaticAssets/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-StaticAssets/__init__.py
+
+    # Install vendored StreamingVideo
+    echo "Installing ComfyUI-StreamingVideo (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-StreamingVideo
+    cp ${../../sources/ComfyUI-StreamingVideo/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-StreamingVideo/__init__.py
+
+    # Install vendored TiledUpscale
+    echo "Installing ComfyUI-TiledUpscale (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-TiledUpscale
+    cp ${../../sources/ComfyUI-TiledUpscale/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-TiledUpscale/__init__.py
+
+    # Install vendored DetectionCache
+    echo "Installing ComfyUI-DetectionCache (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-DetectionCache
+    cp ${../../sources/ComfyUI-DetectionCache/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-DetectionCache/__init__.py
+
+    # Install vendored SeedBatch
+    echo "Installing ComfyUI-SeedBatch (vendored)..."
+    mkdir -p $out/share/comfyui/custom_nodes/ComfyUI-SeedBatch
+    cp ${../../sources/ComfyUI-SeedBatch/__init__.py} $out/share/comfyui/custom_nodes/ComfyUI-SeedBatch/__init__.py
+
     # Pre-install ultimate-upscale-original for ComfyUI_UltimateSDUpscale
     # This script is normally downloaded at runtime, but Nix store is read-only
     echo "Pre-installing ultimate-upscale-original for UltimateSDUpscale..."
@@ -300,6 +342,13 @@ WASCONFIG
       - ComfyUI_IPAdapter_plus: IPAdapter image-to-image conditioning
       - ComfyUI-IPAdapter-Flux: IPAdapter for FLUX models
       - ComfyUI-SafeCLIP-SDXL: Safe CLIP encoding for SDXL
+      - ComfyUI-TextEncodeCache: Disk-cached text encoding for T5/UMT5
+      - ComfyUI-MetricsEvents: Execution events for comfyui-metrics
+      - ComfyUI-StaticAssets: Caching headers for the precompressed frontend
+      - ComfyUI-StreamingVideo: Chunked ffmpeg video encoding and chunked VAE decode to disk
+      - ComfyUI-TiledUpscale: Batched tiled upscale and refine
+      - ComfyUI-DetectionCache: Batched, cached Ultralytics detection
+      - ComfyUI-SeedBatch: Per-sample seeds for batched seed sweeps
       - Comfyui-LayerForge: Photoshop-like layer editor for ComfyUI
 
       Note: ComfyUI-Manager is excluded (now ships with ComfyUI).
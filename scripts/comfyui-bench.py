@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""Benchmark bundled ComfyUI API workflows with per-node timing."""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import signal
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+DESCRIPTION = """\
+Benchmark the bundled ComfyUI API workflows.
+
+Runs every API workflow at a fixed seed, a small image size and a reduced
+step count against a ComfyUI server started in --cpu mode, and records
+per-node execution times from the websocket 'executing'/'executed' events.
+Results are written as JSON so two builds can be compared with 'diff'.
+
+Commands:
+  run     Execute the workflows and write a results file
+  diff    Compare two results files and flag regressions
+
+Workflows whose models are not downloaded are reported as 'skipped'
+(ComfyUI rejects them during validation) and do not count as failures.
+Model and execution caches are cleared before every run, so timings
+include model loading -- the cost a user sees after an upgrade.
+"""
+
+EPILOG = """\
+environment variables:
+  FLOX_ENV             Flox environment (bundled workflows are read from here)
+  FLOX_ENV_CACHE       Environment cache (results go to $FLOX_ENV_CACHE/bench-results)
+  COMFYUI_BENCH_DIR    Override results directory
+
+examples:
+  comfyui-bench run                              Start a CPU server and run all workflows
+  comfyui-bench run --only sd15,sdxl             Run a subset of workflow families
+  comfyui-bench run --url http://127.0.0.1:8188  Use an already running server
+  comfyui-bench diff old.json new.json           Flag regressions between two builds
+  comfyui-bench diff old.json new.json --threshold 0.2
+
+Results are kept in the environment cache, whatever the current directory,
+so every build version has a baseline to diff against.
+"""
+
+# Inputs rewritten on every node that has them, to make runs repeatable and cheap
+SEED_INPUTS = ("seed", "noise_seed")
+SIZE_INPUTS = ("width", "height", "tile_width", "tile_height")
+STEP_INPUTS = ("steps",)
+
+# Images referenced by LoadImage nodes in the bundled API workflows
+INPUT_IMAGES = ("input.png", "mask.png")
+INPUT_SIZE = 1024  # their width/height when sizes are not capped
+
+DEFAULT_PORT = 8199
+SERVER_START_TIMEOUT = 300
+RESULTS_FORMAT = 1
+
+
+def get_workflows_dir(override=None):
+    if override:
+        return Path(override)
+    flox_env = os.environ.get("FLOX_ENV")
+    if flox_env:
+        return Path(flox_env) / "share/comfyui/workflows/api"
+    # Fall back to the source tree when run from a checkout
+    return Path(__file__).resolve().parent.parent / "sources/workflows/api"
+
+
+def get_results_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_BENCH_DIR"):
+        return Path(os.environ["COMFYUI_BENCH_DIR"])
+    return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui")) / "bench-results"
+
+
+def read_build_marker():
+    """Return key/value pairs from the comfyui-complete build version marker."""
+    flox_env = os.environ.get("FLOX_ENV")
+    if not flox_env:
+        return {}
+    markers = sorted(Path(flox_env, "share/comfyui-complete").glob("flox-build-version-*"))
+    if not markers:
+        return {}
+    info = {}
+    for line in markers[-1].read_text().splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            info[key.strip()] = value.strip()
+    return info
+
+
+def find_workflows(workflows_dir, only=None):
+    """Return (name, path) for every API workflow, optionally filtered by family."""
+    families = {f.strip() for f in only.split(",")} if only else None
+    found = []
+    for path in sorted(workflows_dir.glob("*/*.json")):
+        family = path.parent.name
+        if families and family not in families and family.replace(".", "") not in families:
+            continue
+        found.append((f"{family}/{path.stem}", path))
+    return found
+
+
+def prepare_graph(graph, seed, size, steps):
+    """Pin seeds and shrink sizes/steps so runs are repeatable and CPU-friendly; size None keeps sizes."""
+    graph = json.loads(json.dumps(graph))
+    for node in graph.values():
+        inputs = node.get("inputs", {})
+        for key, value in list(inputs.items()):
+            if isinstance(value, list):
+                continue  # link to another node
+            if key in SEED_INPUTS:
+                inputs[key] = seed
+            elif key in SIZE_INPUTS and isinstance(value, int) and size:
+                inputs[key] = min(value, size)
+            elif key in STEP_INPUTS and isinstance(value, int):
+                inputs[key] = min(value, steps)
+    return graph
+
+
+def make_png(width, height, rgb):
+    """Encode a solid-colour RGB PNG (stdlib only)."""
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(rgb) * width
+    raw = zlib.compress(row * height)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+
+class NodeTimer:
+    """Turn the websocket event stream for one prompt into per-node durations."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = {}
+        self.cached = []
+        self.current = None
+        self.started = None
+        self.start_time = None
+        self.end_time = None
+        self.error = None
+
+    def _close(self, now):
+        if self.current is not None:
+            entry = self.nodes.setdefault(self.current, {
+                "class_type": self.graph.get(self.current, {}).get("class_type", "?"),
+                "seconds": 0.0,
+            })
+            entry["seconds"] += now - self.started
+        self.current = None
+
+    def feed(self, msg_type, data, now):
+        """Consume one event. Returns True once the prompt has finished."""
+        if msg_type == "execution_start":
+            self.start_time = now
+        elif msg_type == "execution_cached":
+            self.cached.extend(data.get("nodes", []))
+        elif msg_type == "executing":
+            self._close(now)
+            node = data.get("node")
+            if node is None:
+                self.end_time = now
+                return True
+            self.current, self.started = node, now
+        elif msg_type == "executed":
+            if data.get("node") == self.current:
+                self._close(now)
+        elif msg_type == "execution_success":
+            self._close(now)
+            self.end_time = now
+            return True
+        elif msg_type in ("execution_error", "execution_interrupted"):
+            self._close(now)
+            self.end_time = now
+            self.error = data.get("exception_message") or msg_type
+            return True
+        return False
+
+
+async def wait_for_server(session, url, proc=None, timeout=SERVER_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"ComfyUI exited with status {proc.returncode} during startup")
+        try:
+            async with session.get(f"{url}/system_stats") as resp:
+                if resp.status == 200:
+                    return await resp.json()
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for ComfyUI at {url}")
+
+
+async def upload_inputs(session, url, size):
+    import aiohttp
+
+    size = size or INPUT_SIZE
+    for name, rgb in zip(INPUT_IMAGES, ((128, 96, 64), (255, 255, 255))):
+        form = aiohttp.FormData()
+        form.add_field("image", make_png(size, size, rgb), filename=name, content_type="image/png")
+        form.add_field("overwrite", "true")
+        async with session.post(f"{url}/upload/image", data=form) as resp:
+            resp.raise_for_status()
+
+
+async def run_once(session, url, graph, timeout, cold=True):
+    """Queue one graph and time it. Returns a result dict for a single run."""
+    client_id = uuid.uuid4().hex
+    timer = NodeTimer(graph)
+
+    # Drop models and cached outputs so every run starts cold
+    if cold:
+        async with session.post(f"{url}/free", json={"unload_models": True, "free_memory": True}):
+            pass
+
+    async with session.ws_connect(f"{url}/ws?clientId={client_id}") as ws:
+        async with session.post(f"{url}/prompt", json={"prompt": graph, "client_id": client_id}) as resp:
+            body = await resp.json(content_type=None)
+            if resp.status != 200:
+                return {"status": "skipped", "reason": describe_validation_error(body)}
+        prompt_id = body["prompt_id"]
+        submitted = time.monotonic()
+
+        deadline = submitted + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                async with session.post(f"{url}/interrupt"):
+                    pass
+                return {"status": "timeout", "reason": f"no result after {timeout}s"}
+            msg = await ws.receive(timeout=remaining)
+            if msg.type.name != "TEXT":
+                if msg.type.name in ("CLOSE", "CLOSED", "ERROR"):
+                    return {"status": "error", "reason": "websocket closed"}
+                continue  # binary preview frames
+            event = json.loads(msg.data)
+            data = event.get("data") or {}
+            if data.get("prompt_id") not in (None, prompt_id):
+                continue
+            if timer.feed(event.get("type"), data, time.monotonic()):
+                break
+
+    if timer.error:
+        return {"status": "error", "reason": timer.error}
+    return {
+        "status": "ok",
+        "wall_seconds": round(timer.end_time - submitted, 4),
+        "queue_seconds": round((timer.start_time or submitted) - submitted, 4),
+        "nodes": {k: {**v, "seconds": round(v["seconds"], 4)} for k, v in timer.nodes.items()},
+        "cached": timer.cached,
+    }
+
+
+def describe_validation_error(body):
+    if not isinstance(body, dict):
+        return str(body)
+    error = body.get("error", {})
+    reasons = [error.get("message", "validation failed")]
+    for node_id, node_err in (body.get("node_errors") or {}).items():
+        for err in node_err.get("errors", []):
+            reasons.append(f"{node_id}: {err.get('details') or err.get('message')}")
+    return "; ".join(reasons)
+
+
+def summarise(runs):
+    """Median per-node and wall times over successful runs."""
+    ok = [r for r in runs if r["status"] == "ok"]
+    if not ok:
+        return {"status": runs[-1]["status"], "reason": runs[-1].get("reason", "")}
+    nodes = {}
+    for node_id in ok[0]["nodes"]:
+        samples = [r["nodes"][node_id]["seconds"] for r in ok if node_id in r["nodes"]]
+        nodes[node_id] = {
+            "class_type": ok[0]["nodes"][node_id]["class_type"],
+            "seconds": round(statistics.median(samples), 4),
+        }
+    return {
+        "status": "ok",
+        "wall_seconds": round(statistics.median(r["wall_seconds"] for r in ok), 4),
+        "wall_samples": [r["wall_seconds"] for r in ok],
+        "nodes": nodes,
+    }
+
+
+def start_server(port, tmp_dir, device="cpu", profile=None):
+    """Launch comfyui-start (CPU mode by default) with scratch input/output directories."""
+    launcher = shutil.which("comfyui-start")
+    if launcher is None:
+        raise RuntimeError("comfyui-start not found on PATH (activate the Flox environment or pass --url)")
+    env = dict(os.environ)
+    env.update({
+        "COMFYUI_DEVICE": device,
+        "COMFYUI_LISTEN": "127.0.0.1",
+        "COMFYUI_PORT": str(port),
+        "COMFYUI_ENABLE_MANAGER": "0",
+        "COMFYUI_INPUT_DIR": str(tmp_dir / "input"),
+        "COMFYUI_OUTPUT_DIR": str(tmp_dir / "output"),
+        "COMFYUI_TEMP_DIR": str(tmp_dir / "temp"),
+    })
+    env.pop("COMFYUI_PROFILE", None)
+    if profile:
+        env["COMFYUI_PROFILE"] = profile
+    log = open(tmp_dir / "comfyui.log", "w")
+    return subprocess.Popen([launcher], env=env, stdout=log, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+
+
+def stop_server(proc):
+    if proc is None or proc.poll() is not None:
+        return
+    os.killpg(proc.pid, signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+async def run_benchmarks(args, workflows):
+    import aiohttp
+
+    proc = None
+    tmp_dir = Path(tempfile.mkdtemp(prefix="comfyui-bench-"))
+    url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    try:
+        if not args.url:
+            device = getattr(args, "device", "cpu")
+            print(f"  Starting ComfyUI ({'--cpu' if device == 'cpu' else device}) on {url} ...")
+            proc = start_server(args.port, tmp_dir, device, getattr(args, "profile", None))
+        async with aiohttp.ClientSession() as session:
+            stats = await wait_for_server(session, url, proc)
+            await upload_inputs(session, url, args.size)
+
+            results = {}
+            for name, path in workflows:
+                graph = prepare_graph(json.loads(path.read_text()), args.seed, args.size, args.steps)
+                runs = []
+                for i in range(args.warmup + args.repeat):
+                    result = await run_once(session, url, graph, args.timeout, getattr(args, "cold", True))
+                    if result["status"] != "ok":
+                        runs = [result]
+                        break
+                    if i >= args.warmup:
+                        runs.append(result)
+                results[name] = summarise(runs)
+                status = results[name]["status"]
+                if status == "ok":
+                    print(f"    {name:<40s} {results[name]['wall_seconds']:>9.2f}s")
+                else:
+                    print(f"    {name:<40s} {status:>10s}  {results[name].get('reason', '')[:60]}")
+            return stats, results
+    finally:
+        stop_server(proc)
+        if proc is not None and args.keep_logs:
+            print(f"  Server log: {tmp_dir / 'comfyui.log'}")
+        else:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def cmd_run(args):
+    workflows_dir = get_workflows_dir(args.workflows_dir)
+    workflows = find_workflows(workflows_dir, args.only)
+    results_dir = get_results_dir(args.output_dir)
+
+    print()
+    print("=" * 70)
+    print("  ComfyUI workflow benchmark")
+    print("=" * 70)
+    print()
+    print(f"  Workflows:   {workflows_dir} ({len(workflows)} found)")
+    print(f"  Settings:    seed={args.seed} size<={args.size} steps<={args.steps}")
+    print(f"  Runs:        {args.warmup} warm-up + {args.repeat} measured")
+    print(f"  Results:     {results_dir}")
+    print()
+
+    if not workflows:
+        print("  ERROR: no API workflows found.")
+        sys.exit(1)
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("ERROR: aiohttp is not installed.")
+        print("  Run this script with the ComfyUI venv python, or: pip install aiohttp")
+        sys.exit(1)
+
+    try:
+        stats, results = asyncio.run(run_benchmarks(args, workflows))
+    except RuntimeError as e:
+        print(f"\n  ERROR: {e}")
+        sys.exit(1)
+
+    system = stats.get("system", {})
+    build = read_build_marker()
+    label = args.label or build.get("package-version") or system.get("comfyui_version", "unknown")
+    report = {
+        "format": RESULTS_FORMAT,
+        "label": label,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "comfyui_version": system.get("comfyui_version"),
+        "pytorch_version": system.get("pytorch_version"),
+        "python_version": system.get("python_version"),
+        "build": build,
+        "host": platform.node(),
+        "device": [d.get("name") for d in stats.get("devices", [])],
+        "settings": {"seed": args.seed, "size": args.size, "steps": args.steps,
+                     "repeat": args.repeat, "warmup": args.warmup},
+        "workflows": results,
+    }
+
+    results_dir.mkdir(parents=True, exist_ok=True)
+    out_path = results_dir / f"bench-{label.replace('/', '_')}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    ok = sum(1 for r in results.values() if r["status"] == "ok")
+    print()
+    print(f"  {ok}/{len(results)} workflows completed")
+    print(f"  Results written to {out_path}")
+    print()
+
+
+def node_type_totals(workflow):
+    totals = {}
+    for node in workflow.get("nodes", {}).values():
+        totals[node["class_type"]] = totals.get(node["class_type"], 0.0) + node["seconds"]
+    return totals
+
+
+def compare(old, new, threshold, min_seconds):
+    """Yield (kind, name, old_s, new_s, ratio, regressed) rows for two reports."""
+    for name in sorted(set(old["workflows"]) | set(new["workflows"])):
+        a, b = old["workflows"].get(name), new["workflows"].get(name)
+        if not a or not b or a["status"] != "ok" or b["status"] != "ok":
+            yield ("workflow", name, a and a.get("wall_seconds"), b and b.get("wall_seconds"), None, False)
+            continue
+        for kind, key, old_s, new_s in [("workflow", name, a["wall_seconds"], b["wall_seconds"])] + [
+            ("node", f"{name} :: {t}", node_type_totals(a).get(t, 0.0), s)
+            for t, s in sorted(node_type_totals(b).items())
+        ]:
+            ratio = (new_s / old_s) if old_s else None
+            regressed = (new_s - old_s) >= min_seconds and ratio is not None and ratio > 1 + threshold
+            yield (kind, key, old_s, new_s, ratio, regressed)
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def cmd_diff(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print()
+    print("=" * 70)
+    print(f"  Benchmark diff: {old.get('label')}  ->  {new.get('label')}")
+    print("=" * 70)
+    print()
+    if old.get("settings") != new.get("settings"):
+        print("  WARNING: benchmark settings differ; timings may not be comparable")
+        print()
+
+    regressions = 0
+    for kind, name, old_s, new_s, ratio, regressed in compare(old, new, args.threshold, args.min_seconds):
+        if kind == "node" and not (regressed or args.verbose):
+            continue
+        if ratio is None:
+            print(f"  {'':2s}{name:<52s} {format_seconds(old_s):>9s} {format_seconds(new_s):>9s}  (not comparable)")
+            continue
+        flag = "!!" if regressed else "  "
+        regressions += regressed
+        print(f"  {flag}{name:<52s} {old_s:>8.2f}s {new_s:>8.2f}s  {(ratio - 1) * 100:+6.1f}%")
+
+    print()
+    if regressions:
+        print(f"  {regressions} regression(s) above {args.threshold:.0%} (and >= {args.min_seconds}s)")
+        print()
+        sys.exit(1)
+    print(f"  No regressions above {args.threshold:.0%}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-bench",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the bundled API workflows and record timings")
+    run.add_argument("--url", type=str, default=None,
+                     help="use a running ComfyUI server instead of starting one with --cpu")
+    run.add_argument("--port", type=int, default=DEFAULT_PORT,
+                     help=f"port for the benchmark server (default: {DEFAULT_PORT})")
+    run.add_argument("--workflows-dir", type=str, default=None,
+                     help="API workflow directory (default: $FLOX_ENV/share/comfyui/workflows/api)")
+    run.add_argument("--only", type=str, default=None,
+                     help="comma-separated workflow families to run (e.g. sd15,sdxl)")
+    run.add_argument("--seed", type=int, default=42, help="fixed seed for every sampler (default: 42)")
+    run.add_argument("--size", type=int, default=256, help="maximum width/height/tile size (default: 256)")
+    run.add_argument("--steps", type=int, default=4, help="maximum sampler steps (default: 4)")
+    run.add_argument("--repeat", type=int, default=3, help="measured runs per workflow (default: 3)")
+    run.add_argument("--warmup", type=int, default=0, help="discarded runs per workflow (default: 0)")
+    run.add_argument("--timeout", type=int, default=1800, help="per-run timeout in seconds (default: 1800)")
+    run.add_argument("--label", type=str, default=None,
+                     help="label for this result set (default: package version of the build)")
+    run.add_argument("--output-dir", type=str, default=None,
+                     help="results directory (default: $COMFYUI_BENCH_DIR or $FLOX_ENV_CACHE/bench-results)")
+    run.add_argument("--keep-logs", action="store_true", help="keep the benchmark server log")
+    run.set_defaults(func=cmd_run)
+
+    diff = sub.add_parser("diff", help="compare two results files")
+    diff.add_argument("old", help="baseline results JSON")
+    diff.add_argument("new", help="candidate results JSON")
+    diff.add_argument("--threshold", type=float, default=0.10,
+                      help="relative slowdown that counts as a regression (default: 0.10)")
+    diff.add_argument("--min-seconds", type=float, default=0.05,
+                      help="ignore slowdowns smaller than this many seconds (default: 0.05)")
+    diff.add_argument("-v", "--verbose", action="store_true", help="show every node type, not only regressions")
+    diff.set_defaults(func=cmd_diff)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Persistent torch.compile (Inductor / Triton) cache for ComfyUI."""
+import argparse
+import asyncio
+import importlib.metadata
+import importlib.util
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DESCRIPTION = """\
+Keep torch.compile's caches across ComfyUI restarts.
+
+TorchCompileModel (and custom nodes that call torch.compile) compile the
+diffusion model with Inductor. The generated kernels, FX graphs, Triton
+binaries and autotuning results go to /tmp/torchinductor_$USER and
+~/.triton by default, which service restarts, reboots and private /tmp
+directories throw away -- so every compiled path recompiles from scratch.
+
+comfyui-start points the caches at a directory under $FLOX_ENV_CACHE,
+one per torch version, ComfyUI version and device, e.g.
+
+  compile-cache/torch-2.8.0+cu128_comfyui-0.18.3_cuda-sm89/
+    inductor/   TORCHINDUCTOR_CACHE_DIR (FX graph, AOT autograd, autotune)
+    triton/     TRITON_CACHE_DIR
+    cuda/       CUDA_CACHE_PATH (driver PTX JIT cache)
+
+A key is only reused by the exact combination that wrote it, so an
+upgrade starts a fresh directory instead of loading stale kernels. Old
+directories are evicted first when the cache is pruned.
+
+Commands:
+  env      Print the environment for the current key (used by comfyui-start)
+  status   List cache directories and sizes
+  prune    Evict least recently used entries above --max-bytes
+  warmup   Compile the bundled workflows into the cache; --measure times
+           a cold compile against a warm one
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_COMPILE_CACHE_DIR   Cache root (default: $FLOX_ENV_CACHE/compile-cache)
+  COMFYUI_COMPILE_CACHE_MAX   Size limit for prune (default: 20G)
+  COMFYUI_COMPILE_CACHE       Set to 0 to leave torch's default cache locations alone
+
+examples:
+  comfyui-compile-cache status
+  comfyui-compile-cache prune --max-bytes 10G
+  comfyui-compile-cache warmup --only sdxl --device gpu       Fill the cache for SDXL
+  comfyui-compile-cache warmup --measure --only sd15 --size 256   Cold vs warm compile, CPU mode
+
+warmup starts ComfyUI through comfyui-start and runs each bundled
+workflow once with a TorchCompileModel node in front of every sampler,
+at the workflow's own width and height: Inductor guards on input shapes,
+so kernels compiled at a smaller size are not used by real jobs. --size
+caps the sizes (e.g. for a quick --measure on CPU).
+In CPU mode Inductor compiles C++ kernels, which needs a C compiler on
+PATH. comfyui-setup prunes the cache at most once a day.
+"""
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+CACHE_SUBDIRS = ("inductor", "triton", "cuda")
+CUDA_CACHE_MAXSIZE = 4 * 1024 ** 3 - 1  # the driver's upper limit
+WARMUP_PORT = 8198
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def format_size(n):
+    return f"{n / 1024 ** 3:.1f} GB" if n >= 1024 ** 3 else f"{n / 1024 ** 2:.0f} MB"
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_cache_root(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_COMPILE_CACHE_DIR"):
+        return Path(os.environ["COMFYUI_COMPILE_CACHE_DIR"])
+    if os.environ.get("FLOX_ENV_CACHE"):
+        return Path(os.environ["FLOX_ENV_CACHE"]) / "compile-cache"
+    return Path.home() / ".cache/comfyui/compile-cache"
+
+
+def torch_version():
+    try:
+        return importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        return "none"
+
+
+def comfyui_version():
+    runtime = Path(os.environ.get("FLOX_ENV_CACHE", "")) / "comfyui-runtime" / "comfyui_version.py"
+    try:
+        match = re.search(r'__version__\s*=\s*["\']([^"\']+)', runtime.read_text())
+        return match.group(1) if match else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def device_tag(device):
+    """cpu-x86_64, cuda-sm89, mps-arm64, ... without importing torch when possible."""
+    if device in ("cpu", "mps"):
+        return f"{device}-{platform.machine()}"
+    if shutil.which("nvidia-smi"):
+        try:
+            out = subprocess.run(["nvidia-smi", "--query-gpu=compute_cap", "--format=csv,noheader", "--id=0"],
+                                 capture_output=True, text=True, timeout=10, check=True).stdout.strip()
+            if out:
+                return "cuda-sm" + out.replace(".", "")
+        except (OSError, subprocess.SubprocessError):
+            pass
+    try:
+        import torch
+        if torch.cuda.is_available():
+            major, minor = torch.cuda.get_device_capability(0)
+            arch = "rocm-" if torch.version.hip else "cuda-sm"
+            return f"{arch}{major}{minor}"
+    except Exception:
+        pass
+    return device
+
+
+def cache_key(device):
+    key = f"torch-{torch_version()}_comfyui-{comfyui_version()}_{device_tag(device)}"
+    return re.sub(r"[^A-Za-z0-9._+-]", "_", key)
+
+
+def cache_env(root, key):
+    base = root / key
+    for sub in CACHE_SUBDIRS:
+        (base / sub).mkdir(parents=True, exist_ok=True)
+    os.utime(base)  # marks the key as in use for prune
+    return {
+        "TORCHINDUCTOR_CACHE_DIR": str(base / "inductor"),
+        "TORCHINDUCTOR_FX_GRAPH_CACHE": "1",
+        "TORCHINDUCTOR_AUTOGRAD_CACHE": "1",
+        "TRITON_CACHE_DIR": str(base / "triton"),
+        "CUDA_CACHE_PATH": str(base / "cuda"),
+        "CUDA_CACHE_MAXSIZE": str(CUDA_CACHE_MAXSIZE),
+    }
+
+
+def last_used(path):
+    st = path.stat()
+    return max(st.st_atime, st.st_mtime)
+
+
+def tree_size(path):
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file() and not p.is_symlink())
+
+
+def cache_entries(root):
+    """Eviction units: (last use, bytes, path).
+
+    Inductor entries are single files; a Triton kernel is a directory of
+    binaries plus a group manifest, so it goes as a whole; the CUDA
+    driver cache keeps its own index and is only dropped as a whole.
+    """
+    entries = []
+    for key_dir in root.iterdir() if root.is_dir() else ():
+        if not key_dir.is_dir():
+            continue
+        inductor, triton, cuda = (key_dir / sub for sub in CACHE_SUBDIRS)
+        if inductor.is_dir():
+            for path in inductor.rglob("*"):
+                if path.is_file() and not path.name.endswith(".lock"):
+                    entries.append((last_used(path), path.stat().st_size, path))
+        if triton.is_dir():
+            for path in triton.iterdir():
+                newest = max((last_used(p) for p in path.rglob("*") if p.is_file()), default=last_used(path)) \
+                    if path.is_dir() else last_used(path)
+                entries.append((newest, tree_size(path), path))
+        if cuda.is_dir() and any(cuda.iterdir()):
+            newest = max((last_used(p) for p in cuda.rglob("*") if p.is_file()), default=last_used(cuda))
+            entries.append((newest, tree_size(cuda), cuda))
+    return entries
+
+
+def prune(root, max_bytes, current_key=None, dry_run=False):
+    """Evict least recently used entries, other keys first. Returns (entries, bytes) removed."""
+    entries = cache_entries(root)
+    total = sum(size for _, size, _ in entries)
+    # Entries of other torch/ComfyUI/device combinations go before any entry of the current one
+    entries.sort(key=lambda e: (current_key is not None and e[2].relative_to(root).parts[0] == current_key, e[0]))
+    removed = freed = 0
+    for _, size, path in entries:
+        if total - freed <= max_bytes:
+            break
+        if not dry_run:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+        removed += 1
+        freed += size
+    if not dry_run and root.is_dir():
+        for directory in sorted((p for p in root.rglob("*") if p.is_dir()), key=lambda p: len(p.parts), reverse=True):
+            if directory.parent == root and directory.name == current_key:
+                continue
+            try:
+                directory.rmdir()  # only succeeds when empty
+            except OSError:
+                pass
+    return removed, freed
+
+
+def compiled_graph(graph):
+    """Copy of an API graph with a TorchCompileModel node feeding each final model consumer.
+
+    A node that takes a 'model' input but whose outputs never feed another
+    'model' input (KSampler, UltimateSDUpscale, FaceDetailer, ...) is a
+    final consumer; its model source is compiled once.
+    """
+    graph = json.loads(json.dumps(graph))
+    model_sources = {tuple(node["inputs"]["model"]) for node in graph.values()
+                     if isinstance(node.get("inputs", {}).get("model"), list)}
+    feeds_model = {source[0] for source in model_sources}
+    final = {tuple(node["inputs"]["model"]) for node_id, node in graph.items()
+             if isinstance(node.get("inputs", {}).get("model"), list) and node_id not in feeds_model}
+    next_id = max(int(node_id) for node_id in graph if node_id.isdigit()) + 1
+    compiled = {}
+    for source in sorted(final):
+        compiled[source] = str(next_id)
+        graph[str(next_id)] = {"inputs": {"model": list(source), "backend": "inductor"},
+                               "class_type": "TorchCompileModel", "_meta": {"title": "TorchCompileModel"}}
+        next_id += 1
+    for node_id, node in graph.items():
+        value = node.get("inputs", {}).get("model")
+        if isinstance(value, list) and tuple(value) in compiled and node_id not in compiled.values():
+            node["inputs"]["model"] = [compiled[tuple(value)], 0]
+    return graph
+
+
+async def run_pass(bench, args, workflows, label):
+    """Start a fresh ComfyUI and run every (compiled) workflow once; returns {name: result}."""
+    run_args = argparse.Namespace(url=None, port=args.port, seed=42, size=args.size, steps=args.steps,
+                                  repeat=1, warmup=0, timeout=args.timeout, keep_logs=args.keep_logs,
+                                  device=args.device, cold=False)
+    print(f"  [{label}]")
+    try:
+        _, results = await bench.run_benchmarks(run_args, workflows)
+    except RuntimeError as e:
+        print(f"    ERROR: {e}")
+        results = {}
+    print()
+    return results
+
+
+def cmd_warmup(args, root):
+    bench = load_sibling("comfyui-bench")
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("ERROR: aiohttp is not installed (run this with the ComfyUI venv python).")
+        sys.exit(1)
+
+    tmp = Path(tempfile.mkdtemp(prefix="comfyui-compile-"))
+    try:
+        workflows = []
+        for name, path in bench.find_workflows(bench.get_workflows_dir(args.workflows_dir), args.only):
+            target = tmp / "workflows" / path.parent.name / path.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(json.dumps(compiled_graph(json.loads(path.read_text()))))
+            workflows.append((name, target))
+        if not workflows:
+            print("  ERROR: no API workflows found.")
+            sys.exit(1)
+
+        print()
+        print("=" * 70)
+        print("  torch.compile warm-up")
+        print("=" * 70)
+        size = f"size<={args.size}" if args.size else "workflow sizes"
+        print(f"  Workflows: {len(workflows)}  (device {args.device}, {size}, steps<={args.steps})")
+        if args.measure:
+            # Two fresh servers on the same, initially empty cache: the first compiles, the second loads
+            cache_dir = tmp / "cache"
+            print(f"  Cache:     {cache_dir} (temporary)")
+            print()
+            os.environ["COMFYUI_COMPILE_CACHE_DIR"] = str(cache_dir)
+            cold = asyncio.run(run_pass(bench, args, workflows, "cold: empty cache"))
+            warm = asyncio.run(run_pass(bench, args, workflows, "warm: new process, same cache"))
+            print(f"  {'workflow':<36s}{'cold':>10s}{'warm':>10s}{'saved':>10s}")
+            for name, _ in workflows:
+                a, b = cold.get(name, {}), warm.get(name, {})
+                if a.get("status") == "ok" and b.get("status") == "ok":
+                    saved = a["wall_seconds"] - b["wall_seconds"]
+                    print(f"  {name:<36s}{a['wall_seconds']:>9.2f}s{b['wall_seconds']:>9.2f}s{saved:>9.2f}s")
+                else:
+                    print(f"  {name:<36s}{a.get('status', '-'):>10s}{b.get('status', '-'):>10s}")
+        else:
+            os.environ["COMFYUI_COMPILE_CACHE_DIR"] = str(root)
+            print(f"  Cache:     {root}")
+            print()
+            asyncio.run(run_pass(bench, args, workflows, "compile"))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cmd_env(args, root):
+    if os.environ.get("COMFYUI_COMPILE_CACHE") == "0":
+        return
+    for name, value in cache_env(root, cache_key(args.device)).items():
+        print(f"{name}={value}")
+
+
+def cmd_status(args, root):
+    current = cache_key(args.device) if args.device != "auto" else None
+    print(f"  Compile cache: {root}")
+    if not root.is_dir():
+        print("  (empty)")
+        return
+    total = 0
+    for key_dir in sorted(root.iterdir(), key=last_used, reverse=True):
+        if not key_dir.is_dir():
+            continue
+        sizes = {sub: tree_size(key_dir / sub) if (key_dir / sub).exists() else 0 for sub in CACHE_SUBDIRS}
+        total += sum(sizes.values())
+        age = (time.time() - last_used(key_dir)) / 86400
+        mark = "*" if key_dir.name == current else " "
+        print(f"  {mark} {key_dir.name:<56s} {format_size(sum(sizes.values())):>9s}  "
+              + "  ".join(f"{sub} {format_size(size)}" for sub, size in sizes.items())
+              + f"  (used {age:.0f}d ago)")
+    print(f"  Total: {format_size(total)}")
+
+
+def cmd_prune(args, root):
+    current = cache_key(args.device) if args.device != "auto" else None
+    removed, freed = prune(root, parse_size(args.max_bytes), current, args.dry_run)
+    verb = "Would evict" if args.dry_run else "Evicted"
+    print(f"  {verb} {removed} entries ({format_size(freed)}) from {root}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-compile-cache",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=("env", "status", "prune", "warmup"))
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="cache root (default: $FLOX_ENV_CACHE/compile-cache)")
+    parser.add_argument("--device", type=str, default=None,
+                        help="device the key is for: cpu, cuda, mps, ... (default: $COMFYUI_DEVICE; warmup: cpu)")
+    parser.add_argument("--max-bytes", type=str, default=os.environ.get("COMFYUI_COMPILE_CACHE_MAX", "20G"),
+                        help="prune: size limit (default: 20G)")
+    parser.add_argument("--dry-run", action="store_true", help="prune: only report")
+    parser.add_argument("--measure", action="store_true",
+                        help="warmup: compare a cold and a warm compile on a temporary cache")
+    parser.add_argument("--only", type=str, default=None, help="warmup: workflow families (e.g. sd15,sdxl)")
+    parser.add_argument("--workflows-dir", type=str, default=None, help="warmup: API workflow directory")
+    parser.add_argument("--port", type=int, default=WARMUP_PORT, help=f"warmup: server port (default: {WARMUP_PORT})")
+    parser.add_argument("--size", type=int, default=None,
+                        help="warmup: maximum width/height (default: each workflow's own size)")
+    parser.add_argument("--steps", type=int, default=2, help="warmup: maximum sampler steps (default: 2)")
+    parser.add_argument("--timeout", type=int, default=3600, help="warmup: per-workflow timeout (default: 3600)")
+    parser.add_argument("--keep-logs", action="store_true", help="warmup: keep the server logs")
+    args = parser.parse_args()
+
+    if args.device is None:
+        args.device = "cpu" if args.command == "warmup" else os.environ.get("COMFYUI_DEVICE", "auto")
+    commands = {"env": cmd_env, "status": cmd_status, "prune": cmd_prune, "warmup": cmd_warmup}
+    commands[args.command](args, get_cache_root(args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
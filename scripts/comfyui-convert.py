@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Convert fp16/bf16 safetensors models to scaled fp8 with bounded memory."""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+DESCRIPTION = """\
+Convert a safetensors model to fp8 (e4m3fn) tensor by tensor.
+
+wan2.2_ti2v_5B_fp16 and t5xxl_fp16 are twice the size they need to be on
+GPUs where fp8 weights fit better. Converting them by loading them in
+ComfyUI needs the whole model in RAM; this tool rewrites the file with a
+small, fixed amount of memory instead:
+
+  1. read the safetensors header and compute the output header up front
+  2. stream each tensor from the memory-mapped input in chunks
+  3. linear weights (2-D '.weight' tensors, except embedding tables:
+     token and position embeddings and T5's relative_attention_bias) are
+     scaled by amax/448, cast to float8_e4m3fn and written with a
+     '<layer>.scale_weight' tensor
+  4. everything else (biases, norms, convolutions, embeddings) is copied
+     unchanged; ComfyUI's scaled fp8 ops only rescale Linear layers
+  5. like safetensors.save_file, the output is laid out by element size
+     (F32 scales, then F16/BF16 tensors, then fp8 weights), so every
+     tensor is aligned for loaders that view the mmap directly
+
+This is the 'scaled fp8' layout of Comfy-Org's *_fp8_e4m3fn_scaled files:
+a 'scaled_fp8' marker tensor tells ComfyUI to multiply the scales back in,
+and UNETLoader / CLIPLoader load the result like any other model.
+
+The output is named after the input with fp16/bf16/fp32 replaced by
+fp8_e4m3fn_scaled (t5xxl_fp16 -> t5xxl_fp8_e4m3fn_scaled) and written to
+the same directory. Update the loader node of workflows that name the
+original file.
+"""
+
+EPILOG = """\
+examples:
+  comfyui-convert ~/comfyui-work/models/clip/t5xxl_fp16.safetensors
+  comfyui-convert --drop-original models/diffusion_models/wan2.2_ti2v_5B_fp16.safetensors
+  comfyui-download --families wan22 --convert fp8_e4m3fn    Convert while downloading
+
+Needs torch (run it with the ComfyUI venv python). Peak memory is a few
+chunks of CHUNK_ELEMENTS values, independent of the model size.
+"""
+
+FORMATS = ("fp8_e4m3fn",)
+FP8_MAX = 448.0
+CHUNK_ELEMENTS = 16 * 1024 * 1024
+SOURCE_DTYPES = {"F16": 2, "BF16": 2, "F32": 4}
+DTYPE_SIZES = {"F64": 8, "I64": 8, "U64": 8, "F32": 4, "I32": 4, "U32": 4,
+               "F16": 2, "BF16": 2, "I16": 2, "U16": 2}  # anything else: 1 byte
+SUBDIRS = ("diffusion_models", "unet", "text_encoders", "clip")
+PRECISION_TAGS = ("fp16", "bf16", "fp32")
+# 2-D weights of nn.Embedding layers, which ComfyUI loads without applying scale_weight
+EMBEDDING_NAMES = ("shared", "embed_tokens", "token_embedding", "position_embedding", "wte", "wpe",
+                   "relative_attention_bias")
+
+
+def read_header(path):
+    """(header dict, byte offset of the data section) of a safetensors file."""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        if length > os.fstat(f.fileno()).st_size - 8:
+            raise ValueError(f"{path} is not a safetensors file")
+        header = json.loads(f.read(length))
+    return header, 8 + length
+
+
+def converted_name(name, fmt="fp8_e4m3fn"):
+    stem, dot, ext = name.rpartition(".")
+    for tag in PRECISION_TAGS:
+        if tag in stem:
+            return f"{stem.replace(tag, f'{fmt}_scaled', 1)}{dot}{ext}"
+    return f"{stem}_{fmt}_scaled{dot}{ext}"
+
+
+def is_candidate(subdir, name):
+    """Files worth converting: diffusion models and text encoders published in fp16/bf16/fp32."""
+    return subdir in SUBDIRS and name.endswith(".safetensors") and any(tag in name for tag in PRECISION_TAGS)
+
+
+def should_convert(key, info):
+    """Whether a tensor is the weight of a Linear layer (the only layers ComfyUI rescales)."""
+    if info["dtype"] not in SOURCE_DTYPES or len(info["shape"]) != 2 or not key.endswith(".weight"):
+        return False
+    layer = key.rsplit(".", 2)[-2]
+    return layer not in EMBEDDING_NAMES and not layer.endswith(("embedding", "embeddings"))
+
+
+def scale_key(key):
+    return key[:-len("weight")] + "scale_weight"
+
+
+def output_header(header):
+    """Header of the converted file; None if nothing would be converted.
+
+    Like safetensors.save_file, tensors are laid out by element size, largest
+    first, so every tensor starts at a multiple of its element size (the
+    F32 scales and F16/BF16 tensors come before the 1-byte fp8 weights).
+    """
+    tensors = sorted(((k, v) for k, v in header.items() if k != "__metadata__"),
+                     key=lambda kv: kv[1]["data_offsets"][0])
+    if "scaled_fp8" in header or not any(should_convert(k, v) for k, v in tensors):
+        return None
+    entries = []
+    for key, info in tensors:
+        if should_convert(key, info):
+            count = 1
+            for dim in info["shape"]:
+                count *= dim
+            entries.append((key, "F8_E4M3", info["shape"], count))
+            entries.append((scale_key(key), "F32", [], 4))
+        else:
+            start, end = info["data_offsets"]
+            entries.append((key, info["dtype"], info["shape"], end - start))
+    entries.append(("scaled_fp8", "F8_E4M3", [0], 0))
+    out, offset = {}, 0
+    for key, dtype, shape, nbytes in sorted(entries, key=lambda e: -DTYPE_SIZES.get(e[1], 1)):
+        out[key] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    return out
+
+
+def tensor_chunks(torch, mm, base, info):
+    """Yield float32 chunks of a tensor read from the mapped file."""
+    start, end = info["data_offsets"]
+    size = SOURCE_DTYPES[info["dtype"]]
+    dtype = {"F16": torch.float16, "BF16": torch.bfloat16, "F32": torch.float32}[info["dtype"]]
+    step = CHUNK_ELEMENTS * size
+    for offset in range(base + start, base + end, step):
+        data = bytearray(mm[offset:min(offset + step, base + end)])
+        yield torch.frombuffer(data, dtype=dtype).float()
+
+
+def convert_file(src, dst, fmt="fp8_e4m3fn", drop_cache=False):
+    """Write a scaled fp8 copy of src to dst; returns False when src has nothing to convert."""
+    import torch
+
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format {fmt}")
+    header, base = read_header(src)
+    out = output_header(header)
+    if out is None:
+        return False
+    metadata = dict(header.get("__metadata__", {}),
+                    converted_from=Path(src).name, quantization=f"{fmt} per-tensor scale (scale_weight)")
+    out = {"__metadata__": metadata, **out}
+    raw = json.dumps(out, separators=(",", ":")).encode()
+    raw += b" " * (-len(raw) % 8)
+
+    partial = Path(dst).with_name(f".{Path(dst).name}.partial")
+    try:
+        with open(src, "rb") as f_in, open(partial, "wb") as f_out:
+            mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+            f_out.write(struct.pack("<Q", len(raw)) + raw)
+            data_start = f_out.tell()
+            # Read the source in order; each tensor is written at its slot in the output
+            for key, info in sorted(((k, v) for k, v in header.items() if k != "__metadata__"),
+                                    key=lambda kv: kv[1]["data_offsets"][0]):
+                start, end = info["data_offsets"]
+                f_out.seek(data_start + out[key]["data_offsets"][0])
+                if should_convert(key, info):
+                    amax = 0.0
+                    for chunk in tensor_chunks(torch, mm, base, info):
+                        amax = max(amax, chunk.abs().max().item())
+                    scale = amax / FP8_MAX if amax > 0 else 1.0
+                    for chunk in tensor_chunks(torch, mm, base, info):
+                        q = (chunk / scale).clamp_(-FP8_MAX, FP8_MAX).to(torch.float8_e4m3fn)
+                        f_out.write(q.view(torch.uint8).numpy().tobytes())
+                    f_out.seek(data_start + out[scale_key(key)]["data_offsets"][0])
+                    f_out.write(struct.pack("<f", scale))
+                else:
+                    for offset in range(base + start, base + end, CHUNK_ELEMENTS):
+                        f_out.write(mm[offset:min(offset + CHUNK_ELEMENTS, base + end)])
+                if drop_cache and hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f_in.fileno(), base + start, end - start, os.POSIX_FADV_DONTNEED)
+            mm.close()
+            f_out.flush()
+            os.fsync(f_out.fileno())
+            if drop_cache and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f_out.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        os.replace(partial, dst)
+    finally:
+        partial.unlink(missing_ok=True)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-convert",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("files", nargs="+", help="safetensors files to convert")
+    parser.add_argument("--format", choices=FORMATS, default="fp8_e4m3fn", help="target format")
+    parser.add_argument("--drop-original", action="store_true", help="delete each input after converting it")
+    parser.add_argument("--output", type=str, default=None, help="output file (single input only)")
+    args = parser.parse_args()
+    if args.output and len(args.files) > 1:
+        parser.error("--output needs exactly one input file")
+
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        print("ERROR: torch is not installed (run this with the ComfyUI venv python).")
+        sys.exit(1)
+
+    failed = False
+    for name in args.files:
+        src = Path(name)
+        dst = Path(args.output) if args.output else src.with_name(converted_name(src.name, args.format))
+        try:
+            if not convert_file(src, dst, args.format):
+                print(f"  {src.name}: no fp16/bf16/fp32 linear weights, left as is")
+                continue
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  {src.name}: {e}")
+            failed = True
+            continue
+        before, after = src.stat().st_size, dst.stat().st_size
+        print(f"  {src.name} -> {dst.name}  ({before / 1024 ** 3:.1f} GB -> {after / 1024 ** 3:.1f} GB)")
+        if args.drop_original:
+            src.unlink()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Compare peak memory of the stock VAE decode and the chunked decode to disk."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DESCRIPTION = """\
+Measure what decoding a long video latent costs in RAM.
+
+ComfyUI's VAE Decode turns the whole latent into one float32 IMAGE tensor
+in memory. For video that is frames x height x width x 3 x 4 bytes plus the
+decoder's intermediate activations: a 20 s clip at 24 fps and 1280x720
+already needs about 5 GB for the frames alone. The vendored
+ComfyUI-StreamingVideo extension adds "VAE Decode (Chunked, to Disk)",
+which decodes overlapping temporal windows and writes each window's frames
+to a memory-mapped file in ComfyUI's temp directory.
+
+This tool decodes the same random latent both ways, each in a fresh
+process, and reports the peak resident set size (ru_maxrss) and wall time:
+
+  vaedecode   vae.decode() on the full latent (what VAE Decode does)
+  chunked     decode_to_store() from ComfyUI-StreamingVideo
+
+The latent shape follows the VAE: its latent channels, its spatial
+downscale and, for video VAEs, its temporal compression (--frames is the
+number of latent frames). Random latents decode to noise, which costs the
+same as real content.
+"""
+
+EPILOG = """\
+environment variables:
+  FLOX_ENV_CACHE           Cache root (runtime at $FLOX_ENV_CACHE/comfyui-runtime)
+  COMFYUI_MODELS_DIR       Models directory (default: $COMFYUI_WORK_DIR/models)
+
+examples:
+  comfyui-decode-bench --vae wan_2.1_vae.safetensors
+  comfyui-decode-bench --vae hunyuan_video_vae_bf16.safetensors --frames 33 --size 848x480
+  comfyui-decode-bench --vae wan_2.1_vae.safetensors --window 4 --overlap 2 --device cuda
+
+Run it with the ComfyUI venv python after comfyui-setup has linked the
+custom nodes. --vae is a file name under models/vae or a path. On CUDA,
+ru_maxrss only covers host memory; the VRAM peak is reported separately.
+"""
+
+VARIANTS = ("vaedecode", "chunked")
+
+
+def get_models_dir(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get(
+        "COMFYUI_MODELS_DIR",
+        os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")) + "/models"
+    ))
+
+
+def get_runtime(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui")) / "comfyui-runtime"
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def run_child(args):
+    """Decode once in this process and print one JSON line."""
+    import importlib.util
+    import resource
+
+    runtime = get_runtime(args.runtime)
+    sys.argv = ["main.py"] + (["--cpu"] if args.device == "cpu" else [])
+    os.chdir(runtime)
+    sys.path.insert(0, str(runtime))
+    import torch
+    import comfy.model_management
+    import comfy.sd
+    import comfy.utils
+
+    spec = importlib.util.spec_from_file_location(
+        "streaming_video", runtime / "custom_nodes" / "ComfyUI-StreamingVideo" / "__init__.py")
+    streaming = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(streaming)
+
+    vae = comfy.sd.VAE(sd=comfy.utils.load_torch_file(str(args.vae)))
+    width, height = args.size
+    ratio = vae.downscale_ratio
+    spatial = ratio[-1] if isinstance(ratio, (tuple, list)) else ratio
+    torch.manual_seed(0)
+    if isinstance(ratio, (tuple, list)):
+        shape = (1, vae.latent_channels, args.frames, height // spatial, width // spatial)
+    else:
+        shape = (args.frames, vae.latent_channels, height // spatial, width // spatial)
+    samples = torch.randn(shape)
+
+    loaded = rss_mb()
+    start = time.monotonic()
+    if args.child == "vaedecode":
+        images = vae.decode(samples)
+        if images.dim() == 5:
+            images = images.reshape(-1, *images.shape[-3:])
+    else:
+        images = streaming.decode_to_store(vae, samples, args.window, args.overlap)
+    elapsed = time.monotonic() - start
+    vram = None
+    if torch.cuda.is_available() and args.device != "cpu":
+        vram = torch.cuda.max_memory_allocated() / 2**20
+    print(json.dumps({
+        "frames": images.shape[0],
+        "shape": list(images.shape),
+        "seconds": elapsed,
+        "loaded_mb": loaded,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "vram_mb": vram,
+        "latent": list(shape),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-decode-bench",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--vae", type=str, required=True, help="VAE file name under models/vae, or a path")
+    parser.add_argument("--frames", type=int, default=21, help="latent frames to decode (default: 21)")
+    parser.add_argument("--size", type=str, default="832x480", help="decoded WIDTHxHEIGHT (default: 832x480)")
+    parser.add_argument("--window", type=int, default=8, help="chunked: latent frames per window (default: 8)")
+    parser.add_argument("--overlap", type=int, default=1, help="chunked: latent frames shared by windows (default: 1)")
+    parser.add_argument("--device", choices=("cpu", "cuda"), default="cpu", help="decode device (default: cpu)")
+    parser.add_argument("--only", choices=VARIANTS, default=None, help="run a single variant")
+    parser.add_argument("--models-dir", type=str, default=None, help="models directory")
+    parser.add_argument("--runtime", type=str, default=None,
+                        help="ComfyUI runtime directory (default: $FLOX_ENV_CACHE/comfyui-runtime)")
+    parser.add_argument("--child", choices=VARIANTS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    try:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+    except ValueError:
+        parser.error(f"--size must be WIDTHxHEIGHT, got {args.size!r}")
+    args.size = (width, height)
+    vae = Path(args.vae)
+    if not vae.exists():
+        vae = get_models_dir(args.models_dir) / "vae" / args.vae
+    if not vae.exists():
+        print(f"ERROR: VAE not found: {args.vae} (looked in {vae.parent})")
+        sys.exit(1)
+    args.vae = vae.resolve()
+
+    if args.child:
+        run_child(args)
+        return
+
+    runtime = get_runtime(args.runtime)
+    if not (runtime / "custom_nodes" / "ComfyUI-StreamingVideo").exists():
+        print(f"ERROR: ComfyUI-StreamingVideo not found in {runtime}/custom_nodes (run comfyui-setup first).")
+        sys.exit(1)
+
+    print(f"  VAE:     {vae.name}")
+    print(f"  Decode:  {args.frames} latent frames at {width}x{height} on {args.device}")
+    print(f"  Chunked: window {args.window}, overlap {args.overlap}")
+    print()
+    print(f"  {'variant':<10} {'frames':>6} {'model MB':>9} {'peak MB':>9} {'time':>8}")
+    results = {}
+    for variant in ([args.only] if args.only else VARIANTS):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", variant,
+               "--vae", str(args.vae), "--frames", str(args.frames), "--size", f"{width}x{height}",
+               "--window", str(args.window), "--overlap", str(args.overlap),
+               "--device", args.device, "--runtime", str(runtime)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            tail = (proc.stderr.strip().splitlines() or ["(no output)"])[-1]
+            print(f"  {variant:<10} failed: {tail}")
+            continue
+        r = results[variant] = json.loads(lines[-1])
+        vram = f"  ({r['vram_mb']:.0f} MB VRAM)" if r["vram_mb"] is not None else ""
+        print(f"  {variant:<10} {r['frames']:>6} {r['loaded_mb']:>9.0f} {r['peak_mb']:>9.0f} "
+              f"{r['seconds']:>7.1f}s{vram}")
+
+    if len(results) == 2:
+        full, chunked = results["vaedecode"], results["chunked"]
+        saved = full["peak_mb"] - chunked["peak_mb"]
+        print()
+        print(f"  Chunked decode peak: {saved:.0f} MB lower "
+              f"({chunked['peak_mb'] / full['peak_mb']:.0%} of VAE Decode)")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,7 @@ EPILOG = """\
 environment variables:
   COMFYUI_MODELS_DIR   Override model download directory
   COMFYUI_WORK_DIR     Override work directory (models go in $COMFYUI_WORK_DIR/models)
+  HF_ENDPOINT          HuggingFace endpoint or comfyui-mirror URL (same as --mirror)
 
 examples:
   comfyui-download-hunyuan15                         Download I2V (default)
@@ -43,6 +44,7 @@ examples:
   comfyui-download-hunyuan15 --variant all           Download all variants
   comfyui-download-hunyuan15 --dry-run               Show what would be downloaded
   comfyui-download-hunyuan15 --models-dir /data      Download to custom location
+  comfyui-download-hunyuan15 --mirror http://mirror:8190  Download through a comfyui-mirror
 
 after downloading:
   1. Start ComfyUI:  flox services start comfyui
@@ -186,7 +188,14 @@ def main():
         "--models-dir", type=str, default=None,
         help="override model download directory (default: ~/comfyui-work/models)",
     )
+    parser.add_argument(
+        "--mirror", type=str, default=None,
+        help="HuggingFace-compatible mirror URL, e.g. a comfyui-mirror (sets HF_ENDPOINT)",
+    )
     args = parser.parse_args()
+    if args.mirror:
+        # huggingface_hub reads HF_ENDPOINT when it is imported below
+        os.environ["HF_ENDPOINT"] = args.mirror.rstrip("/")
 
     models_dir = get_models_dir(args.models_dir)
     files = get_files(args.variant)
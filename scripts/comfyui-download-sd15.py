@@ -24,11 +24,13 @@ environment variables:
   COMFYUI_MODELS_DIR   Override model download directory
   COMFYUI_WORK_DIR     Override work directory (models go in $COMFYUI_WORK_DIR/models)
   HF_TOKEN             HuggingFace token (not required for SD 1.5)
+  HF_ENDPOINT          HuggingFace endpoint or comfyui-mirror URL (same as --mirror)
 
 examples:
   comfyui-download-sd15                       Download to default location
   comfyui-download-sd15 --dry-run             Show what would be downloaded
   comfyui-download-sd15 --models-dir /data    Download to /data/checkpoints/
+  comfyui-download-sd15 --mirror http://mirror:8190  Download through a comfyui-mirror
 
 after downloading:
   1. Start ComfyUI:  flox services start comfyui
@@ -37,6 +39,8 @@ after downloading:
   4. Use CheckpointLoaderSimple node
   5. Recommended resolution: 512x512
   6. Recommended CFG scale: 7-11
+  7. Optional: comfyui-split-checkpoint v1-5-pruned-emaonly.safetensors shares its CLIP/VAE
+     with other models (see comfyui-split-checkpoint --help)
 """
 
 MODEL_ID = "runwayml/stable-diffusion-v1-5"
@@ -114,7 +118,14 @@ def main():
         "--models-dir", type=str, default=None,
         help="override model download directory (default: ~/comfyui-work/models)",
     )
+    parser.add_argument(
+        "--mirror", type=str, default=None,
+        help="HuggingFace-compatible mirror URL, e.g. a comfyui-mirror (sets HF_ENDPOINT)",
+    )
     args = parser.parse_args()
+    if args.mirror:
+        # huggingface_hub reads HF_ENDPOINT when it is imported below
+        os.environ["HF_ENDPOINT"] = args.mirror.rstrip("/")
 
     models_dir = get_models_dir(args.models_dir)
     hf_token = os.environ.get("HF_TOKEN", "")
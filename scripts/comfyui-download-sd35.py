@@ -36,12 +36,14 @@ environment variables:
   HF_TOKEN             HuggingFace token (REQUIRED for SD 3.5)
   COMFYUI_MODELS_DIR   Override model download directory
   COMFYUI_WORK_DIR     Override work directory (models go in $COMFYUI_WORK_DIR/models)
+  HF_ENDPOINT          HuggingFace endpoint or comfyui-mirror URL (same as --mirror)
 
 examples:
   export HF_TOKEN=hf_your_token_here
   comfyui-download-sd35                       Download to default location
   comfyui-download-sd35 --dry-run             Show what would be downloaded
   comfyui-download-sd35 --models-dir /data    Download to custom location
+  comfyui-download-sd35 --mirror http://mirror:8190  Download through a comfyui-mirror
 
 after downloading:
   1. Start ComfyUI:  flox services start comfyui
@@ -156,7 +158,14 @@ def main():
         "--models-dir", type=str, default=None,
         help="override model download directory (default: ~/comfyui-work/models)",
     )
+    parser.add_argument(
+        "--mirror", type=str, default=None,
+        help="HuggingFace-compatible mirror URL, e.g. a comfyui-mirror (sets HF_ENDPOINT)",
+    )
     args = parser.parse_args()
+    if args.mirror:
+        # huggingface_hub reads HF_ENDPOINT when it is imported below
+        os.environ["HF_ENDPOINT"] = args.mirror.rstrip("/")
 
     models_dir = get_models_dir(args.models_dir)
     hf_token = os.environ.get("HF_TOKEN", "")
@@ -24,11 +24,13 @@ environment variables:
   COMFYUI_MODELS_DIR   Override model download directory
   COMFYUI_WORK_DIR     Override work directory (models go in $COMFYUI_WORK_DIR/models)
   HF_TOKEN             HuggingFace token (not required for SDXL)
+  HF_ENDPOINT          HuggingFace endpoint or comfyui-mirror URL (same as --mirror)
 
 examples:
   comfyui-download-sdxl                       Download to default location
   comfyui-download-sdxl --dry-run             Show what would be downloaded
   comfyui-download-sdxl --models-dir /data    Download to /data/checkpoints/
+  comfyui-download-sdxl --mirror http://mirror:8190  Download through a comfyui-mirror
 
 after downloading:
   1. Start ComfyUI:  flox services start comfyui
@@ -37,6 +39,8 @@ after downloading:
   4. Use CheckpointLoaderSimple node
   5. Recommended resolution: 1024x1024
   6. Recommended CFG scale: 4-7
+  7. Optional: comfyui-split-checkpoint sd_xl_base_1.0.safetensors shares its CLIP/VAE
+     with other models (see comfyui-split-checkpoint --help)
 """
 
 MODEL_ID = "stabilityai/stable-diffusion-xl-base-1.0"
@@ -113,7 +117,14 @@ def main():
         "--models-dir", type=str, default=None,
         help="override model download directory (default: ~/comfyui-work/models)",
     )
+    parser.add_argument(
+        "--mirror", type=str, default=None,
+        help="HuggingFace-compatible mirror URL, e.g. a comfyui-mirror (sets HF_ENDPOINT)",
+    )
     args = parser.parse_args()
+    if args.mirror:
+        # huggingface_hub reads HF_ENDPOINT when it is imported below
+        os.environ["HF_ENDPOINT"] = args.mirror.rstrip("/")
 
     models_dir = get_models_dir(args.models_dir)
     hf_token = os.environ.get("HF_TOKEN", "")
@@ -0,0 +1,1014 @@
+#!/usr/bin/env python3
+"""Download the models of several ComfyUI model families in one asyncio run."""
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import heapq
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import shutil
+import signal
+import sys
+import time
+from pathlib import Path, PurePosixPath
+
+DESCRIPTION = """\
+Download models for several model families at once.
+
+Runs the file lists of the per-family download scripts
+(comfyui-download-sd15, -sdxl, -sd35, -flux, -wan22, -hunyuan15,
+-framepack) through one asyncio HTTP engine instead of one interpreter and
+one set of TLS connections per script:
+
+  - a single keep-alive connection pool shared by every file
+  - a global limit on concurrent transfers (--jobs)
+  - files shared between families (clip_l, t5xxl, umt5 encoders, ...) are
+    downloaded once; other sources of the same file (same SHA-256) are
+    tried if the first fails, and different upstream files that would land
+    on the same destination are reported
+  - large files are fetched as parallel byte ranges and resume after an
+    interruption (.part file plus a segment journal)
+
+Before anything is transferred, a planning phase asks every source for the
+exact size and SHA-256 (cached between runs), verifies files that already
+exist (hashes memoized by size and mtime), and stops if a filesystem would
+be left with less than --min-free. Targets are preallocated with
+fallocate, so large models end up in few extents and a full disk shows up
+at the start rather than at 95%. Downloads are verified against the
+upstream SHA-256 before they replace anything.
+
+With --convert fp8_e4m3fn, diffusion models and text encoders that arrive
+in fp16/bf16 (wan2.2_ti2v_5B_fp16, t5xxl_fp16, ...) are rewritten to
+scaled fp8 by comfyui-convert as soon as they finish, one tensor at a
+time with bounded memory, and the original is dropped (--keep-original
+keeps it). The converted file lands in the same subdirectory under an
+*_fp8_e4m3fn_scaled name; runs that find it skip the original.
+
+Scheduling, for downloading on a host that is serving at the same time:
+
+  - smaller files first: transfers are handed out by file size, so VAEs
+    and text encoders land before 13 GB diffusion models
+  - --limit-rate caps total bandwidth with a token bucket
+  - --ionice lowers CPU and I/O priority; in 'low' and 'idle' mode finished
+    ranges are also dropped from the page cache so they do not evict the
+    models ComfyUI is using
+  - limits can be changed while running through the control file
+    (rate=20M, jobs=4, pause=1); SIGUSR1 re-reads it, SIGUSR2 toggles pause
+
+Commands:
+  all        Every family, every variant
+  (none)     The families given with --families
+
+Families: sd15, sdxl, sd35, flux, wan22, hunyuan15, framepack. Append
+':variant' to pick a variant (wan22:i2v-14b, hunyuan15:all); families
+without one use the same default as their script.
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_MODELS_DIR   Override model download directory
+  COMFYUI_WORK_DIR     Override work directory (models go in $COMFYUI_WORK_DIR/models)
+  HF_TOKEN             HuggingFace token (required for flux and sd35)
+  HF_ENDPOINT          HuggingFace endpoint (default: https://huggingface.co)
+  COMFYUI_DOWNLOAD_RATE     Default for --limit-rate (e.g. 50M, 0 = unlimited)
+  COMFYUI_DOWNLOAD_IONICE   Default for --ionice (default: normal)
+  COMFYUI_DOWNLOAD_MIN_FREE Default for --min-free (default: 5G)
+
+examples:
+  comfyui-download all --dry-run                   Show the deduplicated file list
+  comfyui-download all --plan                      Exact sizes, what is missing, free space
+  comfyui-download --families sd15,sdxl            Two families, one connection pool
+  comfyui-download --families flux,wan22:i2v-14b --jobs 8
+  comfyui-download --families sd15 --endpoint http://127.0.0.1:8000
+  comfyui-download all --mirror http://mirror:8190    Fetch through a comfyui-mirror
+  comfyui-download all --limit-rate 40M --ionice low
+  comfyui-download --families wan22,flux --convert fp8_e4m3fn
+
+  echo "rate=10M" > $FLOX_ENV_CACHE/download.control    Throttle a running download
+  echo "pause=1"  > $FLOX_ENV_CACHE/download.control    Pause it (pause=0 resumes)
+
+Files that are already present with the remote size and SHA-256 are
+skipped (--no-verify: size only). Sizes and hashes are cached in
+$FLOX_ENV_CACHE/download-plan.json for a day (--refresh asks again). The
+endpoint only needs to serve /<repo>/resolve/<revision>/<path> with Range
+support, so a local static server works for testing.
+"""
+
+FAMILIES = ("sd15", "sdxl", "sd35", "flux", "wan22", "hunyuan15", "framepack")
+DEFAULT_ENDPOINT = "https://huggingface.co"
+SEGMENT_SIZE = 64 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+HASH_CHUNK = 16 * 1024 * 1024
+PLAN_TTL = 24 * 3600
+RETRIES = 5
+MAX_JOBS = 32
+CONTROL_POLL = 1.0
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# ioprio_set(2): syscall numbers and priority classes
+IOPRIO_SYSCALL = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+
+def validate_remote_path(remote):
+    """Reject path traversal or absolute paths in remote filenames."""
+    p = PurePosixPath(remote)
+    if p.is_absolute() or ".." in p.parts:
+        raise ValueError(f"Unsafe remote path: {remote}")
+    return remote
+
+
+def get_models_dir(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get(
+        "COMFYUI_MODELS_DIR",
+        os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")) + "/models"
+    ))
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def format_size(n):
+    return f"{n / 1024 ** 3:.1f} GB" if n >= 1024 ** 3 else f"{n / 1024 ** 2:.0f} MB"
+
+
+def parse_size(text):
+    """Parse '50M', '1.5G', '0' or a byte count (a trailing B or /s is ignored)."""
+    text = text.strip().upper().removesuffix("/S").rstrip("B")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)] or 0) * SIZE_UNITS[unit])
+
+
+def get_control_path(override=None):
+    if override:
+        return Path(override)
+    cache = os.environ.get("FLOX_ENV_CACHE")
+    if cache:
+        return Path(cache) / "download.control"
+    return Path.home() / ".cache/comfyui-download.control"
+
+
+def get_plan_cache_path():
+    cache = os.environ.get("FLOX_ENV_CACHE")
+    if cache:
+        return Path(cache) / "download-plan.json"
+    return Path.home() / ".cache/comfyui-download-plan.json"
+
+
+_libc = None
+
+
+def get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    return _libc
+
+
+def preallocate(fd, size):
+    """Reserve size bytes for fd with fallocate(2); sparse ftruncate where unsupported.
+
+    Unlike os.posix_fallocate there is no zero-filling fallback, which would
+    write the whole file once more on filesystems without fallocate.
+    """
+    if sys.platform == "linux" and size:
+        if get_libc().fallocate(fd, 0, 0, size) == 0:
+            return
+        err = ctypes.get_errno()
+        if err == errno.ENOSPC:
+            raise OSError(err, os.strerror(err))
+    os.ftruncate(fd, size)
+
+
+def hash_file(path, drop_cache=False):
+    """SHA-256 of a file; with drop_cache the pages read are released again."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        offset = 0
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+            if drop_cache and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), offset, len(chunk), os.POSIX_FADV_DONTNEED)
+            offset += len(chunk)
+    return digest.hexdigest()
+
+
+def allocated_bytes(path):
+    try:
+        return path.stat().st_blocks * 512
+    except OSError:
+        return 0
+
+
+def journaled_bytes(part, total):
+    """Bytes of part already fetched according to its segment journal."""
+    try:
+        state = json.loads(part.with_name(part.name + ".json").read_text())
+    except (OSError, ValueError):
+        return 0
+    if state.get("total") != total or not part.exists():
+        return 0
+    return sum(min(SEGMENT_SIZE, total - i * SEGMENT_SIZE) for i in state.get("done", []))
+
+
+def existing_parent(path):
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+class PlanCache:
+    """Remote file metadata (size, SHA-256, range support) and local file hashes across runs."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        self.remote_meta = data.get("remote", {})
+        self.local = data.get("local", {})
+
+    def remote(self, url, revision):
+        meta = self.remote_meta.get(url)
+        if meta is None or meta.get("size") is None:
+            return None
+        # Commit revisions never change; branches are re-asked after PLAN_TTL
+        if len(revision) != 40 and time.time() - meta.get("checked", 0) > PLAN_TTL:
+            return None
+        return meta
+
+    def set_remote(self, url, meta):
+        self.remote_meta[url] = dict(meta, checked=time.time())
+
+    def local_sha256(self, path, drop_cache=False):
+        st = path.stat()
+        entry = self.local.get(str(path))
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return entry["sha256"]
+        return self.record(path, hash_file(path, drop_cache))
+
+    def record(self, path, sha256):
+        st = path.stat()
+        self.local[str(path)] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha256}
+        return sha256
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"remote": self.remote_meta, "local": self.local}, indent=1))
+        os.replace(tmp, self.path)
+
+
+class NotEnoughSpace(Exception):
+    pass
+
+
+def set_io_priority(mode):
+    """Lower CPU and I/O priority of this process ('low' or 'idle'); best effort."""
+    if mode == "normal":
+        return "normal"
+    os.nice(10 if mode == "low" else 19)
+    number = IOPRIO_SYSCALL.get(platform.machine())
+    if sys.platform != "linux" or number is None:
+        return f"{mode} (CPU only; no ioprio on this platform)"
+    ioclass = IOPRIO_CLASS_BE if mode == "low" else IOPRIO_CLASS_IDLE
+    prio = (ioclass << IOPRIO_CLASS_SHIFT) | (7 if mode == "low" else 0)
+    if get_libc().syscall(number, IOPRIO_WHO_PROCESS, 0, prio) != 0:
+        return f"{mode} (CPU only; ioprio_set failed: {os.strerror(ctypes.get_errno())})"
+    return mode
+
+
+def drop_cached(fd, offset, length):
+    """Flush a written range and drop it from the page cache (keeps ComfyUI's models resident)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    os.fdatasync(fd)
+    os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+
+class PriorityLimiter:
+    """Concurrency limit that admits waiters lowest priority value first.
+
+    Capacity can be changed while running; lowering it lets current
+    transfers finish and holds back new ones.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.active = 0
+        self.waiters = []
+        self.order = itertools.count()
+
+    def slot(self, priority):
+        limiter = self
+
+        class Slot:
+            async def __aenter__(self):
+                await limiter.acquire(priority)
+
+            async def __aexit__(self, *exc):
+                limiter.release()
+
+        return Slot()
+
+    async def acquire(self, priority):
+        if self.active < self.capacity and not self.waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # admitted just before being cancelled
+            raise
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+        self.wake()
+
+    def wake(self):
+        while self.waiters and self.active < self.capacity:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+
+class TokenBucket:
+    """Global bandwidth limit shared by all transfers; rate 0 means unlimited.
+
+    Consumers take their bytes up front and sleep off any deficit, so the
+    aggregate rate holds for any chunk size and number of transfers.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.running = asyncio.Event()
+        self.running.set()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+
+    async def consume(self, n):
+        await self.running.wait()
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.tokens = min(float(self.rate), self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= n
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class Job:
+    """One destination file and the (repo, remote) sources that provide it."""
+
+    def __init__(self, subdir, local, size_hint):
+        self.subdir = subdir
+        self.local = local
+        self.size_hint = size_hint
+        self.sources = []
+        self.families = []
+        self.origins = {}     # (repo, remote) -> families listing it
+        self.size = None
+        self.sha256 = None
+        self.meta = None      # (source index, probe result) chosen by the planning phase
+        self.remaining = 0    # bytes still to transfer
+        self.new_space = 0    # disk space still to allocate
+        self.convert_to = None
+        self.status = "pending"
+
+    @property
+    def rel(self):
+        return f"{self.subdir}/{self.local}"
+
+
+def family_files(family, variant):
+    """Return normalized (repo, remote, subdir, local, size) tuples of a download script."""
+    module = load_sibling(f"comfyui-download-{family}")
+    if hasattr(module, "get_files"):
+        files = module.get_files(variant)
+    else:
+        if variant:
+            raise ValueError(f"{family} has no variants")
+        files = module.FILES
+    normalized = []
+    for entry in files:
+        if len(entry) == 4:
+            # Single-repo scripts: (remote, subdir, local, size) from MODEL_ID
+            normalized.append((module.MODEL_ID,) + tuple(entry))
+        else:
+            normalized.append(tuple(entry))
+    return normalized
+
+
+def build_jobs(selection):
+    """Merge the file lists of the selected families, one Job per destination."""
+    jobs = {}
+    for family, variant in selection:
+        for repo, remote, subdir, local, size in family_files(family, variant):
+            validate_remote_path(remote)
+            job = jobs.get((subdir, local))
+            if job is None:
+                job = jobs[(subdir, local)] = Job(subdir, local, size)
+            if (repo, remote) not in job.sources:
+                job.sources.append((repo, remote))
+            job.origins.setdefault((repo, remote), [])
+            if family not in job.origins[(repo, remote)]:
+                job.origins[(repo, remote)].append(family)
+            if family not in job.families:
+                job.families.append(family)
+    return list(jobs.values())
+
+
+def parse_selection(args, parser):
+    if args.command == "all":
+        # Every variant: get_files("all") on scripts that have variants
+        return [(f, "all" if hasattr(load_sibling(f"comfyui-download-{f}"), "get_files") else None)
+                for f in FAMILIES]
+    if not args.families:
+        parser.error("give 'all' or --families a,b,c")
+    selection = []
+    for item in args.families.split(","):
+        family, _, variant = item.strip().partition(":")
+        if family not in FAMILIES:
+            parser.error(f"unknown family '{family}' (choose from {', '.join(FAMILIES)})")
+        selection.append((family, variant or None))
+    return selection
+
+
+class DownloadError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class Engine:
+    """asyncio downloader over one shared aiohttp connection pool."""
+
+    def __init__(self, session, endpoint, token, jobs, revision="main", rate=0, drop_cache=False):
+        self.session = session
+        self.endpoint = endpoint.rstrip("/")
+        self.revision = revision
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.limit = PriorityLimiter(jobs)
+        self.bucket = TokenBucket(rate)
+        self.drop_cache = drop_cache
+        self.bytes_done = 0
+
+    def url(self, repo, remote):
+        return f"{self.endpoint}/{repo}/resolve/{self.revision}/{remote}"
+
+    async def probe(self, url):
+        """Size, range support and (for LFS files) SHA-256 from a one-byte range request."""
+        headers = dict(self.headers, Range="bytes=0-0")
+        async with self.limit.slot(0):  # probes are tiny: ahead of every transfer
+            async with self.session.get(url, headers=headers) as resp:
+                if resp.status in (401, 403, 404):
+                    raise DownloadError(f"HTTP {resp.status}", resp.status)
+                # HuggingFace puts the LFS SHA-256 on the redirect to the CDN
+                sha256 = None
+                for r in (*resp.history, resp):
+                    etag = r.headers.get("X-Linked-Etag", "").strip('"')
+                    if len(etag) == 64:
+                        sha256 = etag
+                if resp.status == 206:
+                    total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                    return {"size": int(total) if total.isdigit() else None, "ranges": True, "sha256": sha256}
+                if resp.status == 200:
+                    length = resp.headers.get("Content-Length")
+                    resp.close()  # do not read a whole model just to learn its size
+                    return {"size": int(length) if length else None, "ranges": False, "sha256": sha256}
+                raise DownloadError(f"HTTP {resp.status}", resp.status)
+
+    async def fetch_range(self, url, fd, start, end, priority):
+        """Write bytes [start, end] of url at the same offsets of fd, with retries."""
+        offset = start
+        for attempt in range(RETRIES):
+            headers = dict(self.headers, Range=f"bytes={offset}-{end}")
+            try:
+                async with self.limit.slot(priority):
+                    async with self.session.get(url, headers=headers) as resp:
+                        if resp.status != 206:
+                            raise DownloadError(f"HTTP {resp.status} for range request", resp.status)
+                        async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                            await self.bucket.consume(len(chunk))
+                            os.pwrite(fd, chunk, offset)
+                            offset += len(chunk)
+                            self.bytes_done += len(chunk)
+                if offset > end:
+                    if self.drop_cache:
+                        drop_cached(fd, start, end - start + 1)
+                    return
+            except (OSError, asyncio.TimeoutError, DownloadError) as e:
+                if isinstance(e, DownloadError) and e.status in (401, 403, 404):
+                    raise
+                if attempt == RETRIES - 1:
+                    raise DownloadError(f"{e} after {RETRIES} attempts")
+            await asyncio.sleep(2 ** attempt)
+        raise DownloadError(f"short read at byte {offset} of {end + 1}")
+
+    async def fetch_stream(self, url, part, total, priority):
+        """Plain GET for servers without range support (no resume)."""
+        async with self.limit.slot(priority):
+            async with self.session.get(url, headers=self.headers) as resp:
+                if resp.status != 200:
+                    raise DownloadError(f"HTTP {resp.status}", resp.status)
+                with open(part, "wb") as f:
+                    if total:
+                        preallocate(f.fileno(), total)
+                    written = 0
+                    async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                        await self.bucket.consume(len(chunk))
+                        f.write(chunk)
+                        written += len(chunk)
+                        self.bytes_done += len(chunk)
+                        if self.drop_cache and written % SEGMENT_SIZE < len(chunk):
+                            f.flush()
+                            drop_cached(f.fileno(), 0, written)
+                    f.truncate(written)
+
+    async def plan(self, job, models_dir, cache, refresh=False, verify=True):
+        """Find the first working source of a job and how much of it is still missing.
+
+        Sources are alternatives only when they serve the same file. If the
+        families list different upstream files for one destination, that is
+        reported; an existing file matching any of them is kept, otherwise
+        the first one is downloaded.
+        """
+        if job.status != "pending":
+            return
+        dest = models_dir / job.subdir / job.local
+        errors, probed = [], []
+        for repo, remote in job.sources:
+            url = self.url(repo, remote)
+            meta = None if refresh else cache.remote(url, self.revision)
+            if meta is None:
+                try:
+                    meta = await self.probe(url)
+                except (DownloadError, OSError, asyncio.TimeoutError) as e:
+                    errors.append(f"{repo}: {e}")
+                    continue
+                cache.set_remote(url, meta)
+            probed.append(((repo, remote), meta))
+        if not probed:
+            job.status = "present (size not verified)" if dest.exists() else "failed: " + "; ".join(errors)
+            return
+
+        digests = list(dict.fromkeys(meta["sha256"] for _, meta in probed if meta["sha256"]))
+        if len(digests) > 1:
+            found = ", ".join(f"{repo}/{remote} ({'/'.join(job.origins[(repo, remote)])}, {meta['sha256'][:12]})"
+                              for (repo, remote), meta in probed)
+            print(f"    {job.rel}: families expect different files here: {found}", flush=True)
+
+        size = dest.stat().st_size if dest.exists() else None
+        matching = [meta for _, meta in probed if meta["size"] is not None and meta["size"] == size]
+        if matching:
+            job.size = size
+            expected = {meta["sha256"] for meta in matching if meta["sha256"]}
+            if not (verify and expected):
+                job.status = "present"
+                return
+            if await asyncio.to_thread(cache.local_sha256, dest, self.drop_cache) in expected:
+                job.status = "present (verified)"
+                return
+            print(f"    {job.rel}: SHA-256 differs from upstream, downloading again", flush=True)
+
+        chosen = digests[0] if digests else None
+        alternatives = [(source, meta) for source, meta in probed if meta["sha256"] in (None, chosen)]
+        job.sources = [source for source, _ in alternatives]
+        job.meta = (0, alternatives[0][1])
+        job.size, job.sha256 = job.meta[1]["size"], job.meta[1]["sha256"]
+        # A preallocated .part from an earlier run already holds its blocks
+        part = dest.with_name(dest.name + ".part")
+        job.remaining = (job.size or 0) - journaled_bytes(part, job.size)
+        job.new_space = max(0, (job.size or 0) - allocated_bytes(part))
+
+    async def download(self, job, models_dir, cache):
+        """Fetch a planned job into models_dir/subdir/local, falling back to later sources."""
+        dest = models_dir / job.subdir / job.local
+        errors = []
+        first, planned = job.meta
+        for index, (repo, remote) in enumerate(job.sources[first:], first):
+            url = self.url(repo, remote)
+            if index == first:
+                meta = planned
+            else:
+                try:
+                    meta = await self.probe(url)
+                except (DownloadError, OSError, asyncio.TimeoutError) as e:
+                    errors.append(f"{repo}: {e}")
+                    continue
+            total, sha256 = meta["size"], meta["sha256"]
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            part = dest.with_name(dest.name + ".part")
+            journal = part.with_name(part.name + ".json")
+            # Smaller files first, so a usable set of VAEs/encoders lands early
+            priority = total or 1 << 62
+            try:
+                if meta["ranges"] and total:
+                    await self.fetch_segments(url, part, total, priority)
+                else:
+                    await self.fetch_stream(url, part, total, priority)
+                if sha256:
+                    digest = await asyncio.to_thread(hash_file, part, self.drop_cache)
+                    if digest != sha256:
+                        part.unlink(missing_ok=True)
+                        journal.unlink(missing_ok=True)
+                        raise DownloadError(f"SHA-256 mismatch (got {digest[:12]}, expected {sha256[:12]})")
+            except (DownloadError, OSError, asyncio.TimeoutError) as e:
+                errors.append(f"{repo}: {e}")
+                continue
+            os.replace(part, dest)
+            journal.unlink(missing_ok=True)
+            if sha256:
+                cache.record(dest, sha256)
+            job.status = "downloaded (verified)" if sha256 else "downloaded"
+            return
+        job.status = "failed: " + "; ".join(errors)
+
+    async def fetch_segments(self, url, part, total, priority):
+        """Download fixed-size segments in parallel; a journal records finished ones."""
+        journal = part.with_name(part.name + ".json")
+        done = set()
+        if part.exists() and journal.exists():
+            try:
+                state = json.loads(journal.read_text())
+                if state.get("url") == url and state.get("total") == total:
+                    done = set(state["done"])
+            except (OSError, ValueError, KeyError):
+                done = set()
+        segments = [(i, start, min(start + SEGMENT_SIZE, total) - 1)
+                    for i, start in enumerate(range(0, total, SEGMENT_SIZE))]
+
+        fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            preallocate(fd, total)
+
+            async def segment(i, start, end):
+                await self.fetch_range(url, fd, start, end, priority)
+                done.add(i)
+                tmp = journal.with_suffix(".tmp")
+                tmp.write_text(json.dumps({"url": url, "total": total, "done": sorted(done)}))
+                os.replace(tmp, journal)
+
+            await asyncio.gather(*(segment(i, s, e) for i, s, e in segments if i not in done))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def read_control(path):
+    """Parse 'key=value' lines of the control file; unknown keys are ignored."""
+    settings = {}
+    try:
+        text = path.read_text()
+    except OSError:
+        return settings
+    for line in text.splitlines():
+        key, sep, value = line.partition("=")
+        if sep and not line.lstrip().startswith("#"):
+            settings[key.strip().lower()] = value.strip()
+    return settings
+
+
+def apply_control(engine, settings):
+    changes = []
+    if "rate" in settings:
+        try:
+            rate = parse_size(settings["rate"])
+        except ValueError:
+            rate = None
+        if rate is not None and rate != engine.bucket.rate:
+            engine.bucket.set_rate(rate)
+            changes.append(f"rate {format_size(rate) + '/s' if rate else 'unlimited'}")
+    if "jobs" in settings and settings["jobs"].isdigit():
+        jobs = max(1, min(MAX_JOBS, int(settings["jobs"])))
+        if jobs != engine.limit.capacity:
+            engine.limit.set_capacity(jobs)
+            changes.append(f"jobs {jobs}")
+    if "pause" in settings:
+        paused = settings["pause"] not in ("0", "", "no", "false")
+        if paused == engine.bucket.running.is_set():
+            if paused:
+                engine.bucket.running.clear()
+            else:
+                engine.bucket.running.set()
+            changes.append("paused" if paused else "resumed")
+    if changes:
+        print(f"  control: {', '.join(changes)}", flush=True)
+
+
+async def watch_control(engine, path, reload_now):
+    """Apply the control file whenever it changes, or at once on SIGUSR1."""
+    last = None
+    while True:
+        try:
+            stamp = path.stat().st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp is not None and stamp != last:
+            apply_control(engine, read_control(path))
+        last = stamp
+        try:
+            await asyncio.wait_for(reload_now.wait(), CONTROL_POLL)
+            reload_now.clear()
+            last = None
+        except asyncio.TimeoutError:
+            pass
+
+
+def toggle_pause(engine):
+    if engine.bucket.running.is_set():
+        engine.bucket.running.clear()
+        print("  control: paused (SIGUSR2)", flush=True)
+    else:
+        engine.bucket.running.set()
+        print("  control: resumed (SIGUSR2)", flush=True)
+
+
+async def report_progress(engine, total, started):
+    while True:
+        await asyncio.sleep(5)
+        elapsed = time.monotonic() - started
+        rate = engine.bytes_done / elapsed / 1024 ** 2 if elapsed else 0
+        print(f"  ... {format_size(engine.bytes_done)} of {format_size(total)} at {rate:.0f} MB/s", flush=True)
+
+
+def check_space(jobs, models_dir, min_free):
+    """Bytes still to fetch per filesystem: [(directory, needed, free)] and the ones that do not fit."""
+    needed = {}
+    for job in jobs:
+        if job.status == "pending" and job.new_space:
+            directory = existing_parent(models_dir / job.subdir)
+            entry = needed.setdefault(os.stat(directory).st_dev, [directory, 0])
+            entry[1] += job.new_space
+    usage = [(directory, need, shutil.disk_usage(directory).free) for directory, need in needed.values()]
+    return usage, [(d, need, free) for d, need, free in usage if need + min_free > free]
+
+
+def print_plan(jobs, usage, min_free):
+    print("  Plan:", flush=True)
+    for job in jobs:
+        size = format_size(job.size) if job.size is not None else "?"
+        state = job.status
+        if job.status == "pending":
+            state = "to fetch" if job.remaining == job.size else f"to fetch, {format_size(job.remaining)} left"
+        print(f"    {job.rel:<60s} {size:>8s}  {state}")
+    pending = [j for j in jobs if j.status == "pending"]
+    print()
+    print(f"  To fetch:    {format_size(sum(j.remaining for j in pending))} in {len(pending)} files "
+          f"({len(jobs) - len(pending)} present or unavailable)")
+    for directory, need, free in usage:
+        print(f"  Free space:  {format_size(free)} on {directory} "
+              f"(needs {format_size(need)} + {format_size(min_free)} reserve)")
+    print(flush=True)
+
+
+async def run(jobs, models_dir, args):
+    import aiohttp
+    # Pool sized for the largest jobs= the control file may ask for
+    connector = aiohttp.TCPConnector(limit=MAX_JOBS, limit_per_host=MAX_JOBS, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        engine = Engine(session, args.endpoint, os.environ.get("HF_TOKEN", ""), args.jobs, args.revision,
+                        rate=parse_size(args.limit_rate), drop_cache=args.ionice != "normal")
+        reload_now = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGUSR1"):
+            loop.add_signal_handler(signal.SIGUSR1, reload_now.set)
+            loop.add_signal_handler(signal.SIGUSR2, toggle_pause, engine)
+
+        convert = load_sibling("comfyui-convert") if args.convert else None
+        if convert:
+            for job in jobs:
+                if convert.is_candidate(job.subdir, job.local):
+                    job.convert_to = convert.converted_name(job.local, args.convert)
+                    if (models_dir / job.subdir / job.convert_to).exists():
+                        job.status = f"present (converted: {job.convert_to})"
+
+        # Planning: exact sizes and hashes, local verification, free space
+        cache = PlanCache(get_plan_cache_path())
+        try:
+            await asyncio.gather(*(engine.plan(j, models_dir, cache, args.refresh, not args.no_verify)
+                                   for j in jobs))
+        finally:
+            cache.save()
+        converting = [j for j in jobs if j.convert_to and not j.status.startswith(("failed", "present (converted"))]
+        if converting:
+            # Originals are dropped one by one, so only the largest conversion needs room on top
+            largest = max(converting, key=lambda j: j.size or 0)
+            largest.new_space += (largest.size or 0) // 2
+        min_free = parse_size(args.min_free)
+        usage, short = check_space(jobs, models_dir, min_free)
+        print_plan(jobs, usage, min_free)
+        if short:
+            raise NotEnoughSpace("; ".join(f"{d} needs {format_size(need)} + {format_size(min_free)} reserve, "
+                                           f"{format_size(free)} free" for d, need, free in short))
+        pending = [j for j in jobs if j.status == "pending"]
+        if args.plan or not (pending or converting):
+            return 0, 0.0
+
+        started = time.monotonic()
+        background = [asyncio.create_task(report_progress(engine, sum(j.remaining for j in pending), started)),
+                      asyncio.create_task(watch_control(engine, get_control_path(args.control), reload_now))]
+        converter = asyncio.Lock()  # one conversion at a time; downloads go on meanwhile
+
+        async def download(job):
+            if job.status == "pending":
+                await engine.download(job, models_dir, cache)
+            if job in converting and not job.status.startswith("failed"):
+                src = models_dir / job.subdir / job.local
+                async with converter:
+                    try:
+                        done = await asyncio.to_thread(convert.convert_file, src, src.with_name(job.convert_to),
+                                                       args.convert, engine.drop_cache)
+                    except (OSError, ValueError, KeyError) as e:
+                        job.status += f", conversion failed: {e}"
+                    else:
+                        if done:
+                            if not args.keep_original:
+                                src.unlink()
+                            job.status += f", converted to {job.convert_to}"
+            print(f"    {job.rel:<60s} {job.status}", flush=True)
+
+        try:
+            await asyncio.gather(*(download(j) for j in jobs if j.status == "pending" or j in converting))
+        finally:
+            for task in background:
+                task.cancel()
+            cache.save()
+        return engine.bytes_done, time.monotonic() - started
+
+
+def hint_bytes(job):
+    try:
+        return parse_size(job.size_hint.replace(" ", ""))
+    except (ValueError, IndexError, KeyError):
+        return 0
+
+
+def total_size_hint(jobs):
+    total = 0.0
+    for job in jobs:
+        number, _, unit = job.size_hint.partition(" ")
+        try:
+            total += float(number) * (1024 if unit == "GB" else 1)
+        except ValueError:
+            pass
+    return f"{total / 1024:.1f} GB"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-download",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", choices=("all",), default=None)
+    parser.add_argument("--families", type=str, default=None,
+                        help="comma-separated families, optionally family:variant")
+    parser.add_argument("--jobs", type=int, default=8,
+                        help=f"concurrent transfers across all files (default: 8, max {MAX_JOBS})")
+    parser.add_argument("--limit-rate", type=str, default=os.environ.get("COMFYUI_DOWNLOAD_RATE", "0"),
+                        help="total bandwidth limit, e.g. 50M (bytes/s; default: unlimited)")
+    parser.add_argument("--ionice", choices=("normal", "low", "idle"),
+                        default=os.environ.get("COMFYUI_DOWNLOAD_IONICE", "normal"),
+                        help="CPU/I/O priority of the download (default: normal)")
+    parser.add_argument("--control", type=str, default=None,
+                        help="control file for runtime changes (default: $FLOX_ENV_CACHE/download.control)")
+    parser.add_argument("--endpoint", "--mirror", type=str, default=os.environ.get("HF_ENDPOINT", DEFAULT_ENDPOINT),
+                        help="HuggingFace-compatible endpoint or comfyui-mirror URL "
+                             "(default: $HF_ENDPOINT or huggingface.co)")
+    parser.add_argument("--revision", type=str, default="main", help="repo revision (default: main)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="show what would be downloaded without downloading")
+    parser.add_argument("--plan", action="store_true",
+                        help="run the planning phase (exact sizes, verification, free space) and stop")
+    parser.add_argument("--min-free", type=str, default=os.environ.get("COMFYUI_DOWNLOAD_MIN_FREE", "5G"),
+                        help="free space each filesystem must keep after the download (default: 5G)")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="treat existing files of the right size as present without hashing them")
+    parser.add_argument("--convert", choices=("fp8_e4m3fn",), default=None,
+                        help="convert fp16/bf16 diffusion models and text encoders after download")
+    parser.add_argument("--keep-original", action="store_true",
+                        help="with --convert: keep the original next to the converted file")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ask upstream for sizes and hashes again instead of using the plan cache")
+    parser.add_argument("--models-dir", type=str, default=None,
+                        help="override model download directory (default: ~/comfyui-work/models)")
+    args = parser.parse_args()
+
+    selection = parse_selection(args, parser)
+    try:
+        jobs = build_jobs(selection)
+    except ValueError as e:
+        parser.error(str(e))
+    models_dir = get_models_dir(args.models_dir)
+
+    print()
+    print("=" * 70)
+    print("  ComfyUI model download")
+    print("=" * 70)
+    print()
+    print(f"  Families:    {', '.join(f + (':' + v if v else '') for f, v in selection)}")
+    print(f"  Endpoint:    {args.endpoint}")
+    print(f"  Destination: {models_dir}")
+    print(f"  Token:       {'set' if os.environ.get('HF_TOKEN') else 'not set (flux and sd35 need one)'}")
+    args.jobs = max(1, min(MAX_JOBS, args.jobs))
+    rate = parse_size(args.limit_rate)
+    print(f"  Transfers:   {args.jobs} concurrent, one connection pool, smallest files first")
+    print(f"  Rate limit:  {format_size(rate) + '/s' if rate else 'none'}")
+    print()
+    print(f"  Files to download ({len(jobs)} unique, ~{total_size_hint(jobs)}):")
+    for job in jobs:
+        shared = f"  shared: {', '.join(job.families)}" if len(job.families) > 1 else ""
+        print(f"    {job.local:<55s} {job.size_hint:>8s}  ->  {job.subdir}/{shared}")
+    print()
+
+    if args.dry_run:
+        print("  [dry run] No files will be downloaded.")
+        print()
+        return
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("ERROR: aiohttp is not installed.")
+        print("  Install it with:  pip install aiohttp")
+        sys.exit(1)
+    if args.convert:
+        try:
+            import torch  # noqa: F401
+        except ImportError:
+            print("ERROR: --convert needs torch; run this with the ComfyUI venv python.")
+            sys.exit(1)
+
+    print(f"  I/O:         {set_io_priority(args.ionice)}")
+    print(f"  Control:     {get_control_path(args.control)} (kill -USR1 {os.getpid()} to re-read, "
+          f"-USR2 to pause/resume)")
+    print()
+    jobs.sort(key=hint_bytes)
+
+    try:
+        downloaded, seconds = asyncio.run(run(jobs, models_dir, args))
+    except KeyboardInterrupt:
+        print("\n  Interrupted; run again to resume from the .part files.")
+        sys.exit(130)
+    except NotEnoughSpace as e:
+        print(f"  ERROR: not enough disk space: {e}")
+        print("  Free some space, pick another --models-dir, or lower --min-free.")
+        print()
+        sys.exit(1)
+    if args.plan:
+        return
+
+    failed = [j for j in jobs if j.status.startswith("failed")]
+    print()
+    print("=" * 70)
+    rate = downloaded / seconds / 1024 ** 2 if seconds else 0
+    print(f"  {format_size(downloaded)} in {seconds:.0f}s ({rate:.0f} MB/s), "
+          f"{len(jobs) - len(failed)} of {len(jobs)} files ready")
+    if failed:
+        print("  Failed files (gated repos need HF_TOKEN and an accepted license):")
+        for job in failed:
+            print(f"    {job.rel}: {job.status[len('failed: '):]}")
+    print("=" * 70)
+    print()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
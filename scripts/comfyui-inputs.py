@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Content-addressed input image uploads and input-folder GC for ComfyUI."""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from pathlib import Path
+
+DESCRIPTION = """\
+Upload ComfyUI input images by content hash.
+
+img2img and inpaint pipelines (sd15-img2img, flux-inpaint, sdxl-inpaint)
+tend to upload the same reference images for every job, leaving one copy
+per job in the input folder. This tool names every upload after the
+SHA-256 of its contents (input/<sha256>.png) and asks the server whether
+that file already exists before sending it, so each distinct image is
+uploaded and stored exactly once.
+
+Commands:
+  upload   Upload files by hash (skipping ones the server already has)
+           and print the resulting input names
+  submit   Queue an API workflow, uploading the local images it needs
+           by hash and rewriting its LoadImage inputs to the hash names
+  gc       Delete hash-named inputs that no queued or recent job
+           references and that have not been used for --min-age
+           (jobs waiting in the comfyui-queue database count as queued)
+
+Only hash-named files (64 hex characters + extension) are ever deleted by
+gc; images added to the input folder by hand are left alone.
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_URL          ComfyUI server (default: http://127.0.0.1:$COMFYUI_PORT)
+  COMFYUI_PORT         Server port (default: 8188)
+  COMFYUI_INPUT_DIR    Input directory for gc (default: $COMFYUI_WORK_DIR/input)
+  COMFYUI_WORK_DIR     Work directory (default: ~/comfyui-work)
+  COMFYUI_INPUT_GC_MIN_AGE  Default for --min-age (default: 7d)
+  COMFYUI_QUEUE_DB     comfyui-queue database whose waiting jobs gc keeps
+                       inputs for (default: $FLOX_ENV_CACHE/queue.sqlite)
+
+examples:
+  comfyui-inputs upload photo.png mask.png
+  comfyui-inputs submit sdxl-inpaint.json --image input.png=photo.png --image mask.png=mask.png
+  comfyui-inputs gc --min-age 7d --dry-run
+  comfyui-inputs gc --offline                 Age-based only, do not query the server
+
+gc keeps every input referenced by the server's queue or history, and by
+jobs of the comfyui-queue database that are queued or handed to ComfyUI.
+The database is read even with --offline or when the server is down;
+ComfyUI's own queue lives in its memory, so without a server only the
+database and the age protect inputs. comfyui-setup runs gc in the
+background at most once a day (disable with COMFYUI_INPUT_GC=0).
+"""
+
+HASH_NAME = re.compile(r"^[0-9a-f]{64}\.[A-Za-z0-9]+$")
+CHUNK_SIZE = 1024 * 1024
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_age(text):
+    """Parse '7d', '12h', '2w' or a plain number of seconds."""
+    text = text.strip().lower()
+    if text[-1] in AGE_UNITS:
+        return float(text[:-1]) * AGE_UNITS[text[-1]]
+    return float(text)
+
+
+def get_url(override=None):
+    if override:
+        return override.rstrip("/")
+    if os.environ.get("COMFYUI_URL"):
+        return os.environ["COMFYUI_URL"].rstrip("/")
+    return f"http://127.0.0.1:{os.environ.get('COMFYUI_PORT', '8188')}"
+
+
+def get_input_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_INPUT_DIR"):
+        return Path(os.environ["COMFYUI_INPUT_DIR"])
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work"))) / "input"
+
+
+def hash_name(path):
+    """Return '<sha256>.<ext>' for a local file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    ext = Path(path).suffix.lower().lstrip(".") or "png"
+    return f"{digest.hexdigest()}.{ext}"
+
+
+def request_json(url, data=None, headers=None, method=None):
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return json.loads(resp.read() or b"null")
+
+
+def server_has_input(url, name):
+    """HEAD /view for an input file; True if the server already has it."""
+    query = urllib.parse.urlencode({"filename": name, "type": "input"})
+    req = urllib.request.Request(f"{url}/view?{query}", method="HEAD")
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status == 200
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return False
+        raise
+
+
+def upload_file(url, path, name):
+    """POST a file to /upload/image under the given name."""
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        content = f.read()
+    parts = [
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"overwrite\"\r\n\r\ntrue\r\n".encode(),
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"type\"\r\n\r\ninput\r\n".encode(),
+        (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{name}\"\r\n"
+         f"Content-Type: application/octet-stream\r\n\r\n").encode(),
+        content,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ]
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    result = request_json(f"{url}/upload/image", data=b"".join(parts), headers=headers, method="POST")
+    return result.get("name", name)
+
+
+class InputCache:
+    """Per-run memo of uploaded hash names, so each file is hashed and checked once."""
+
+    def __init__(self, url):
+        self.url = url
+        self.by_path = {}
+        self.uploaded = 0
+        self.skipped = 0
+        self.bytes_saved = 0
+
+    def ensure(self, path):
+        path = Path(path).resolve()
+        if path in self.by_path:
+            return self.by_path[path]
+        name = hash_name(path)
+        if server_has_input(self.url, name):
+            self.skipped += 1
+            self.bytes_saved += path.stat().st_size
+        else:
+            name = upload_file(self.url, path, name)
+            self.uploaded += 1
+        self.by_path[path] = name
+        return name
+
+
+def rewrite_images(graph, mapping, cache):
+    """Replace LoadImage-style 'image' inputs with hash names.
+
+    mapping maps image names used in the workflow (e.g. 'input.png') to
+    local files. Values that are themselves paths to existing local files
+    are uploaded as well.
+    """
+    for node in graph.values():
+        inputs = node.get("inputs", {})
+        value = inputs.get("image")
+        if not isinstance(value, str):
+            continue
+        local = mapping.get(value)
+        if local is None and os.path.isfile(value):
+            local = value
+        if local is not None:
+            inputs["image"] = cache.ensure(local)
+    return graph
+
+
+def cmd_upload(args):
+    cache = InputCache(get_url(args.url))
+    for path in args.files:
+        print(f"{cache.ensure(path)}  {path}")
+    print(f"# {cache.uploaded} uploaded, {cache.skipped} already on server", file=sys.stderr)
+
+
+def cmd_submit(args):
+    mapping = {}
+    for item in args.image or []:
+        name, sep, path = item.partition("=")
+        if not sep:
+            print(f"ERROR: --image expects NAME=PATH, got {item!r}")
+            sys.exit(1)
+        mapping[name] = path
+
+    url = get_url(args.url)
+    with open(args.workflow) as f:
+        graph = json.load(f)
+    cache = InputCache(url)
+    rewrite_images(graph, mapping, cache)
+
+    body = json.dumps({"prompt": graph, "client_id": uuid.uuid4().hex}).encode()
+    try:
+        result = request_json(f"{url}/prompt", data=body, headers={"Content-Type": "application/json"})
+    except urllib.error.HTTPError as e:
+        print(f"ERROR: /prompt returned {e.code}: {e.read().decode(errors='replace')}")
+        sys.exit(1)
+    print(result.get("prompt_id"))
+    print(f"# {cache.uploaded} uploaded, {cache.skipped} already on server "
+          f"({cache.bytes_saved / 1e6:.1f} MB not re-sent)", file=sys.stderr)
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def collect_names(graph, names):
+    """Add the hash-named inputs an API graph references to names."""
+    for node in graph.values():
+        for value in node.get("inputs", {}).values():
+            if isinstance(value, str) and HASH_NAME.match(os.path.basename(value)):
+                names.add(os.path.basename(value))
+
+
+def referenced_names(url):
+    """Collect hash-named inputs used by queued and historical prompts."""
+    names = set()
+    queue = request_json(f"{url}/queue")
+    for item in queue.get("queue_running", []) + queue.get("queue_pending", []):
+        collect_names(item[2], names)
+    history = request_json(f"{url}/history")
+    for entry in history.values():
+        collect_names(entry["prompt"][2], names)
+    return names
+
+
+def queued_names(db_path):
+    """Collect hash-named inputs used by comfyui-queue jobs that have not finished."""
+    queue = load_sibling("comfyui-queue")
+    names = set()
+    db = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+    try:
+        if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'queue_jobs'").fetchone():
+            return names  # a shared database the queue has not used yet
+        states = ("queued",) + queue.ACTIVE
+        rows = db.execute(f"SELECT payload FROM queue_jobs WHERE state IN ({','.join('?' * len(states))})",
+                          states)
+        for (payload,) in rows:
+            collect_names(json.loads(payload)["prompt"], names)
+    finally:
+        db.close()
+    return names
+
+
+def cmd_gc(args):
+    input_dir = get_input_dir(args.input_dir)
+    min_age = parse_age(args.min_age)
+    if not input_dir.is_dir():
+        print(f"ERROR: input directory not found: {input_dir}")
+        sys.exit(1)
+
+    keep = set()
+    try:
+        db_path = load_sibling("comfyui-queue").get_db_path(args.queue_db)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    if db_path.exists():
+        try:
+            keep = queued_names(db_path)
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            print(f"ERROR: cannot read the job queue {db_path}: {e}")
+            sys.exit(1)
+    if not args.offline:
+        url = get_url(args.url)
+        try:
+            keep |= referenced_names(url)
+        except urllib.error.HTTPError as e:
+            print(f"ERROR: cannot read queue/history from {url}: {e}")
+            sys.exit(1)
+        except (urllib.error.URLError, OSError) as e:
+            # Queue and history live in server memory: no server, nothing more to protect
+            print(f"  ComfyUI not reachable at {url} ({e}); collecting by age and the job queue only")
+
+    now = time.time()
+    removed = freed = 0
+    for entry in os.scandir(input_dir):
+        if not entry.is_file(follow_symlinks=False) or not HASH_NAME.match(entry.name):
+            continue
+        if entry.name in keep:
+            continue
+        st = entry.stat(follow_symlinks=False)
+        # LoadImage reads the file, so atime (relatime) tracks last use
+        if now - max(st.st_mtime, st.st_atime) < min_age:
+            continue
+        if not args.dry_run:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+        removed += 1
+        freed += st.st_size
+        if args.verbose or args.dry_run:
+            print(f"  {'would remove' if args.dry_run else 'removed'} {entry.name}")
+
+    verb = "would be removed" if args.dry_run else "removed"
+    print(f"  {removed} unreferenced input(s) {verb}, {freed / 1e6:.1f} MB "
+          f"({len(keep)} referenced by queue/history/job queue)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-inputs",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", type=str, default=None,
+                        help="ComfyUI server URL (default: $COMFYUI_URL or http://127.0.0.1:8188)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    upload = sub.add_parser("upload", help="upload files by content hash")
+    upload.add_argument("files", nargs="+", help="image files to upload")
+    upload.set_defaults(func=cmd_upload)
+
+    submit = sub.add_parser("submit", help="queue an API workflow with hash-named inputs")
+    submit.add_argument("workflow", help="API-format workflow JSON")
+    submit.add_argument("--image", action="append", metavar="NAME=PATH",
+                        help="replace workflow image NAME (e.g. input.png) with local file PATH")
+    submit.set_defaults(func=cmd_submit)
+
+    gc = sub.add_parser("gc", help="delete unreferenced hash-named inputs")
+    gc.add_argument("--input-dir", type=str, default=None,
+                    help="input directory (default: $COMFYUI_INPUT_DIR or ~/comfyui-work/input)")
+    gc.add_argument("--min-age", type=str, default=os.environ.get("COMFYUI_INPUT_GC_MIN_AGE", "7d"),
+                    help="keep inputs used more recently than this (default: 7d)")
+    gc.add_argument("--offline", action="store_true",
+                    help="do not query the server; collect by age and the job queue only")
+    gc.add_argument("--queue-db", type=str, default=None,
+                    help="comfyui-queue database (default: $COMFYUI_QUEUE_DB or $FLOX_ENV_CACHE/queue.sqlite)")
+    gc.add_argument("--dry-run", action="store_true", help="show what would be removed")
+    gc.add_argument("-v", "--verbose", action="store_true", help="list removed files")
+    gc.set_defaults(func=cmd_gc)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except urllib.error.URLError as e:
+        print(f"ERROR: cannot reach ComfyUI: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
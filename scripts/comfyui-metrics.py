@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""Prometheus exporter for a running ComfyUI server."""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+
+DESCRIPTION = """\
+Export ComfyUI queue, job, node and memory metrics for Prometheus.
+
+comfyui-start runs one process whose only record is its log. This
+exporter runs next to it, watches it through the public API and serves
+the numbers on /metrics:
+
+  /queue             running and pending prompts
+  /system_stats      RAM and, per device, VRAM / torch VRAM usage
+  /history           finished prompts (only the newest --history-items,
+                     so the cost does not grow with the history)
+  /ws                execution events: per-node timings, job outcomes,
+                     queue_remaining as soon as it changes
+
+Metrics:
+  comfyui_up                                  1 if the last poll succeeded
+  comfyui_queue_running / _pending            prompts
+  comfyui_jobs_total{status}                  finished prompts (counter)
+  comfyui_jobs_per_second                     completions over --window
+  comfyui_job_duration_seconds                histogram, start to finish
+  comfyui_node_execution_seconds{class_type}  histogram per node type
+  comfyui_nodes_cached_total                  nodes skipped as cached
+  comfyui_model_load_seconds{class_type}      histogram of *Loader* nodes
+  comfyui_ram_total_bytes / _free_bytes
+  comfyui_vram_total_bytes{device} / _free_bytes, comfyui_torch_vram_*
+
+ComfyUI sends the events of a prompt only to the websocket of the client
+that queued it. The vendored ComfyUI-MetricsEvents extension copies them
+to the exporter; without it, per-node timings cover only prompts queued
+without a client_id, and jobs are counted from /history instead.
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_URL                  ComfyUI to watch (default: http://127.0.0.1:$COMFYUI_PORT)
+  COMFYUI_PORT                 ComfyUI port (default: 8188)
+  COMFYUI_METRICS_PORT         Exporter port (default: 9188)
+
+examples:
+  comfyui-metrics                                  Serve http://127.0.0.1:9188/metrics
+  comfyui-metrics --listen 0.0.0.0 --interval 10
+  curl -s localhost:9188/metrics | grep comfyui_queue
+
+Run it as a service next to ComfyUI, with the ComfyUI venv python
+(it needs aiohttp). Useful queries:
+  rate(comfyui_jobs_total[5m])
+  histogram_quantile(0.9, sum by (le, class_type) (rate(comfyui_node_execution_seconds_bucket[15m])))
+"""
+
+NODE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+JOB_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SEEN_PROMPTS = 4096
+MONITOR_PREFIX = "comfyui-metrics-"
+RECONNECT_DELAY = 5
+
+
+def get_url(override=None):
+    if override:
+        return override.rstrip("/")
+    if os.environ.get("COMFYUI_URL"):
+        return os.environ["COMFYUI_URL"].rstrip("/")
+    return f"http://127.0.0.1:{os.environ.get('COMFYUI_PORT', '8188')}"
+
+
+def is_loader(class_type):
+    return "Loader" in class_type
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with one series per label set."""
+
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.label = label
+        self.series = {}  # label value -> [bucket counts..., count, sum]
+
+    def observe(self, value, label_value=None):
+        counts = self.series.setdefault(label_value, [0] * (len(self.buckets) + 1) + [0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, counts in sorted(self.series.items(), key=lambda kv: str(kv[0])):
+            base = [(self.label, label_value)] if self.label else []
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{format_labels(base + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(base + [('le', '+Inf')])} {counts[-2]}")
+            lines.append(f"{self.name}_count{format_labels(base)} {counts[-2]}")
+            lines.append(f"{self.name}_sum{format_labels(base)} {counts[-1]:.6f}")
+        return lines
+
+
+class PromptRun:
+    """Node timings of one prompt as seen on the websocket."""
+
+    def __init__(self, now):
+        self.start = now
+        self.durations = []  # (node id, seconds)
+        self.current = None
+        self.started = None
+
+    def close(self, now):
+        if self.current is not None:
+            self.durations.append((self.current, now - self.started))
+        self.current = None
+
+
+class Exporter:
+    def __init__(self, url, interval, history_items, window):
+        self.url = url
+        self.interval = interval
+        self.history_items = history_items
+        self.window = window
+        self.client_id = MONITOR_PREFIX + uuid.uuid4().hex
+        self.session = None
+        self.tasks = []
+
+        self.up = 0
+        self.ws_connected = 0
+        self.poll_errors = 0
+        self.queue = {"running": 0, "pending": 0}
+        self.system = {}
+        self.jobs = {}
+        self.cached_nodes = 0
+        self.completions = deque()
+        self.seen = OrderedDict()  # prompt ids already counted, bounded
+        self.history_seeded = False
+        self.runs = {}             # prompt id -> PromptRun
+        self.job_seconds = Histogram("comfyui_job_duration_seconds",
+                                     "Time from execution start to the end of a prompt.", JOB_BUCKETS)
+        self.node_seconds = Histogram("comfyui_node_execution_seconds",
+                                      "Execution time of nodes that were not cached.", NODE_BUCKETS, "class_type")
+        self.load_seconds = Histogram("comfyui_model_load_seconds",
+                                      "Execution time of model loader nodes.", NODE_BUCKETS, "class_type")
+
+    async def start(self, app):
+        import aiohttp
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        self.tasks = [asyncio.create_task(self.poll_loop()), asyncio.create_task(self.ws_loop())]
+
+    async def stop(self, app):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.session.close()
+
+    # -- bookkeeping -----------------------------------------------------
+
+    def remember(self, prompt_id):
+        """True the first time a prompt id is seen."""
+        if prompt_id in self.seen:
+            return False
+        self.seen[prompt_id] = True
+        if len(self.seen) > SEEN_PROMPTS:
+            self.seen.popitem(last=False)
+        return True
+
+    def count_job(self, prompt_id, status, seconds):
+        if not self.remember(prompt_id):
+            return
+        self.jobs[status] = self.jobs.get(status, 0) + 1
+        self.completions.append(time.monotonic())
+        if seconds is not None and seconds >= 0:
+            self.job_seconds.observe(seconds)
+
+    def jobs_per_second(self):
+        cutoff = time.monotonic() - self.window
+        while self.completions and self.completions[0] < cutoff:
+            self.completions.popleft()
+        return len(self.completions) / self.window
+
+    # -- polling -----------------------------------------------------------
+
+    async def get_json(self, path):
+        async with self.session.get(self.url + path) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def poll_loop(self):
+        while True:
+            try:
+                queue = await self.get_json("/queue")
+                self.queue = {"running": len(queue.get("queue_running", [])),
+                              "pending": len(queue.get("queue_pending", []))}
+                self.system = await self.get_json("/system_stats")
+                self.read_history(await self.get_json(f"/history?max_items={self.history_items}"))
+                self.up = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.up = 0
+                self.poll_errors += 1
+            await asyncio.sleep(self.interval)
+
+    def read_history(self, history):
+        """Count finished prompts the websocket did not report (or all of them without the extension)."""
+        for prompt_id, entry in history.items():
+            status = entry.get("status") or {}
+            if not status.get("completed") and status.get("status_str") != "error":
+                continue
+            if not self.history_seeded:
+                self.remember(prompt_id)  # finished before the exporter started
+                continue
+            stamps = {name: data.get("timestamp") for name, data in status.get("messages", [])}
+            outcome = "interrupted" if "execution_interrupted" in stamps else status.get("status_str", "success")
+            end = stamps.get("execution_success") or stamps.get("execution_error") or stamps.get("execution_interrupted")
+            seconds = (end - stamps["execution_start"]) / 1000 if end and stamps.get("execution_start") else None
+            self.count_job(prompt_id, outcome, seconds)
+        self.history_seeded = True
+
+    # -- websocket -----------------------------------------------------------
+
+    async def ws_loop(self):
+        import aiohttp
+        while True:
+            try:
+                async with self.session.ws_connect(f"{self.url}/ws?clientId={self.client_id}", heartbeat=30) as ws:
+                    self.ws_connected = 1
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            event = json.loads(msg.data)
+                            await self.feed(event.get("type"), event.get("data") or {}, time.monotonic())
+                        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            self.ws_connected = 0
+            self.runs.clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def feed(self, msg_type, data, now):
+        if msg_type == "status":
+            remaining = ((data.get("status") or {}).get("exec_info") or {}).get("queue_remaining")
+            if remaining is not None:
+                self.queue["pending"] = max(0, remaining - self.queue["running"])
+            return
+        prompt_id = data.get("prompt_id")
+        if prompt_id is None:
+            return
+        if msg_type == "execution_start":
+            self.runs[prompt_id] = PromptRun(now)
+            return
+        run = self.runs.get(prompt_id)
+        if run is None:
+            return
+        if msg_type == "execution_cached":
+            self.cached_nodes += len(data.get("nodes", []))
+        elif msg_type == "executing":
+            run.close(now)
+            if data.get("node") is not None:
+                run.current, run.started = data["node"], now
+        elif msg_type == "executed":
+            if data.get("node") == run.current:
+                run.close(now)
+        elif msg_type in ("execution_success", "execution_error", "execution_interrupted"):
+            run.close(now)
+            del self.runs[prompt_id]
+            status = {"execution_success": "success", "execution_error": "error"}.get(msg_type, "interrupted")
+            self.count_job(prompt_id, status, now - run.start)
+            if run.durations:
+                await self.record_nodes(prompt_id, run.durations)
+
+    async def record_nodes(self, prompt_id, durations):
+        """Map node ids to class types using the prompt's own history entry."""
+        try:
+            entry = (await self.get_json(f"/history/{prompt_id}")).get(prompt_id)
+            graph = entry["prompt"][2]
+        except Exception:
+            return
+        for node_id, seconds in durations:
+            class_type = graph.get(str(node_id), {}).get("class_type", "unknown")
+            self.node_seconds.observe(seconds, class_type)
+            if is_loader(class_type):
+                self.load_seconds.observe(seconds, class_type)
+
+    # -- exposition ----------------------------------------------------------
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        metric("comfyui_up", "gauge", "1 if ComfyUI answered the last poll.", [([], self.up)])
+        metric("comfyui_exporter_websocket_connected", "gauge", "1 while the event websocket is open.",
+               [([], self.ws_connected)])
+        metric("comfyui_exporter_poll_errors_total", "counter", "Failed polls of the ComfyUI API.",
+               [([], self.poll_errors)])
+        metric("comfyui_queue_running", "gauge", "Prompts executing.", [([], self.queue["running"])])
+        metric("comfyui_queue_pending", "gauge", "Prompts waiting in the queue.", [([], self.queue["pending"])])
+        metric("comfyui_jobs_total", "counter", "Finished prompts by outcome.",
+               [([("status", status)], count) for status, count in sorted(self.jobs.items())])
+        metric("comfyui_jobs_per_second", "gauge", f"Prompts finished per second over the last {self.window:g}s.",
+               [([], f"{self.jobs_per_second():.4f}")])
+        metric("comfyui_nodes_cached_total", "counter", "Nodes skipped because their outputs were cached.",
+               [([], self.cached_nodes)])
+        lines += self.job_seconds.render() + self.node_seconds.render() + self.load_seconds.render()
+
+        system = self.system.get("system", {})
+        if "ram_total" in system:
+            metric("comfyui_ram_total_bytes", "gauge", "System RAM.", [([], system["ram_total"])])
+            metric("comfyui_ram_free_bytes", "gauge", "Free system RAM.", [([], system["ram_free"])])
+        devices = self.system.get("devices", [])
+        for key, name, help_text in (("vram_total", "comfyui_vram_total_bytes", "Device memory."),
+                                     ("vram_free", "comfyui_vram_free_bytes", "Free device memory."),
+                                     ("torch_vram_total", "comfyui_torch_vram_total_bytes",
+                                      "Device memory reserved by torch."),
+                                     ("torch_vram_free", "comfyui_torch_vram_free_bytes",
+                                      "Reserved device memory torch is not using.")):
+            samples = [([("device", d.get("name", d.get("index", "?")))], d[key]) for d in devices if key in d]
+            if samples:
+                metric(name, "gauge", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-metrics",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", type=str, default=None,
+                        help="ComfyUI URL (default: $COMFYUI_URL or http://127.0.0.1:8188)")
+    parser.add_argument("--listen", type=str, default="127.0.0.1", help="listen address")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("COMFYUI_METRICS_PORT", "9188")),
+                        help="exporter port (default: 9188)")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between API polls (default: 5)")
+    parser.add_argument("--history-items", type=int, default=64,
+                        help="newest history entries read per poll (default: 64)")
+    parser.add_argument("--window", type=float, default=60,
+                        help="seconds averaged by comfyui_jobs_per_second (default: 60)")
+    args = parser.parse_args()
+
+    try:
+        from aiohttp import web
+    except ImportError:
+        print("ERROR: aiohttp is not installed (run this with the ComfyUI venv python).")
+        sys.exit(1)
+
+    exporter = Exporter(get_url(args.url), args.interval, args.history_items, args.window)
+    app = web.Application()
+    app.on_startup.append(exporter.start)
+    app.on_cleanup.append(exporter.stop)
+    app.router.add_get("/metrics", exporter.handle_metrics)
+    print(f"  Metrics for {exporter.url}: http://{args.listen}:{args.port}/metrics", flush=True)
+    web.run_app(app, host=args.listen, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
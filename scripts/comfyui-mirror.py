@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""HuggingFace-compatible model mirror serving resolve/<rev>/<path> from a local store."""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from pathlib import Path, PurePosixPath
+
+DESCRIPTION = """\
+Serve HuggingFace model files to a fleet of GPU nodes from one local copy.
+
+Every node pulls the same 20-40 GB of weights from HuggingFace. Run this
+mirror once on a host the fleet can reach and point the downloaders at it:
+
+  comfyui-download-flux --mirror http://mirror:8190
+  comfyui-download.py all --mirror http://mirror:8190
+  HF_ENDPOINT=http://mirror:8190 comfyui-download-wan22
+
+The mirror answers HuggingFace's /<repo>/resolve/<revision>/<path> URLs:
+  - files are stored once by SHA-256 in a content-addressed blob store, so
+    an encoder published in several repos takes disk space once
+  - GET and HEAD with Range support; stored files are sent with sendfile
+  - a missing file is pulled from upstream once: clients asking for it in
+    the meantime are streamed the part already on disk, and ranges far
+    ahead of the pull are passed through from upstream
+  - LFS files are checked against upstream's SHA-256 before they are kept
+  - branch revisions such as 'main' are revalidated with upstream after
+    --ref-ttl; when upstream is unreachable the stored copy is served
+
+Commands:
+  serve    Run the mirror
+  status   Show stored files and their size
+  prune    Delete blobs no file refers to any more, and stale partial files
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_MIRROR_DIR        Store directory (default: $FLOX_ENV_CACHE/mirror)
+  COMFYUI_MIRROR_PORT       Listen port (default: 8190)
+  COMFYUI_MIRROR_UPSTREAM   Upstream endpoint (default: https://huggingface.co)
+  HF_TOKEN                  Token for gated repos, used when a client sends none
+
+examples:
+  comfyui-mirror serve --listen 0.0.0.0                 Mirror for the local network
+  comfyui-mirror serve --offline                        Serve only what is stored
+  comfyui-mirror serve --upstream http://mirror-eu:8190 Chain to another mirror
+  comfyui-mirror status
+  comfyui-mirror prune --dry-run
+
+A client's Authorization header is forwarded upstream when a file is
+pulled. Stored files are served to every client without a token check,
+including files from gated repos: run the mirror on a trusted network.
+"""
+
+INDEX_NAME = "index.sqlite"
+DEFAULT_UPSTREAM = "https://huggingface.co"
+CHUNK = 1024 * 1024
+PASS_THROUGH_AHEAD = 256 * 1024 * 1024
+MAX_REDIRECTS = 5
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+COMMIT_RE = re.compile(r"^[0-9a-f]{40}$")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def parse_age(text):
+    """Parse '1h', '30m', '1d' or a plain number of seconds."""
+    text = text.strip().lower()
+    if text[-1] in AGE_UNITS:
+        return float(text[:-1]) * AGE_UNITS[text[-1]]
+    return float(text)
+
+
+def get_store_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_MIRROR_DIR"):
+        return Path(os.environ["COMFYUI_MIRROR_DIR"])
+    if os.environ.get("FLOX_ENV_CACHE"):
+        return Path(os.environ["FLOX_ENV_CACHE"]) / "mirror"
+    return Path.home() / ".cache/comfyui-mirror"
+
+
+def validate_remote_path(remote):
+    """Reject path traversal or absolute paths in requested filenames."""
+    p = PurePosixPath(remote)
+    if not remote or p.is_absolute() or ".." in p.parts:
+        raise ValueError(f"Unsafe remote path: {remote}")
+    return remote
+
+
+def normalize_etag(value):
+    value = (value or "").strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    return value.strip('"')
+
+
+def parse_range(header, size):
+    """(start, end) of a single 'bytes=' range, None for no/unsupported ranges, ValueError if unsatisfiable."""
+    if not header or not size or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+class MirrorStore:
+    """Blobs named by SHA-256 plus a SQLite index of (repo, revision, path) -> blob."""
+
+    def __init__(self, root):
+        self.root = root
+        self.blobs = root / "blobs"
+        self.tmp = root / "tmp"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(root / INDEX_NAME, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                repo     TEXT NOT NULL,
+                revision TEXT NOT NULL,
+                path     TEXT NOT NULL,
+                sha256   TEXT NOT NULL,
+                size     INTEGER NOT NULL,
+                etag     TEXT NOT NULL,
+                commit_hash TEXT NOT NULL,
+                checked  REAL NOT NULL,
+                PRIMARY KEY (repo, revision, path)
+            );
+            CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256);
+        """)
+
+    def blob_path(self, sha256):
+        return self.blobs / sha256[:2] / sha256
+
+    def lookup(self, repo, revision, path):
+        row = self.db.execute(
+            "SELECT sha256, size, etag, commit_hash, checked FROM files "
+            "WHERE repo = ? AND revision = ? AND path = ?", (repo, revision, path)).fetchone()
+        if row is None or not self.blob_path(row[0]).is_file():
+            return None
+        return dict(zip(("sha256", "size", "etag", "commit", "checked"), row))
+
+    def has_blob(self, sha256):
+        return self.blob_path(sha256).is_file()
+
+    def add(self, repo, revisions, path, sha256, size, etag, commit):
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO files (repo, revision, path, sha256, size, etag, commit_hash, checked) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(repo, rev, path, sha256, size, etag, commit, now) for rev in dict.fromkeys(revisions) if rev])
+        self.db.commit()
+
+    def touch(self, repo, revision, path):
+        self.db.execute("UPDATE files SET checked = ? WHERE repo = ? AND revision = ? AND path = ?",
+                        (time.time(), repo, revision, path))
+        self.db.commit()
+
+    def totals(self):
+        files, repos = self.db.execute("SELECT COUNT(*), COUNT(DISTINCT repo) FROM files").fetchone()
+        blobs, size = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT sha256, MAX(size) AS size FROM files GROUP BY sha256)"
+        ).fetchone()
+        return files, repos, blobs, size
+
+    def prune(self, dry_run=False, partial_age=86400):
+        """Remove unreferenced blobs and partial files older than partial_age; (count, bytes)."""
+        referenced = {row[0] for row in self.db.execute("SELECT DISTINCT sha256 FROM files")}
+        victims = [p for p in self.blobs.glob("*/*") if p.name not in referenced]
+        cutoff = time.time() - partial_age
+        victims += [p for p in self.tmp.iterdir() if p.stat().st_mtime < cutoff]
+        freed = sum(p.stat().st_size for p in victims)
+        if not dry_run:
+            for p in victims:
+                p.unlink(missing_ok=True)
+        return len(victims), freed
+
+
+class UpstreamError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or f"upstream returned HTTP {status}")
+        self.status = status
+
+
+class Pull:
+    """One upstream download in progress; readers follow the growing file."""
+
+    def __init__(self, part, meta):
+        self.part = part
+        self.meta = meta
+        self.fd = os.open(part, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.progress = asyncio.Condition()
+
+    async def advance(self, n=0, done=False, error=None):
+        async with self.progress:
+            self.written += n
+            self.done = self.done or done
+            self.error = self.error or error
+            self.progress.notify_all()
+
+    async def wait_past(self, offset):
+        async with self.progress:
+            await self.progress.wait_for(lambda: self.written > offset or self.done or self.error)
+
+
+class Mirror:
+    def __init__(self, store, upstream, ref_ttl, offline=False, token=""):
+        self.store = store
+        self.upstream = upstream.rstrip("/")
+        self.ref_ttl = ref_ttl
+        self.offline = offline
+        self.token = token
+        self.session = None
+        self.pulls = {}  # (repo, revision, path) -> Pull
+        self.hits = self.pulled = self.passed_through = self.bytes_served = 0
+
+    async def start(self, app):
+        import aiohttp
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300),
+            auto_decompress=False,
+        )
+
+    async def stop(self, app):
+        await self.session.close()
+
+    def upstream_headers(self, request):
+        auth = request.headers.get("Authorization") or (f"Bearer {self.token}" if self.token else "")
+        return {"Authorization": auth} if auth else {}
+
+    def resolve_url(self, repo, revision, path):
+        return f"{self.upstream}/{repo}/resolve/{revision}/{path}"
+
+    async def upstream_meta(self, repo, revision, path, headers):
+        """HEAD upstream like huggingface_hub does: size, etag, LFS sha256 and commit."""
+        from yarl import URL
+        url = URL(self.resolve_url(repo, revision, path), encoded=False)
+        for _ in range(MAX_REDIRECTS):
+            async with self.session.head(url, headers=headers, allow_redirects=False) as resp:
+                h = resp.headers
+                location = h.get("Location", "")
+                # Relative redirects (renamed repos, resolve-cache) are followed; CDN redirects
+                # of LFS files carry the metadata on the redirect itself
+                if 300 <= resp.status < 400 and location.startswith("/"):
+                    url = url.join(URL(location))
+                    continue
+                if resp.status >= 400:
+                    raise UpstreamError(resp.status)
+                etag = normalize_etag(h.get("X-Linked-Etag") or h.get("ETag"))
+                size = int(h.get("X-Linked-Size") or (h.get("Content-Length") if resp.status == 200 else 0) or 0)
+                return {"etag": etag, "size": size, "commit": h.get("X-Repo-Commit", ""),
+                        "sha256": etag if SHA256_RE.match(etag) else None}
+        raise UpstreamError(508, "too many redirects")
+
+    def file_headers(self, entry, revision):
+        commit = entry["commit"] or revision
+        return {"X-Repo-Commit": commit, "X-Linked-Etag": f'"{entry["etag"]}"',
+                "X-Linked-Size": str(entry["size"]), "Accept-Ranges": "bytes"}
+
+    # -- request handling --------------------------------------------------
+
+    async def handle_resolve(self, request):
+        from aiohttp import web
+        info = request.match_info
+        repo = f"{info['namespace']}/{info['name']}" if "namespace" in info else info["name"]
+        revision, path = info["revision"], info["path"]
+        try:
+            validate_remote_path(path)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        key = (repo, revision, path)
+        headers = self.upstream_headers(request)
+
+        if key in self.pulls:
+            return await self.serve_pull(request, key, self.pulls[key], revision, headers)
+
+        entry = await asyncio.to_thread(self.store.lookup, repo, revision, path)
+        meta = None
+        if entry and not (self.offline or COMMIT_RE.match(revision)) and time.time() - entry["checked"] > self.ref_ttl:
+            try:
+                meta = await self.upstream_meta(repo, revision, path, headers)
+            except Exception as e:
+                print(f"  stale {repo}/{path}@{revision}: upstream check failed ({e})", flush=True)
+            else:
+                if meta["etag"] == entry["etag"]:
+                    await asyncio.to_thread(self.store.touch, repo, revision, path)
+                    meta = None
+                else:
+                    entry = None  # branch moved and the file changed
+        if entry:
+            return self.serve_blob(request, entry, revision)
+        if self.offline:
+            raise web.HTTPNotFound(text=f"{repo}/{path}@{revision} is not mirrored (offline)")
+
+        if meta is None:
+            try:
+                meta = await self.upstream_meta(repo, revision, path, headers)
+            except UpstreamError as e:
+                return web.Response(status=e.status, text=str(e))
+            except Exception as e:
+                raise web.HTTPBadGateway(text=f"upstream {self.upstream} unreachable: {e}")
+        if key in self.pulls:  # another request started it while we waited
+            return await self.serve_pull(request, key, self.pulls[key], revision, headers)
+
+        # Same file already stored for another repo or revision: no transfer
+        if meta["sha256"] and await asyncio.to_thread(self.store.has_blob, meta["sha256"]):
+            await asyncio.to_thread(self.store.add, repo, (revision, meta["commit"]), path, meta["sha256"],
+                                    meta["size"], meta["etag"], meta["commit"])
+            return self.serve_blob(request, await asyncio.to_thread(self.store.lookup, repo, revision, path),
+                                   revision)
+
+        pull = Pull(self.store.tmp / f"{uuid.uuid4().hex}.partial", meta)
+        self.pulls[key] = pull
+        asyncio.create_task(self.pull(key, pull, headers))
+        return await self.serve_pull(request, key, pull, revision, headers)
+
+    def serve_blob(self, request, entry, revision):
+        from aiohttp import web
+        self.hits += 1
+        if request.method != "HEAD":
+            self.bytes_served += entry["size"]
+        return web.FileResponse(self.store.blob_path(entry["sha256"]), headers=self.file_headers(entry, revision))
+
+    async def pull(self, key, pull, headers):
+        """Download a file from upstream into the store, verifying LFS checksums."""
+        repo, revision, path = key
+        meta = pull.meta
+        digest = hashlib.sha256()
+        print(f"  pull  {repo}/{path}@{revision} ({meta['size'] / 1e9:.2f} GB)", flush=True)
+        try:
+            async with self.session.get(self.resolve_url(repo, revision, path), headers=headers) as resp:
+                if resp.status != 200:
+                    raise UpstreamError(resp.status)
+                async for chunk in resp.content.iter_chunked(CHUNK):
+                    os.pwrite(pull.fd, chunk, pull.written)
+                    digest.update(chunk)
+                    await pull.advance(len(chunk))
+            sha256 = digest.hexdigest()
+            if meta["sha256"] and sha256 != meta["sha256"]:
+                raise UpstreamError(502, f"checksum mismatch for {path}: got {sha256}")
+            if meta["size"] and pull.written != meta["size"]:
+                raise UpstreamError(502, f"size mismatch for {path}: {pull.written} of {meta['size']} bytes")
+            blob = self.store.blob_path(sha256)
+            blob.parent.mkdir(exist_ok=True)
+            os.replace(pull.part, blob)
+            await asyncio.to_thread(self.store.add, repo, (revision, meta["commit"]), path, sha256, pull.written,
+                                    meta["etag"] or sha256, meta["commit"])
+            self.pulled += 1
+            print(f"  done  {repo}/{path} -> {sha256[:12]}", flush=True)
+            await pull.advance(done=True)
+        except Exception as e:
+            print(f"  failed {repo}/{path}@{revision}: {e}", flush=True)
+            pull.part.unlink(missing_ok=True)
+            await pull.advance(error=e)
+        finally:
+            os.close(pull.fd)
+            self.pulls.pop(key, None)
+
+    async def serve_pull(self, request, key, pull, revision, headers):
+        """Stream a file that is still being pulled, following the partial file."""
+        from aiohttp import web
+        meta, size = pull.meta, pull.meta["size"]
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{size}"})
+        if byte_range and byte_range[0] > pull.written + PASS_THROUGH_AHEAD:
+            return await self.pass_through(request, key, headers)
+
+        out = self.file_headers({"etag": meta["etag"], "size": size, "commit": meta["commit"]}, revision)
+        start, end = byte_range or (0, size - 1)
+        if byte_range:
+            out["Content-Range"] = f"bytes {start}-{end}/{size}"
+        if size:
+            out["Content-Length"] = str(end - start + 1)
+        response = web.StreamResponse(status=206 if byte_range else 200, headers=out)
+        response.content_type = "application/octet-stream"
+        if request.method == "HEAD":
+            return response
+
+        fd = os.dup(pull.fd)  # stays valid when the pull renames or removes the file
+        try:
+            await response.prepare(request)
+            offset = start
+            while not size or offset <= end:
+                await pull.wait_past(offset)
+                if pull.written <= offset:
+                    if pull.error:
+                        raise UpstreamError(502, f"upstream pull failed: {pull.error}")
+                    break  # done; only reached when the size was unknown
+                stop = pull.written if not size else min(pull.written, end + 1)
+                while offset < stop:
+                    data = os.pread(fd, min(CHUNK, stop - offset), offset)
+                    await response.write(data)
+                    offset += len(data)
+                    self.bytes_served += len(data)
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # client went away, e.g. a size probe that only read the headers
+        finally:
+            os.close(fd)
+        return response
+
+    async def pass_through(self, request, key, headers):
+        """Forward a range far ahead of the pull straight from upstream (not stored)."""
+        from aiohttp import web
+        self.passed_through += 1
+        forward = dict(headers, Range=request.headers["Range"])
+        async with self.session.get(self.resolve_url(*key), headers=forward) as resp:
+            out = {k: v for k, v in resp.headers.items()
+                   if k.lower() in ("content-length", "content-range", "content-type", "etag", "accept-ranges")}
+            response = web.StreamResponse(status=resp.status, headers=out)
+            await response.prepare(request)
+            async for chunk in resp.content.iter_chunked(CHUNK):
+                await response.write(chunk)
+                self.bytes_served += len(chunk)
+            await response.write_eof()
+            return response
+
+    async def handle_stats(self, request):
+        from aiohttp import web
+        files, repos, blobs, size = await asyncio.to_thread(self.store.totals)
+        return web.json_response({
+            "files": files, "repos": repos, "blobs": blobs, "bytes": size,
+            "hits": self.hits, "pulled": self.pulled, "passed_through": self.passed_through,
+            "bytes_served": self.bytes_served,
+            "pulling": {f"{r}/{p}@{v}": [pull.written, pull.meta["size"]] for (r, v, p), pull in self.pulls.items()},
+        })
+
+
+def cmd_serve(args, store):
+    from aiohttp import web
+    mirror = Mirror(store, args.upstream, parse_age(args.ref_ttl), args.offline, os.environ.get("HF_TOKEN", ""))
+    app = web.Application()
+    app.on_startup.append(mirror.start)
+    app.on_cleanup.append(mirror.stop)
+    app.router.add_get("/mirror/stats", mirror.handle_stats)
+    app.router.add_get("/{namespace}/{name}/resolve/{revision}/{path:.+}", mirror.handle_resolve)
+    app.router.add_get("/{name}/resolve/{revision}/{path:.+}", mirror.handle_resolve)
+    source = "offline" if args.offline else mirror.upstream
+    print(f"  Mirror {store.root}: http://{args.listen}:{args.port} <- {source}", flush=True)
+    web.run_app(app, host=args.listen, port=args.port, print=None)
+
+
+def cmd_status(args, store):
+    files, repos, blobs, size = store.totals()
+    print(f"  Store:      {store.root}")
+    print(f"  Files:      {files} in {repos} repos")
+    print(f"  Blobs:      {blobs} ({size / 1e9:.1f} GB)")
+    for repo, count, total in store.db.execute(
+            "SELECT repo, COUNT(DISTINCT path), SUM(size) FROM (SELECT DISTINCT repo, path, sha256, size FROM files) "
+            "GROUP BY repo ORDER BY repo"):
+        print(f"    {repo:<55s} {count:>4d} files  {total / 1e9:>7.2f} GB")
+
+
+def cmd_prune(args, store):
+    removed, freed = store.prune(dry_run=args.dry_run)
+    verb = "would be removed" if args.dry_run else "removed"
+    print(f"  {removed} files {verb}, {freed / 1e9:.2f} GB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-mirror",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=("serve", "status", "prune"))
+    parser.add_argument("--listen", type=str, default="127.0.0.1",
+                        help="listen address (default: 127.0.0.1; 0.0.0.0 for the fleet)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("COMFYUI_MIRROR_PORT", "8190")),
+                        help="listen port (default: 8190)")
+    parser.add_argument("--store", type=str, default=None,
+                        help="store directory (default: $FLOX_ENV_CACHE/mirror)")
+    parser.add_argument("--upstream", type=str,
+                        default=os.environ.get("COMFYUI_MIRROR_UPSTREAM", DEFAULT_UPSTREAM),
+                        help="upstream endpoint (default: https://huggingface.co)")
+    parser.add_argument("--ref-ttl", type=str, default="1h",
+                        help="revalidate files of branch revisions after this long (default: 1h)")
+    parser.add_argument("--offline", action="store_true", help="never contact upstream")
+    parser.add_argument("--dry-run", action="store_true", help="prune: only report")
+    args = parser.parse_args()
+
+    store = MirrorStore(get_store_dir(args.store))
+    commands = {"serve": cmd_serve, "status": cmd_status, "prune": cmd_prune}
+    try:
+        commands[args.command](args, store)
+    except ImportError as e:
+        print(f"ERROR: {e} (serve needs aiohttp; run it with the ComfyUI venv python)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""Archive, index and prune ComfyUI output files."""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import shutil
+import sqlite3
+import struct
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+DESCRIPTION = """\
+Manage the ComfyUI output directory.
+
+ComfyUI writes every result into a single output folder that grows without
+bound. Video workflows (framepack-i2v-60sec, wan22-t2v) write very large
+files, ComfyUI's filename counter scans the folder on every save, and the
+history view slows down as it fills up.
+
+This tool moves finished artifacts out of the live output folder into a
+date-sharded store (output/archive/YYYY-MM-DD/... or --archive-dir),
+records them in a small SQLite index, and enforces size/age quotas with
+least-recently-used eviction. "Latest N outputs" queries are answered from
+the index and never walk the store.
+
+Files listed by the --history-items most recent entries of the server's
+history are not moved yet, so the /view links of recent results (and the
+downloads of comfyui-result-cache) keep working. They are archived once
+newer prompts push them out of that window.
+
+Commands:
+  watch     Watch the output dir (inotify; polling on macOS) and archive
+            files as soon as they are finished, pruning as it goes
+  archive   Archive every finished file once, then prune
+  prune     Enforce --max-bytes / --max-age on the store
+  latest    Print the N most recent outputs from the index
+  stats     Print store totals from the index
+  reindex   Rebuild the index by scanning the store (after manual changes)
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_URL                ComfyUI server (default: http://127.0.0.1:$COMFYUI_PORT)
+  COMFYUI_PORT               Server port (default: 8188)
+  COMFYUI_OUTPUT_DIR         Output directory (default: $COMFYUI_WORK_DIR/output)
+  COMFYUI_WORK_DIR           Work directory (default: ~/comfyui-work)
+  COMFYUI_OUTPUT_ARCHIVE     Archive store instead of output/archive
+  COMFYUI_OUTPUT_MAX_BYTES   Size quota for the store, e.g. 200G (default: none)
+  COMFYUI_OUTPUT_MAX_AGE     Age quota for the store, e.g. 30d (default: none)
+
+examples:
+  comfyui-outputs watch                              Run as a service next to ComfyUI
+  comfyui-outputs watch --max-bytes 500G --max-age 30d
+  comfyui-outputs archive --archive-dir /mnt/cold    One-shot move to another disk
+  comfyui-outputs prune --max-bytes 100G --dry-run   Show what would be evicted
+  comfyui-outputs latest 20                          Newest 20 outputs
+
+Files are considered finished once they have been closed and left untouched
+for --settle seconds (ffmpeg re-opens MP4 files to move the moov atom).
+Name clashes in a shard (ComfyUI restarts its _00001_ counter once older
+files have moved away) are resolved with a -N suffix. The history is read at
+most once a minute; if the server cannot be reached (or with --offline),
+files are archived without checking it.
+"""
+
+INDEX_NAME = ".output-index.sqlite"
+DEFAULT_SHARD_DIR = "archive"
+PARTIAL_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload")
+HISTORY_TTL = 60.0
+HISTORY_TIMEOUT = 10.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+EVENT_HEADER = struct.Struct("iIII")
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_size(text):
+    """Parse '500G', '1.5T' or a plain byte count."""
+    if text is None or text == "":
+        return None
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def parse_age(text):
+    """Parse '30d', '12h', '2w' or a plain number of seconds."""
+    if text is None or text == "":
+        return None
+    text = text.strip().lower()
+    unit = text[-1] if text[-1] in AGE_UNITS else "s"
+    number = text[:-1] if text[-1] in AGE_UNITS else text
+    return float(number) * AGE_UNITS[unit]
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+
+def get_output_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_OUTPUT_DIR"):
+        return Path(os.environ["COMFYUI_OUTPUT_DIR"])
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work"))) / "output"
+
+
+def get_url(override=None):
+    if override:
+        return override.rstrip("/")
+    if os.environ.get("COMFYUI_URL"):
+        return os.environ["COMFYUI_URL"].rstrip("/")
+    return f"http://127.0.0.1:{os.environ.get('COMFYUI_PORT', '8188')}"
+
+
+def get_store_dir(output_dir, override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_OUTPUT_ARCHIVE"):
+        return Path(os.environ["COMFYUI_OUTPUT_ARCHIVE"])
+    return output_dir / DEFAULT_SHARD_DIR
+
+
+class OutputIndex:
+    """SQLite index of archived outputs, keyed by path relative to the store."""
+
+    def __init__(self, store_dir):
+        store_dir.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(store_dir / INDEX_NAME, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                path     TEXT PRIMARY KEY,
+                size     INTEGER NOT NULL,
+                created  REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outputs_created ON outputs(created);
+            CREATE INDEX IF NOT EXISTS outputs_accessed ON outputs(accessed);
+        """)
+
+    def add(self, rel, size, created, accessed):
+        self.db.execute(
+            "INSERT OR REPLACE INTO outputs (path, size, created, accessed) VALUES (?, ?, ?, ?)",
+            (rel, size, created, max(created, accessed)),
+        )
+        self.db.commit()
+
+    def remove(self, rels):
+        self.db.executemany("DELETE FROM outputs WHERE path = ?", [(r,) for r in rels])
+        self.db.commit()
+
+    def touch(self, rel, accessed):
+        self.db.execute("UPDATE outputs SET accessed = MAX(accessed, ?) WHERE path = ?", (accessed, rel))
+
+    def latest(self, n):
+        return self.db.execute(
+            "SELECT path, size, created FROM outputs ORDER BY created DESC LIMIT ?", (n,)
+        ).fetchall()
+
+    def totals(self):
+        count, size, oldest = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created) FROM outputs"
+        ).fetchone()
+        return count, size, oldest
+
+    def expired(self, cutoff):
+        return self.db.execute(
+            "SELECT path, size FROM outputs WHERE created < ? ORDER BY created", (cutoff,)
+        ).fetchall()
+
+    def least_recent(self, limit):
+        return self.db.execute(
+            "SELECT path, size, accessed FROM outputs ORDER BY accessed LIMIT ?", (limit,)
+        ).fetchall()
+
+    def clear(self):
+        self.db.execute("DELETE FROM outputs")
+        self.db.commit()
+
+
+class HistoryOutputs:
+    """Output files of the newest history entries, re-read at most every HISTORY_TTL seconds."""
+
+    def __init__(self, url, output_dir, max_items):
+        self.url = url
+        self.output_dir = output_dir
+        self.max_items = max_items
+        self.paths = set()
+        self.fetched = None
+        self.state = None
+
+    def get(self):
+        """Return the referenced paths, or None if the history could not be read."""
+        if self.url is None or self.max_items <= 0:
+            return self.paths
+        if self.fetched is not None and time.monotonic() - self.fetched < HISTORY_TTL:
+            return self.paths
+        try:
+            with urllib.request.urlopen(f"{self.url}/history?max_items={self.max_items}",
+                                        timeout=HISTORY_TIMEOUT) as resp:
+                history = json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            self.report("error", f"cannot read history from {self.url}: {e}; not archiving for now")
+            self.paths, self.fetched = None, time.monotonic()
+            return None
+        except (urllib.error.URLError, OSError) as e:
+            # History lives in server memory: no server, no links to break
+            self.report("down", f"ComfyUI not reachable at {self.url} ({e}); archiving without the history")
+            self.paths, self.fetched = set(), time.monotonic()
+            return self.paths
+        self.report("up", None)
+        paths = set()
+        for entry in history.values():
+            for node_outputs in entry.get("outputs", {}).values():
+                for items in node_outputs.values():
+                    if not isinstance(items, list):
+                        continue
+                    for item in items:
+                        if isinstance(item, dict) and item.get("type") == "output" and "filename" in item:
+                            paths.add(self.output_dir / item.get("subfolder", "") / item["filename"])
+        self.paths, self.fetched = paths, time.monotonic()
+        return paths
+
+    def report(self, state, message):
+        """Print message when the server's state changes, not on every read."""
+        if state != self.state and message:
+            print(f"  {message}")
+        self.state = state
+
+
+def is_candidate(path, output_dir, store_dir):
+    """True for regular output files that belong in the store."""
+    name = path.name
+    if name.startswith(".") or name.endswith(PARTIAL_SUFFIXES):
+        return False
+    try:
+        path.relative_to(store_dir)
+        return False  # already archived
+    except ValueError:
+        pass
+    try:
+        path.relative_to(output_dir)
+    except ValueError:
+        return False
+    return path.is_file() and not path.is_symlink()
+
+
+def unique_target(target):
+    if not target.exists():
+        return target
+    n = 1
+    while True:
+        candidate = target.with_name(f"{target.stem}-{n}{target.suffix}")
+        if not candidate.exists():
+            return candidate
+        n += 1
+
+
+def archive_file(path, output_dir, store_dir, index):
+    """Move one finished output into its date shard and index it."""
+    st = path.stat()
+    rel = path.relative_to(output_dir)
+    shard = time.strftime("%Y-%m-%d", time.localtime(st.st_mtime))
+    target = unique_target(store_dir / shard / rel)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.rename(path, target)
+    except OSError:
+        # Different filesystem: copy under a hidden name, then publish atomically
+        tmp = target.with_name(f".{target.name}.partial")
+        shutil.copy2(path, tmp)
+        os.rename(tmp, target)
+        path.unlink()
+    index.add(str(target.relative_to(store_dir)), st.st_size, st.st_mtime, st.st_atime)
+    return target
+
+
+def remove_empty_dirs(start, stop):
+    """Remove empty parent directories of start, up to (not including) stop."""
+    current = start
+    while current != stop and stop in current.parents:
+        try:
+            current.rmdir()
+        except OSError:
+            return
+        current = current.parent
+
+
+def enforce_quotas(store_dir, index, max_bytes=None, max_age=None, dry_run=False):
+    """Evict expired files, then least-recently-used files until under max_bytes."""
+    evicted = []
+    if max_age is not None:
+        evicted.extend(index.expired(time.time() - max_age))
+
+    if max_bytes is not None:
+        _, total, _ = index.totals()
+        total -= sum(size for _, size in evicted)
+        gone = {rel for rel, _ in evicted}
+        while total > max_bytes:
+            # Refresh access times of the oldest candidates (cheap: one stat each)
+            batch = [row for row in index.least_recent(len(gone) + 256) if row[0] not in gone]
+            if not batch:
+                break
+            for rel, _, accessed in batch:
+                try:
+                    atime = (store_dir / rel).stat().st_atime
+                except FileNotFoundError:
+                    continue
+                if atime > accessed:
+                    index.touch(rel, atime)
+            index.db.commit()
+            batch = [row for row in index.least_recent(len(gone) + 256) if row[0] not in gone]
+            for rel, size, _ in batch:
+                if total <= max_bytes:
+                    break
+                evicted.append((rel, size))
+                gone.add(rel)
+                total -= size
+
+    if not dry_run:
+        for rel, _ in evicted:
+            path = store_dir / rel
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            remove_empty_dirs(path.parent, store_dir)
+        index.remove([rel for rel, _ in evicted])
+    return evicted
+
+
+class Inotify:
+    """Minimal recursive inotify watcher (Linux) via libc."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+
+    def add_tree(self, root, exclude):
+        for dirpath, dirnames, _ in os.walk(root):
+            current = Path(dirpath)
+            dirnames[:] = [d for d in dirnames if current / d != exclude and not d.startswith(".")]
+            self.add(current)
+
+    def add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            return
+        self.watches[wd] = directory
+
+    def read(self, timeout):
+        """Yield (path, is_dir, overflow) for events available within timeout."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                yield None, False, True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            yield directory / os.fsdecode(name), bool(mask & IN_ISDIR), False
+
+
+def scan_live(output_dir, store_dir):
+    """Walk the live output folder (excluding the store) for candidate files."""
+    for dirpath, dirnames, filenames in os.walk(output_dir):
+        current = Path(dirpath)
+        dirnames[:] = [d for d in dirnames if current / d != store_dir and not d.startswith(".")]
+        for name in filenames:
+            path = current / name
+            if is_candidate(path, output_dir, store_dir):
+                yield path
+
+
+def archive_settled(pending, output_dir, store_dir, index, settle, now, history):
+    """Archive pending files that have not changed for `settle` seconds."""
+    moved = 0
+    settled = [path for path, seen in pending.items() if now - seen >= settle]
+    referenced = history.get() if settled else set()
+    if referenced is None:
+        return moved
+    for path in settled:
+        if path in referenced:
+            pending[path] = now  # still linked from the history
+            continue
+        del pending[path]
+        try:
+            if not is_candidate(path, output_dir, store_dir):
+                continue
+            if now - path.stat().st_mtime < settle:
+                pending[path] = now  # still being written
+                continue
+            target = archive_file(path, output_dir, store_dir, index)
+            remove_empty_dirs(path.parent, output_dir)
+            moved += 1
+            print(f"  archived {path.relative_to(output_dir)} -> {target.relative_to(store_dir)}")
+        except FileNotFoundError:
+            continue
+    return moved
+
+
+def cmd_watch(args, output_dir, store_dir, index):
+    max_bytes, max_age = parse_size(args.max_bytes), parse_age(args.max_age)
+    pending = {path: 0.0 for path in scan_live(output_dir, store_dir)}
+    history = HistoryOutputs(None if args.offline else get_url(args.url), output_dir, args.history_items)
+
+    watcher = None
+    if not args.poll:
+        try:
+            watcher = Inotify()
+            watcher.add_tree(output_dir, store_dir)
+        except OSError as e:
+            print(f"  inotify unavailable ({e}); polling every {args.poll_interval}s")
+    mode = "inotify" if watcher else "polling"
+    print(f"  Watching {output_dir} ({mode}), store {store_dir}")
+
+    last_prune = 0.0
+    last_poll = time.monotonic()
+    while True:
+        now = time.time()
+        if watcher:
+            for path, is_dir, overflow in watcher.read(timeout=min(args.settle, 5.0)):
+                if overflow:
+                    pending.update({p: now for p in scan_live(output_dir, store_dir)})
+                elif is_dir:
+                    if path != store_dir:
+                        watcher.add_tree(path, store_dir)
+                        pending.update({p: now for p in scan_live(path, store_dir)})
+                else:
+                    pending[path] = now
+        else:
+            time.sleep(min(args.poll_interval, args.settle))
+            if time.monotonic() - last_poll >= args.poll_interval:
+                for path in scan_live(output_dir, store_dir):
+                    pending.setdefault(path, now)
+                last_poll = time.monotonic()
+
+        moved = archive_settled(pending, output_dir, store_dir, index, args.settle, time.time(), history)
+        if (max_bytes or max_age) and (moved or time.monotonic() - last_prune > args.prune_interval):
+            for rel, size in enforce_quotas(store_dir, index, max_bytes, max_age):
+                print(f"  evicted {rel} ({format_size(size)})")
+            last_prune = time.monotonic()
+
+
+def cmd_archive(args, output_dir, store_dir, index):
+    pending = {path: 0.0 for path in scan_live(output_dir, store_dir)}
+    history = HistoryOutputs(None if args.offline else get_url(args.url), output_dir, args.history_items)
+    moved = archive_settled(pending, output_dir, store_dir, index, args.settle, time.time(), history)
+    print(f"  {moved} file(s) archived, {len(pending)} still being written or listed in the history")
+    cmd_prune(args, output_dir, store_dir, index)
+
+
+def cmd_prune(args, output_dir, store_dir, index):
+    max_bytes, max_age = parse_size(args.max_bytes), parse_age(args.max_age)
+    if max_bytes is None and max_age is None:
+        print("  No quota set (--max-bytes / --max-age); nothing to prune.")
+        return
+    evicted = enforce_quotas(store_dir, index, max_bytes, max_age, dry_run=args.dry_run)
+    verb = "would evict" if args.dry_run else "evicted"
+    for rel, size in evicted:
+        print(f"  {verb} {rel} ({format_size(size)})")
+    freed = sum(size for _, size in evicted)
+    print(f"  {len(evicted)} file(s), {format_size(freed)} {'would be ' if args.dry_run else ''}freed")
+
+
+def cmd_latest(args, output_dir, store_dir, index):
+    for rel, size, created in index.latest(args.count):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+        print(f"{stamp}  {format_size(size):>10s}  {store_dir / rel}")
+
+
+def cmd_stats(args, output_dir, store_dir, index):
+    count, size, oldest = index.totals()
+    print(f"  Store:   {store_dir}")
+    print(f"  Files:   {count}")
+    print(f"  Size:    {format_size(size)}")
+    if oldest:
+        print(f"  Oldest:  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(oldest))}")
+
+
+def cmd_reindex(args, output_dir, store_dir, index):
+    index.clear()
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(store_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            path = Path(dirpath) / name
+            st = path.stat()
+            index.db.execute(
+                "INSERT OR REPLACE INTO outputs (path, size, created, accessed) VALUES (?, ?, ?, ?)",
+                (str(path.relative_to(store_dir)), st.st_size, st.st_mtime, max(st.st_mtime, st.st_atime)),
+            )
+            count += 1
+    index.db.commit()
+    print(f"  Indexed {count} file(s) in {store_dir}")
+
+
+COMMANDS = {
+    "watch": cmd_watch,
+    "archive": cmd_archive,
+    "prune": cmd_prune,
+    "latest": cmd_latest,
+    "stats": cmd_stats,
+    "reindex": cmd_reindex,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-outputs",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=sorted(COMMANDS), help="action to perform")
+    parser.add_argument("count", type=int, nargs="?", default=20, help="number of entries for 'latest' (default: 20)")
+    parser.add_argument("--url", type=str, default=None,
+                        help="ComfyUI server URL (default: $COMFYUI_URL or http://127.0.0.1:8188)")
+    parser.add_argument("--history-items", type=int, default=200,
+                        help="keep files of this many recent history entries in place (default: 200, 0: none)")
+    parser.add_argument("--offline", action="store_true",
+                        help="do not read the server's history; archive every finished file")
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help="ComfyUI output directory (default: $COMFYUI_OUTPUT_DIR or ~/comfyui-work/output)")
+    parser.add_argument("--archive-dir", type=str, default=None,
+                        help="store for archived files (default: <output-dir>/archive)")
+    parser.add_argument("--max-bytes", type=str, default=os.environ.get("COMFYUI_OUTPUT_MAX_BYTES"),
+                        help="size quota for the store, e.g. 500G")
+    parser.add_argument("--max-age", type=str, default=os.environ.get("COMFYUI_OUTPUT_MAX_AGE"),
+                        help="age quota for the store, e.g. 30d")
+    parser.add_argument("--settle", type=float, default=10.0,
+                        help="seconds a file must be untouched before it is archived (default: 10)")
+    parser.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=30.0,
+                        help="seconds between scans in polling mode (default: 30)")
+    parser.add_argument("--prune-interval", type=float, default=300.0,
+                        help="seconds between quota checks while idle (default: 300)")
+    parser.add_argument("--dry-run", action="store_true", help="for 'prune': show what would be evicted")
+    args = parser.parse_args()
+
+    output_dir = get_output_dir(args.output_dir).resolve()
+    store_dir = get_store_dir(output_dir, args.archive_dir).resolve()
+    if not output_dir.is_dir():
+        print(f"ERROR: output directory not found: {output_dir}")
+        sys.exit(1)
+
+    index = OutputIndex(store_dir)
+    try:
+        COMMANDS[args.command](args, output_dir, store_dir, index)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
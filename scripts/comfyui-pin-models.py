@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""Stage ComfyUI model files into a RAM-backed directory (tmpfs / hugepages)."""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+DESCRIPTION = """\
+Pin ComfyUI model files in RAM.
+
+Page-cache warming (comfyui-prefetch) helps the first job, but the kernel
+is free to drop those pages again under memory pressure. This tool copies
+selected model files into a RAM-backed directory -- a tmpfs such as
+/dev/shm, ideally mounted with huge=always so the weights sit on 2 MB
+transparent hugepages -- and writes an extra_model_paths config that lists
+that directory ahead of the normal model folders. ComfyUI then loads the
+pinned copy when it exists and the regular file when it does not.
+
+Commands:
+  stage    Copy targets into the pin directory (evicting least recently
+           used pinned files that are not targets to make room)
+  evict    Remove pinned files (targets given, or --all)
+  status   Show the pin directory, its backing and what is pinned
+  config   Write the extra_model_paths YAML for the pin directory
+
+Targets are resolved exactly like comfyui-prefetch: workflow JSON files,
+bundled workflow names (flux-txt2img), model names or paths relative to
+the models directory.
+
+Files that do not fit -- over --budget, over the free space of the pin
+directory, or that would leave less than --reserve of available memory --
+are not staged and keep loading from the models directory.
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_MODELS_DIR      Override model directory
+  COMFYUI_WORK_DIR        Override work directory (models in $COMFYUI_WORK_DIR/models)
+  COMFYUI_PIN             Targets for comfyui-start (comma-separated)
+  COMFYUI_PIN_DIR         Pin directory (default: /dev/shm/comfyui-pinned-$USER)
+  COMFYUI_PIN_BUDGET      Maximum bytes pinned (default: 40%)
+  COMFYUI_PIN_RESERVE     Memory to leave available after staging (default: 8G)
+
+examples:
+  comfyui-pin-models stage flux-txt2img                 Pin everything FLUX needs
+  comfyui-pin-models stage t5xxl_fp16.safetensors --budget 12G
+  comfyui-pin-models evict --all
+  comfyui-pin-models status
+
+  COMFYUI_PIN=flux-txt2img flox services restart comfyui
+
+hugepage-backed pin directory (needs root, once per boot):
+  sudo mkdir -p /mnt/comfyui-pinned
+  sudo mount -t tmpfs -o size=48G,huge=always,uid=$(id -u) tmpfs /mnt/comfyui-pinned
+  export COMFYUI_PIN_DIR=/mnt/comfyui-pinned
+
+comfyui-start writes the config and passes it to ComfyUI before the
+regular extra_model_paths.yaml, then stages in the background; files
+appear in the pin directory atomically, so a model loaded before its copy
+finishes is simply read from the models directory.
+"""
+
+MANIFEST = ".pinned.json"
+CONFIG_NAME = "pinned_model_paths.yaml"
+COPY_CHUNK = 64 * 1024 * 1024
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+prefetch = load_sibling("comfyui-prefetch")
+format_size = prefetch.format_size
+
+
+def get_pin_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_PIN_DIR"):
+        return Path(os.environ["COMFYUI_PIN_DIR"])
+    user = os.environ.get("USER") or str(os.getuid())
+    return Path("/dev/shm") / f"comfyui-pinned-{user}"
+
+
+def get_config_path(override=None):
+    if override:
+        return Path(override)
+    cache = os.environ.get("FLOX_ENV_CACHE")
+    if cache:
+        return Path(cache) / CONFIG_NAME
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work"))) / CONFIG_NAME
+
+
+def mount_info(path):
+    """Return (fstype, options) of the mount containing path, or (None, '')."""
+    best, info = "", (None, "")
+    real = os.path.realpath(path)
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 4:
+                    continue
+                mnt = fields[1].replace("\\040", " ")
+                if (real == mnt or real.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best):
+                    best, info = mnt, (fields[2], fields[3])
+    except OSError:
+        pass
+    return info
+
+
+def describe_backing(pin_dir):
+    fstype, options = mount_info(pin_dir)
+    if fstype is None:
+        return "unknown (no /proc/mounts)"
+    huge = [opt for opt in options.split(",") if opt.startswith("huge=")]
+    if fstype == "tmpfs":
+        if huge and huge[0] not in ("huge=never", "huge=deny"):
+            return f"tmpfs, {huge[0]} (hugepage-backed)"
+        return "tmpfs, 4 KB pages (mount with huge=always for hugepages)"
+    if fstype == "hugetlbfs":
+        return "hugetlbfs (not supported: files cannot be written with write())"
+    return f"{fstype} (not RAM-backed; pinning only duplicates files on disk)"
+
+
+class PinStore:
+    """The pin directory and its manifest of staged files.
+
+    The manifest maps each pinned path (relative to the models directory,
+    and to the pin directory) to the source size/mtime it was copied from
+    and the last time it was staged or used.
+    """
+
+    def __init__(self, pin_dir, models_dir):
+        self.pin_dir = pin_dir
+        self.models_dir = models_dir
+        self.manifest_path = pin_dir / MANIFEST
+        self.entries = {}
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        # Drop entries whose pinned copy vanished (tmpfs cleared on reboot)
+        self.entries = {rel: e for rel, e in self.entries.items() if (pin_dir / rel).is_file()}
+
+    def save(self):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def pinned_bytes(self):
+        return sum(e["size"] for e in self.entries.values())
+
+    def last_used(self, rel):
+        """Latest of staging time and the pinned copy's atime (updated by loads)."""
+        entry = self.entries[rel]
+        try:
+            atime = (self.pin_dir / rel).stat().st_atime
+        except OSError:
+            atime = 0
+        return max(entry.get("staged", 0), atime)
+
+    def is_current(self, rel, source):
+        entry = self.entries.get(rel)
+        if entry is None:
+            return False
+        st = source.stat()
+        return entry["size"] == st.st_size and entry["mtime"] == int(st.st_mtime)
+
+    def stage(self, rel, source):
+        """Copy source to pin_dir/rel via a temp file so loads never see a partial copy."""
+        dest = self.pin_dir / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.partial")
+        st = source.stat()
+        try:
+            with open(source, "rb") as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self.entries[rel] = {
+            "source": str(source),
+            "size": st.st_size,
+            "mtime": int(st.st_mtime),
+            "staged": time.time(),
+        }
+        self.save()
+
+    def evict(self, rel):
+        entry = self.entries.pop(rel, None)
+        (self.pin_dir / rel).unlink(missing_ok=True)
+        parent = (self.pin_dir / rel).parent
+        while parent != self.pin_dir:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+        self.save()
+        return entry["size"] if entry else 0
+
+    def lru_candidates(self, keep):
+        """Pinned paths not in keep, least recently used first."""
+        return sorted((rel for rel in self.entries if rel not in keep), key=self.last_used)
+
+
+def parse_pin_budget(text, pinned):
+    """Like prefetch budgets, but a percentage also counts what is already pinned.
+
+    tmpfs pages are not available memory, so '40%' would otherwise shrink
+    on every restart.
+    """
+    if text.strip().endswith("%"):
+        return int((prefetch.available_memory() + pinned) * float(text.strip()[:-1]) / 100)
+    return prefetch.parse_budget(text)
+
+
+def relative_to_models(path, models_dir):
+    try:
+        return Path(path).relative_to(models_dir).as_posix()
+    except ValueError:
+        return None
+
+
+def write_config(path, pin_dir, rels):
+    """Write an extra_model_paths YAML that puts pin_dir first for each model folder.
+
+    is_default makes ComfyUI insert the paths ahead of its own models
+    directory and of the regular extra_model_paths.yaml entries.
+    """
+    folders = sorted({rel.split("/", 1)[0] for rel in rels if "/" in rel})
+    lines = [
+        "# Generated by comfyui-pin-models -- regenerated on every service start",
+        "comfyui_pinned:",
+        f"    base_path: {pin_dir}",
+        "    is_default: true",
+    ]
+    lines += [f"    {folder}: {folder}/" for folder in folders]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+    return folders
+
+
+def resolve(args, parser, models_dir):
+    targets = list(args.targets)
+    if not targets and os.environ.get("COMFYUI_PIN"):
+        targets = os.environ["COMFYUI_PIN"].split(",")
+    if not targets:
+        parser.error("no targets given (pass workflows/models or set COMFYUI_PIN)")
+    files, missing = prefetch.resolve_targets(targets, prefetch.ModelLocator(models_dir))
+    rels = []
+    for path in files:
+        rel = relative_to_models(path, models_dir)
+        if rel is None:
+            missing.append(f"{path} (outside the models directory)")
+        else:
+            rels.append(rel)
+    return rels, missing
+
+
+def header(title, pin_dir, models_dir):
+    print()
+    print("=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+    print()
+    print(f"  Models dir:  {models_dir}")
+    print(f"  Pin dir:     {pin_dir}")
+    print(f"  Backing:     {describe_backing(pin_dir) if pin_dir.exists() else 'not created'}")
+
+
+def cmd_stage(args, parser):
+    models_dir = prefetch.get_models_dir(args.models_dir)
+    pin_dir = get_pin_dir(args.pin_dir)
+    rels, missing = resolve(args, parser, models_dir)
+    header("ComfyUI model pinning", pin_dir, models_dir)
+    for name in missing:
+        print(f"  Not found:   {name}")
+
+    try:
+        pin_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"  Cannot create pin directory ({e}); models load from {models_dir}")
+        print()
+        return
+    store = PinStore(pin_dir, models_dir)
+    if args.write_config:
+        write_config(get_config_path(args.config), pin_dir, list(store.entries) + rels)
+
+    budget = parse_pin_budget(args.budget, store.pinned_bytes())
+    reserve = prefetch.parse_budget(args.reserve)
+    print(f"  Budget:      {format_size(budget)}  (reserve {format_size(reserve)} available memory)")
+    print()
+
+    keep = set(rels)
+    staged = skipped = 0
+    started = time.monotonic()
+    for rel in rels:
+        source = models_dir / rel
+        size = source.stat().st_size
+        if store.is_current(rel, source):
+            print(f"    {rel:<60s} already pinned")
+            continue
+        if rel in store.entries:
+            store.evict(rel)  # source changed since it was pinned
+
+        # Make room: evict least recently used pinned files that are not targets
+        def shortfall():
+            free = shutil.disk_usage(pin_dir).free
+            mem = prefetch.available_memory() - reserve
+            over_budget = store.pinned_bytes() + size - budget
+            return max(over_budget, size - free, size - mem, 0)
+
+        for victim in store.lru_candidates(keep):
+            if shortfall() <= 0:
+                break
+            freed = store.evict(victim)
+            print(f"    {victim:<60s} evicted ({format_size(freed)})")
+        if shortfall() > 0:
+            # Not enough memory: leave the file on its normal path
+            print(f"    {rel:<60s} skipped: {format_size(size)} does not fit, loads from models dir")
+            skipped += 1
+            continue
+
+        t0 = time.monotonic()
+        try:
+            store.stage(rel, source)
+        except OSError as e:
+            print(f"    {rel:<60s} failed: {e}")
+            skipped += 1
+            continue
+        seconds = time.monotonic() - t0
+        rate = size / seconds / 1024 ** 2 if seconds > 0 else 0
+        print(f"    {rel:<60s} {format_size(size):>9s}  {seconds:6.1f}s  {rate:7.0f} MB/s")
+        staged += 1
+        sys.stdout.flush()
+
+    print()
+    print(f"  Staged {staged} file(s) in {time.monotonic() - started:.1f}s, {skipped} skipped; "
+          f"{format_size(store.pinned_bytes())} pinned")
+    print()
+
+
+def cmd_evict(args, parser):
+    models_dir = prefetch.get_models_dir(args.models_dir)
+    pin_dir = get_pin_dir(args.pin_dir)
+    if not pin_dir.is_dir():
+        print(f"  Nothing pinned ({pin_dir} does not exist)")
+        return
+    store = PinStore(pin_dir, models_dir)
+    if args.all:
+        rels = list(store.entries)
+    else:
+        rels, _ = resolve(args, parser, models_dir)
+    freed = 0
+    for rel in rels:
+        if rel in store.entries:
+            freed += store.evict(rel)
+            print(f"    {rel:<60s} evicted")
+    print(f"  Freed {format_size(freed)}; {format_size(store.pinned_bytes())} still pinned")
+
+
+def cmd_status(args, parser):
+    models_dir = prefetch.get_models_dir(args.models_dir)
+    pin_dir = get_pin_dir(args.pin_dir)
+    header("ComfyUI pinned models", pin_dir, models_dir)
+    print(f"  Config:      {get_config_path(args.config)}")
+    print(f"  Available:   {format_size(prefetch.available_memory())} memory")
+    print()
+    if not pin_dir.is_dir():
+        print("  Nothing pinned.")
+        print()
+        return
+    store = PinStore(pin_dir, models_dir)
+    now = time.time()
+    for rel in sorted(store.entries, key=store.last_used, reverse=True):
+        source = models_dir / rel
+        state = "" if source.exists() and store.is_current(rel, source) else "  (stale: source changed)"
+        idle = (now - store.last_used(rel)) / 3600
+        print(f"    {rel:<60s} {format_size(store.entries[rel]['size']):>9s}  used {idle:6.1f}h ago{state}")
+    print(f"    {'total':<60s} {format_size(store.pinned_bytes()):>9s}")
+    print()
+
+
+def cmd_config(args, parser):
+    pin_dir = get_pin_dir(args.pin_dir)
+    models_dir = prefetch.get_models_dir(args.models_dir)
+    rels = list(PinStore(pin_dir, models_dir).entries) if pin_dir.is_dir() else []
+    if args.targets or os.environ.get("COMFYUI_PIN"):
+        rels += resolve(args, parser, models_dir)[0]
+    path = get_config_path(args.config)
+    folders = write_config(path, pin_dir, rels)
+    print(f"  Wrote {path} ({', '.join(folders) or 'no folders'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-pin-models",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=("stage", "evict", "status", "config"))
+    parser.add_argument("targets", nargs="*", help="workflows, model names or paths")
+    parser.add_argument("--pin-dir", type=str, default=None,
+                        help="RAM-backed directory (default: $COMFYUI_PIN_DIR or /dev/shm/comfyui-pinned-$USER)")
+    parser.add_argument("--budget", type=str, default=os.environ.get("COMFYUI_PIN_BUDGET", "40%"),
+                        help="maximum bytes pinned, e.g. 32G or 40%% of available memory (default: 40%%)")
+    parser.add_argument("--reserve", type=str, default=os.environ.get("COMFYUI_PIN_RESERVE", "8G"),
+                        help="available memory to leave after each copy (default: 8G)")
+    parser.add_argument("--config", type=str, default=None,
+                        help=f"extra_model_paths YAML to write (default: $FLOX_ENV_CACHE/{CONFIG_NAME})")
+    parser.add_argument("--write-config", action="store_true",
+                        help="stage: also write the config before copying")
+    parser.add_argument("--all", action="store_true", help="evict: remove every pinned file")
+    parser.add_argument("--models-dir", type=str, default=None,
+                        help="override model directory (default: ~/comfyui-work/models)")
+    args = parser.parse_args()
+
+    commands = {"stage": cmd_stage, "evict": cmd_evict, "status": cmd_status, "config": cmd_config}
+    commands[args.command](args, parser)
+
+
+if __name__ == "__main__":
+    main()
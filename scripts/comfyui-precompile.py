@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Byte-compile the ComfyUI runtime into a writable PYTHONPYCACHEPREFIX."""
+import argparse
+import compileall
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import sysconfig
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+DESCRIPTION = """\
+Byte-compile ComfyUI, its custom nodes and the venv ahead of time.
+
+The ComfyUI source is symlinked from the read-only Nix store, so Python
+cannot write __pycache__ next to it and recompiles every comfy/ module on
+each service start. comfyui-start exports PYTHONPYCACHEPREFIX, which makes
+Python keep all bytecode in one writable tree instead:
+
+  $FLOX_ENV_CACHE/pycache/<flox env store path>/
+
+'build' fills that tree in parallel before the first start, from:
+  - the ComfyUI runtime directory, following its symlinks into the store
+    (custom nodes included)
+  - every sys.path directory of the interpreter: the venv, the Flox env
+    site-packages and the standard library (with a prefix set, Python no
+    longer reads the __pycache__ directories shipped in the store)
+
+Store files all carry the same mtime, so a .pyc can look current for a
+changed source. The tree is therefore keyed by the Flox env's store path:
+a new environment generation starts a new tree and 'build' removes the
+old ones. Modules missed by 'build' are written by Python itself on first
+import.
+
+Commands:
+  build    Compile everything that is missing or stale (default)
+  measure  Time a cold ComfyUI import without and with the prefix
+"""
+
+EPILOG = """\
+environment variables:
+  FLOX_ENV                    Flox environment (its store path keys the tree)
+  FLOX_ENV_CACHE              Cache root (tree under $FLOX_ENV_CACHE/pycache)
+  COMFYUI_PYCACHE             Set to 0 to disable the prefix in comfyui-start
+
+examples:
+  comfyui-precompile build                  What comfyui-setup runs after an update
+  comfyui-precompile build --jobs 4
+  comfyui-precompile measure --runs 5       Cold import time before/after
+
+Run it with the ComfyUI venv python ($FLOX_ENV_CACHE/venv/bin/python) so
+the venv's sys.path is compiled; comfyui-setup does this in the background.
+'measure' imports ComfyUI's nodes module in a fresh interpreter (CPU mode)
+without the prefix -- today's behaviour -- and with it, and reports the
+median of --runs each.
+"""
+
+SKIP_DIRS = {"__pycache__", ".git", "node_modules"}
+# Runtime entries that hold data, not code
+SKIP_RUNTIME = {"models", "input", "output", "temp", "user", "web"}
+CHUNK = 64
+
+
+def get_cache_root():
+    return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui"))
+
+
+def get_prefix(cache_root):
+    """$FLOX_ENV_CACHE/pycache/<basename of the Flox env's store path> (same as comfyui-start)."""
+    flox_env = os.environ.get("FLOX_ENV")
+    key = Path(os.path.realpath(flox_env)).name if flox_env else "default"
+    return cache_root / "pycache" / key
+
+
+def python_files(root, skip=()):
+    """Every .py under root, with paths as Python will import them (symlinks not resolved)."""
+    for dirpath, dirnames, filenames in os.walk(root, followlinks=True):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")
+                       and not (dirpath == str(root) and d in skip)]
+        for name in filenames:
+            if name.endswith(".py"):
+                yield os.path.join(dirpath, name)
+
+
+def search_roots(runtime, extra):
+    roots = [(runtime, SKIP_RUNTIME)] if runtime.is_dir() else []
+    # main.py is a symlink: sys.path[0] is its resolved (store) directory
+    if (runtime / "main.py").exists():
+        roots.append((Path(os.path.realpath(runtime / "main.py")).parent, SKIP_RUNTIME))
+    stdlib = sysconfig.get_paths()["stdlib"]
+    for entry in [*extra, *sys.path]:
+        path = Path(entry) if entry else None
+        if path is None or not path.is_dir() or path == runtime:
+            continue
+        # site-packages inside the stdlib directory are listed separately
+        skip = {"site-packages", "dist-packages", "test", "idlelib", "tkinter", "turtledemo"} \
+            if str(path) == stdlib else ()
+        roots.append((path, skip))
+    seen, unique = set(), []
+    for path, skip in roots:
+        if str(path) not in seen:
+            seen.add(str(path))
+            unique.append((path, skip))
+    return unique
+
+
+def init_worker(prefix):
+    sys.pycache_prefix = prefix
+    warnings.simplefilter("ignore")  # SyntaxWarnings of third-party code
+
+
+def compile_chunk(files):
+    failed = []
+    for path in files:
+        try:
+            if not compileall.compile_file(path, quiet=2):
+                failed.append(path)
+        except (OSError, ValueError):
+            failed.append(path)
+    return failed
+
+
+def cmd_build(args):
+    prefix = Path(args.prefix) if args.prefix else get_prefix(get_cache_root())
+    runtime = Path(args.runtime) if args.runtime else get_cache_root() / "comfyui-runtime"
+    prefix.mkdir(parents=True, exist_ok=True)
+
+    # Older trees belong to previous environment generations
+    if prefix.parent == get_cache_root() / "pycache":
+        for old in prefix.parent.iterdir():
+            if old.is_dir() and old != prefix:
+                shutil.rmtree(old, ignore_errors=True)
+
+    started = time.monotonic()
+    files = []
+    for root, skip in search_roots(runtime, args.path):
+        files.extend(python_files(root, skip))
+    files = list(dict.fromkeys(files))
+    print(f"  Prefix:  {prefix}")
+    print(f"  Sources: {len(files)} files, {args.jobs} jobs")
+
+    failed = []
+    chunks = [files[i:i + CHUNK] for i in range(0, len(files), CHUNK)]
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                             initargs=(str(prefix),)) as pool:
+        for bad in pool.map(compile_chunk, chunks):
+            failed.extend(bad)
+    # Files with syntax errors (py2 leftovers, templates) are reported, not fatal
+    print(f"  Compiled in {time.monotonic() - started:.1f}s ({len(failed)} not compilable)")
+    if args.verbose:
+        for path in failed:
+            print(f"    {path}")
+    (prefix / ".complete").write_text(f"{len(files)}\n")
+
+
+def time_import(python, runtime, env, runs):
+    code = ("import os, sys; sys.argv = ['main.py', '--cpu']; "
+            f"os.chdir({str(runtime)!r}); sys.path.insert(0, {str(runtime)!r}); import nodes")
+    samples = []
+    for _ in range(runs):
+        start = time.monotonic()
+        proc = subprocess.run([python, "-c", code], env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            tail = (proc.stderr.strip().splitlines() or ["(no output)"])[-1]
+            raise RuntimeError(f"import failed: {tail}")
+        samples.append(time.monotonic() - start)
+    return statistics.median(samples)
+
+
+def cmd_measure(args):
+    prefix = Path(args.prefix) if args.prefix else get_prefix(get_cache_root())
+    runtime = Path(args.runtime) if args.runtime else get_cache_root() / "comfyui-runtime"
+    if not (runtime / "main.py").exists():
+        print(f"ERROR: ComfyUI runtime not found at {runtime} (run comfyui-setup first).")
+        sys.exit(1)
+    if not (prefix / ".complete").exists():
+        print(f"  {prefix} has not been built; building first.")
+        cmd_build(args)
+        print()
+
+    base_env = {k: v for k, v in os.environ.items() if k not in ("PYTHONPYCACHEPREFIX", "PYTHONDONTWRITEBYTECODE")}
+    print(f"  Cold import of ComfyUI nodes ({args.runs} runs each, median)")
+    try:
+        before = time_import(sys.executable, runtime, base_env, args.runs)
+        print(f"    without prefix: {before:7.2f}s")
+        after = time_import(sys.executable, runtime, {**base_env, "PYTHONPYCACHEPREFIX": str(prefix)}, args.runs)
+        print(f"    with prefix:    {after:7.2f}s   ({before - after:+.2f}s saved)")
+    except RuntimeError as e:
+        print(f"  ERROR: {e}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-precompile",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", default="build", choices=("build", "measure"))
+    parser.add_argument("--prefix", type=str, default=None,
+                        help="bytecode tree (default: $FLOX_ENV_CACHE/pycache/<store key>)")
+    parser.add_argument("--runtime", type=str, default=None,
+                        help="ComfyUI runtime directory (default: $FLOX_ENV_CACHE/comfyui-runtime)")
+    parser.add_argument("--path", action="append", default=[],
+                        help="additional directory to compile (repeatable)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="parallel compile processes (default: all CPUs)")
+    parser.add_argument("--runs", type=int, default=3, help="measure: imports per variant (default: 3)")
+    parser.add_argument("--verbose", action="store_true", help="build: list files that did not compile")
+    args = parser.parse_args()
+
+    {"build": cmd_build, "measure": cmd_measure}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""Warm the page cache with model files before the first ComfyUI job."""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DESCRIPTION = """\
+Prefetch ComfyUI model files into the page cache.
+
+The first FLUX or Wan 2.2 job after a service start spends a long time on
+cold disk reads of multi-GB weights (flux1-dev.safetensors, the 14B fp8
+diffusion models, t5xxl/umt5 encoders). This tool reads the model files
+referenced by a set of workflows (or named directly) into the page cache
+ahead of time, stops at a memory budget, and reports how much of each
+file is resident (mincore).
+
+Targets can be:
+  - workflow JSON files (API or UI format): every *.safetensors, *.ckpt,
+    *.pt, *.pth, *.bin, *.gguf, *.sft name they mention is resolved
+  - model file names (flux1-dev.safetensors) or paths relative to the
+    models directory (bbox/face_yolov8m.pt)
+  - absolute paths to model files
+
+Warming methods:
+  fadvise   posix_fadvise(WILLNEED): the kernel reads ahead asynchronously
+  read      parallel sequential reads (works everywhere, incl. macOS)
+  auto      fadvise where available, then read to make sure (default)
+
+Commands:
+  warm      Read targets into the page cache (default)
+  status    Only report residency; read nothing
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_MODELS_DIR          Override model directory
+  COMFYUI_WORK_DIR            Override work directory (models in $COMFYUI_WORK_DIR/models)
+  COMFYUI_PREFETCH            Targets for comfyui-start (comma-separated)
+  COMFYUI_PREFETCH_BUDGET     Memory budget for comfyui-start (default: 50%)
+
+examples:
+  comfyui-prefetch warm flux-txt2img.json              Warm everything FLUX needs
+  comfyui-prefetch warm wan2.2_i2v_high_noise_14B_fp8_scaled.safetensors --budget 20G
+  comfyui-prefetch status flux-txt2img.json            Show resident percentage
+
+  COMFYUI_PREFETCH=flux-txt2img flox services restart comfyui
+
+comfyui-start runs 'warm' in the background when COMFYUI_PREFETCH is set.
+Bare workflow names (flux-txt2img) are looked up among the bundled API
+workflows. The budget accepts bytes (24G) or a share of available memory
+(50%); files are warmed in the order given and the last one is warmed
+partially if the budget runs out.
+"""
+
+MODEL_SUFFIXES = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft", ".onnx")
+READ_CHUNK = 16 * 1024 * 1024
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+PROT_READ = 0x1
+MAP_SHARED = 0x1
+
+
+def get_models_dir(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get(
+        "COMFYUI_MODELS_DIR",
+        os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")) + "/models"
+    ))
+
+
+def get_workflows_dir():
+    flox_env = os.environ.get("FLOX_ENV")
+    if flox_env:
+        return Path(flox_env) / "share/comfyui/workflows/api"
+    return Path(__file__).resolve().parent.parent / "sources/workflows/api"
+
+
+def available_memory():
+    """MemAvailable on Linux; free+inactive pages elsewhere (best effort)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError):
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+
+
+def parse_budget(text):
+    """Parse '24G', '512M', a byte count, or '50%' of available memory."""
+    text = text.strip().upper().rstrip("B")
+    if text.endswith("%"):
+        return int(available_memory() * float(text[:-1]) / 100)
+    unit = text[-1] if text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def format_size(n):
+    return f"{n / 1024 ** 3:.1f} GB" if n >= 1024 ** 3 else f"{n / 1024 ** 2:.0f} MB"
+
+
+def model_names_in(obj):
+    """Yield every string in a workflow that looks like a model file name."""
+    if isinstance(obj, dict):
+        for value in obj.values():
+            yield from model_names_in(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from model_names_in(value)
+    elif isinstance(obj, str) and obj.lower().endswith(MODEL_SUFFIXES):
+        yield obj
+
+
+class ModelLocator:
+    """Resolve model names against the models directory, walking it once."""
+
+    def __init__(self, models_dir):
+        self.models_dir = models_dir
+        self._files = None
+
+    def _index(self):
+        if self._files is None:
+            self._files = []
+            for dirpath, dirnames, filenames in os.walk(self.models_dir, followlinks=True):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for name in filenames:
+                    if name.lower().endswith(MODEL_SUFFIXES):
+                        self._files.append(Path(dirpath) / name)
+        return self._files
+
+    def find(self, name):
+        name = name.replace("\\", "/")
+        for path in self._index():
+            rel = path.relative_to(self.models_dir).as_posix()
+            if rel == name or rel.endswith("/" + name):
+                return path
+        return None
+
+
+def resolve_targets(targets, locator):
+    """Expand workflows and names to an ordered, de-duplicated list of model files."""
+    files, missing, seen = [], [], set()
+
+    def add(path):
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            files.append(Path(path))
+
+    for target in targets:
+        target = target.strip()
+        if not target:
+            continue
+        workflow = None
+        if target.endswith(".json") and os.path.isfile(target):
+            workflow = Path(target)
+        elif not target.lower().endswith(MODEL_SUFFIXES):
+            matches = sorted(get_workflows_dir().glob(f"*/{Path(target).stem}.json"))
+            workflow = matches[0] if matches else None
+            if workflow is None:
+                missing.append(target)
+                continue
+        if workflow is not None:
+            with open(workflow) as f:
+                names = list(dict.fromkeys(model_names_in(json.load(f))))
+        else:
+            names = [target]
+        for name in names:
+            if os.path.isabs(name) and os.path.isfile(name):
+                add(name)
+                continue
+            path = locator.find(name)
+            if path is None:
+                missing.append(name)
+            else:
+                add(path)
+    return files, missing
+
+
+class PageCache:
+    """posix_fadvise / mincore helpers; degrade gracefully where missing."""
+
+    def __init__(self):
+        self.page_size = mmap.PAGESIZE
+        self.libc = None
+        name = ctypes.util.find_library("c")
+        if name:
+            libc = ctypes.CDLL(name, use_errno=True)
+            if hasattr(libc, "mincore") and hasattr(libc, "mmap"):
+                libc.mmap.restype = ctypes.c_void_p
+                libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_long]
+                libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+                libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+                self.libc = libc
+
+    @property
+    def can_fadvise(self):
+        return hasattr(os, "posix_fadvise")
+
+    def resident_bytes(self, path):
+        """Bytes of path currently in the page cache, or None if unknown."""
+        size = os.path.getsize(path)
+        if self.libc is None or size == 0:
+            return None
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            addr = self.libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+            if addr in (None, ctypes.c_void_p(-1).value):
+                return None
+            try:
+                pages = (size + self.page_size - 1) // self.page_size
+                vec = (ctypes.c_ubyte * pages)()
+                if self.libc.mincore(addr, size, vec) != 0:
+                    return None
+                resident = sum(1 for b in bytes(vec) if b & 1)
+            finally:
+                self.libc.munmap(addr, size)
+        finally:
+            os.close(fd)
+        return min(resident * self.page_size, size)
+
+    def fadvise(self, path, length):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def read(path, length, offset=0):
+        """Sequentially read [offset, offset+length) and discard the data."""
+        buf = bytearray(READ_CHUNK)
+        view = memoryview(buf)
+        with open(path, "rb", buffering=0) as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                n = f.readinto(view[:min(READ_CHUNK, remaining)])
+                if not n:
+                    break
+                remaining -= n
+
+
+def plan(files, budget, cache):
+    """Return [(path, bytes_to_warm, cold_bytes, note)] in order, stopping at the budget.
+
+    Bytes already resident do not count against the budget or as cold.
+    """
+    planned, used = [], 0
+    for path in files:
+        size = path.stat().st_size
+        resident = cache.resident_bytes(path) or 0
+        need = size - resident
+        if need <= 0:
+            planned.append((path, 0, 0, "already resident"))
+            continue
+        if used + need > budget:
+            # Warm a prefix of the last file; the rest stays cold
+            remaining = max(0, budget - used)
+            if remaining:
+                planned.append((path, min(size, resident + remaining), remaining, "partial (budget)"))
+            else:
+                planned.append((path, 0, 0, "over budget"))
+            used = budget
+            continue
+        planned.append((path, size, need, ""))
+        used += need
+    return planned
+
+
+def warm_file(cache, path, length, method, jobs):
+    """Warm the first `length` bytes of a file; returns seconds spent.
+
+    Raises OSError if any slice could not be read.
+    """
+    start = time.monotonic()
+    if length <= 0:
+        return 0.0
+    if method in ("fadvise", "auto") and cache.can_fadvise:
+        cache.fadvise(path, length)
+        if method == "fadvise":
+            return time.monotonic() - start
+    # Parallel sequential reads over contiguous slices
+    slices = max(1, min(jobs, length // READ_CHUNK or 1))
+    step = -(-length // slices)
+    with ThreadPoolExecutor(max_workers=slices) as pool:
+        futures = [pool.submit(cache.read, path, min(step, length - offset), offset)
+                   for offset in range(0, length, step)]
+    for future in futures:
+        future.result()
+    return time.monotonic() - start
+
+
+def report(files, cache):
+    total = resident_total = 0
+    for path in files:
+        size = path.stat().st_size
+        resident = cache.resident_bytes(path)
+        total += size
+        if resident is None:
+            print(f"    {path.name:<55s} {format_size(size):>9s}  resident: unknown")
+            continue
+        resident_total += resident
+        pct = 100.0 * resident / size if size else 100.0
+        print(f"    {path.name:<55s} {format_size(size):>9s}  resident: {pct:5.1f}%")
+    if total:
+        print(f"    {'total':<55s} {format_size(total):>9s}  resident: {100.0 * resident_total / total:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-prefetch",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", choices=("warm", "status"), default="warm")
+    parser.add_argument("targets", nargs="*", help="workflows, model names or paths")
+    parser.add_argument("--budget", type=str, default=os.environ.get("COMFYUI_PREFETCH_BUDGET", "50%"),
+                        help="memory budget, e.g. 24G or 50%% of available memory (default: 50%%)")
+    parser.add_argument("--method", choices=("auto", "fadvise", "read"), default="auto",
+                        help="warming method (default: auto)")
+    parser.add_argument("--jobs", type=int, default=4, help="parallel readers per file (default: 4)")
+    parser.add_argument("--models-dir", type=str, default=None,
+                        help="override model directory (default: ~/comfyui-work/models)")
+    args = parser.parse_args()
+
+    targets = list(args.targets)
+    if not targets and os.environ.get("COMFYUI_PREFETCH"):
+        targets = os.environ["COMFYUI_PREFETCH"].split(",")
+    if not targets:
+        parser.error("no targets given (pass workflows/models or set COMFYUI_PREFETCH)")
+
+    models_dir = get_models_dir(args.models_dir)
+    cache = PageCache()
+    files, missing = resolve_targets(targets, ModelLocator(models_dir))
+
+    print()
+    print("=" * 70)
+    print("  ComfyUI model prefetch")
+    print("=" * 70)
+    print()
+    print(f"  Models dir:  {models_dir}")
+    for name in missing:
+        print(f"  Not found:   {name}")
+    if not files:
+        print("  Nothing to prefetch.")
+        print()
+        return
+
+    if args.command == "status":
+        print()
+        report(files, cache)
+        print()
+        return
+
+    budget = parse_budget(args.budget)
+    method = args.method
+    print(f"  Budget:      {format_size(budget)}  (method: {method})")
+    print()
+
+    started = time.monotonic()
+    warmed = failed = 0
+    for path, length, cold, note in plan(files, budget, cache):
+        if length == 0:
+            print(f"    {path.name:<55s} skipped: {note}")
+            continue
+        try:
+            seconds = warm_file(cache, path, length, method, args.jobs)
+        except OSError as e:
+            failed += 1
+            print(f"    {path.name:<55s} FAILED: {e}")
+            continue
+        warmed += cold
+        rate = cold / seconds / 1024 ** 2 if seconds > 0 else 0
+        print(f"    {path.name:<55s} {format_size(cold):>9s}  {seconds:6.1f}s  {rate:7.0f} MB/s  {note}")
+        sys.stdout.flush()
+
+    print()
+    print(f"  Warmed {format_size(warmed)} in {time.monotonic() - started:.1f}s")
+    if failed:
+        print(f"  {failed} file(s) could not be read")
+    print()
+    report(files, cache)
+    print()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
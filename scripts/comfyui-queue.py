@@ -0,0 +1,1141 @@
+#!/usr/bin/env python3
+"""Durable job queue in front of ComfyUI: jobs survive restarts and OOMs."""
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+DESCRIPTION = """\
+Keep ComfyUI jobs in a database until they have finished.
+
+ComfyUI's queue lives in process memory: restarting the service or an OOM
+kill loses every pending prompt. This service accepts API workflows,
+stores them in SQLite and feeds ComfyUI a few at a time. Jobs move
+through these states, and every transition is recorded with a timestamp:
+
+  queued -> submitting -> submitted -> completed | failed
+  queued | submitted -> cancelled
+
+The job id is also the prompt_id sent to ComfyUI, so resubmitting is
+idempotent. After a restart of either side, the dispatcher checks each
+submitting/submitted job against ComfyUI's /queue and /history:
+  - still queued or running in ComfyUI   -> left alone
+  - in the history                       -> completed / failed
+  - unknown (ComfyUI restarted or died)  -> queued again, up to
+                                            --max-attempts submissions
+Execution errors fail the job, except out-of-memory errors, which are
+retried like a lost job.
+
+Enqueues are group-committed: requests that arrive while a commit is in
+progress go into the next transaction, so one fsync covers hundreds of
+jobs. A response is sent only after its job is committed.
+
+Scheduling: every job belongs to a tenant and a priority class (high,
+normal, low) and has an estimated cost in GPU-seconds, derived from the
+workflow family (the model files it loads), sampler steps, resolution,
+frames and batch size. The next job is taken from the best priority class
+that has queued jobs; within a class, tenants share ComfyUI in proportion
+to their --weights (start-time fair queueing on estimated cost), and each
+tenant's jobs run in submission order. ComfyUI is handed at most --depth
+jobs and --backlog estimated seconds of work, so a new job never waits
+behind more than that plus the running job. When a higher-priority job
+arrives, lower-priority jobs still waiting in ComfyUI's queue are taken
+back and queued again here.
+
+Seed sweeps: queued jobs of one tenant, class and client_id whose graphs
+differ only in the KSampler seed are sent to ComfyUI as one graph that samples them
+as a batch, with the KSamplerSeedBatch node (ComfyUI-SeedBatch) giving
+each image the noise of its own seed. Each job gets its own image back.
+Only graphs that start from an empty latent of batch size 1, use a sampler
+that adds no noise while sampling (euler, dpmpp_2m, uni_pc, ...) and
+decode/save every image on its own are merged, at most --seed-batch at a
+time and no more than fit in GPU memory by a rough per-family estimate.
+
+HTTP API (port --port):
+  POST   /jobs                  {"prompt": {...}, "job_id"?, "client_id"?,
+                                 "extra_data"?, "tenant"?, "priority"?,
+                                 "cost"?} or {"jobs": [...]}; the headers
+                                X-Tenant and X-Priority set the defaults
+  POST   /prompt                ComfyUI-compatible; returns the job id as
+                                prompt_id (ComfyUI's /history works with it)
+  GET    /jobs/<id>             State, attempts, error, outputs, transitions
+  GET    /history/<id>          ComfyUI-style history of a finished job
+                                (also for jobs merged into a seed sweep)
+  GET    /jobs?state=queued     Newest jobs, optionally by state
+  DELETE /jobs/<id>             Cancel (removes it from ComfyUI if submitted)
+  GET    /queue/stats           Jobs per state, queued jobs and cost per tenant
+
+Commands:
+  serve    Run the queue service
+  status   Jobs per state, the oldest queued job, queued work per tenant
+  list     List jobs (--state, --limit)
+  retry    Queue failed jobs again (job ids, or --all-failed)
+  cancel   Cancel queued jobs (submitted ones: use DELETE on the service)
+  bench    Measure enqueue throughput against a temporary database
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_URL                  Upstream ComfyUI (default: http://127.0.0.1:$COMFYUI_PORT)
+  COMFYUI_PORT                 Upstream port (default: 8188)
+  COMFYUI_QUEUE_DB             Database: a path or sqlite:/// URL
+                               (default: $FLOX_ENV_CACHE/queue.sqlite)
+  COMFYUI_QUEUE_PORT           Service port (default: 8191)
+  COMFYUI_QUEUE_DEPTH          Jobs handed to ComfyUI at once (default: 2)
+  COMFYUI_QUEUE_BACKLOG        Estimated seconds of work handed to ComfyUI
+                               at once (default: 60)
+  COMFYUI_QUEUE_WEIGHTS        Tenant weights, e.g. "render=3,previews=1"
+                               (default: 1 for every tenant)
+  COMFYUI_QUEUE_SEED_BATCH     Most seed-sweep jobs merged into one batch
+                               (default: 8; 1 disables merging)
+
+examples:
+  comfyui-queue serve                                 Queue :8191 -> ComfyUI :8188
+  comfyui-queue serve --depth 4 --max-attempts 5
+  comfyui-queue serve --weights video=1,design=2 --backlog 30
+  curl -H 'X-Tenant: design' -H 'X-Priority: high' -d @graph.json localhost:8191/prompt
+  comfyui-queue serve --db "$COMFYUI_DATABASE_URL"    Tables in ComfyUI's database
+  comfyui-queue status
+  comfyui-queue retry --all-failed
+  comfyui-queue bench --jobs 20000 --concurrency 128
+
+Tables are prefixed queue_, so they can live in ComfyUI's own SQLite
+database (--db "$COMFYUI_DATABASE_URL"). comfyui-start replaces that
+file when its migration revision is unknown, so a separate file is the
+safer default. Only SQLite is supported. serve and bench need aiohttp;
+run them with the ComfyUI venv python.
+
+Costs are estimates for relative scheduling, not predictions: jobs can
+pass "cost" (seconds) when they know better. Priority classes are not
+access-controlled; put the service behind something that sets X-Tenant
+and X-Priority if tenants should not choose their own.
+"""
+
+ACTIVE = ("submitting", "submitted")
+FINAL = ("completed", "failed", "cancelled")
+POLL_INTERVAL = 0.5
+BACKOFF_MAX = 30.0
+MAX_COMMIT_BATCH = 2000
+JOB_ID_MAX = 128
+PRIORITIES = ("high", "normal", "low")
+DEFAULT_TENANT = "default"
+
+# Workflow families by model file name (video first: their graphs may also
+# load an image model), with reference GPU-seconds per sampler step per
+# megapixel per frame (RTX 4090 class, roughly) and the megapixels assumed
+# when the graph does not say (img2img and upscale take an input image)
+FAMILIES = (
+    ("wan", ("wan",), 0.7, 0.4),
+    ("hunyuan", ("hunyuan", "framepack"), 0.8, 0.4),
+    ("flux", ("flux",), 0.55, 1.0),
+    ("sd3", ("sd3",), 0.3, 1.0),
+    ("sdxl", ("sd_xl", "sdxl"), 0.15, 1.0),
+    ("sd15", ("v1-5", "sd15", "sd1.5", "sd_1.5"), 0.2, 0.25),
+)
+UNKNOWN_FAMILY = (None, (), 0.3, 1.0)
+JOB_OVERHEAD = 1.0  # text encode, VAE decode, saving
+DEFAULT_STEPS = 20
+FRAMEPACK_FPS = 30
+
+# Seed sweeps: graphs whose only KSampler starts from an empty latent of
+# batch_size 1 and whose later nodes treat every image on its own
+SEED_BATCH_NODE = "KSamplerSeedBatch"
+SAMPLER_NODES = {"KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced", SEED_BATCH_NODE}
+LATENT_NODES = {"EmptyLatentImage", "EmptySD3LatentImage"}
+PER_SAMPLE_NODES = {"VAEDecode", "VAEDecodeTiled", "SaveImage", "PreviewImage", "ImageScale", "ImageScaleBy",
+                    "ImageUpscaleWithModel", "ImageSharpen"}
+# Samplers that add no noise while sampling; ancestral/SDE ones draw it for the whole batch from one seed
+SWEEP_SAMPLERS = {"euler", "euler_cfg_pp", "heun", "heunpp2", "dpm_2", "lms", "dpmpp_2m", "dpmpp_2m_cfg_pp",
+                  "ipndm", "ipndm_v", "deis", "res_multistep", "res_multistep_cfg_pp", "gradient_estimation",
+                  "gradient_estimation_cfg_pp", "uni_pc", "uni_pc_bh2"}
+# Memory model for merged sweeps, after ComfyUI's BaseModel.memory_required with
+# fp16 attention: latent area (x2 with CFG) x 2 bytes x 0.01 x memory_usage_factor
+# MiB per sample, next to the diffusion model's weights (GB)
+SAMPLING_MEMORY = {
+    "sd15": (1.7, 2.0),
+    "sdxl": (5.1, 0.8),
+    "sd3": (8.0, 1.6),
+    "flux": (12.0, 2.8),
+    None: (6.0, 2.0),
+}
+MEMORY_RESERVE_GB = 1.5  # CUDA context, VAE, fragmentation
+LATENT_SCALE = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_jobs (
+    seq       INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id    TEXT NOT NULL UNIQUE,
+    state     TEXT NOT NULL,
+    payload   TEXT NOT NULL,
+    prompt_id TEXT,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    error     TEXT,
+    outputs   TEXT,
+    created   REAL NOT NULL,
+    updated   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_jobs_state ON queue_jobs(state, seq);
+CREATE TABLE IF NOT EXISTS queue_events (
+    job_id TEXT NOT NULL,
+    at     REAL NOT NULL,
+    state  TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS queue_events_job ON queue_events(job_id);
+"""
+# Added after the first release; existing databases get them with ALTER TABLE
+COLUMNS = {
+    "tenant": f"TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'",
+    "priority": "INTEGER NOT NULL DEFAULT 1",
+    "cost": f"REAL NOT NULL DEFAULT {JOB_OVERHEAD}",
+    "sweep": "TEXT",
+    "batch_index": "INTEGER",
+}
+
+
+def get_url(override=None):
+    if override:
+        return override.rstrip("/")
+    if os.environ.get("COMFYUI_URL"):
+        return os.environ["COMFYUI_URL"].rstrip("/")
+    return f"http://127.0.0.1:{os.environ.get('COMFYUI_PORT', '8188')}"
+
+
+def get_db_path(override=None):
+    value = override or os.environ.get("COMFYUI_QUEUE_DB")
+    if not value:
+        return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui")) / "queue.sqlite"
+    if "://" in value:
+        if not value.startswith("sqlite:///"):
+            raise ValueError(f"only sqlite:/// database URLs are supported: {value}")
+        value = value[len("sqlite:///"):]
+    return Path(value)
+
+
+def parse_weights(value):
+    """{tenant: weight} from "a=3,b=1"."""
+    weights = {}
+    for item in filter(None, (v.strip() for v in (value or "").split(","))):
+        tenant, _, weight = item.partition("=")
+        try:
+            weights[tenant.strip()] = float(weight)
+        except ValueError:
+            raise ValueError(f"tenant weights must look like name=3,other=1, got {item!r}")
+        if weights[tenant.strip()] <= 0:
+            raise ValueError(f"tenant weight must be positive: {item!r}")
+    return weights
+
+
+def workflow_family(prompt):
+    """FAMILIES entry for the model files an API graph loads (UNKNOWN_FAMILY if none matches)."""
+    names = [str(v).lower() for node in prompt.values() if isinstance(node, dict)
+             for k, v in node.get("inputs", {}).items()
+             if isinstance(v, str) and (k.endswith("_name") or k == "model")]
+    for family in FAMILIES:
+        if any(p in name for name in names for p in family[1]):
+            return family
+    return UNKNOWN_FAMILY
+
+
+def estimate_cost(prompt):
+    """Estimated GPU-seconds for an API graph: family rate x steps x megapixels x frames x batch.
+
+    Steps are summed over all samplers (scaled by denoise, or the
+    start/end range of advanced samplers); upscale_by enlarges the area.
+    """
+    _, _, per_step, native = workflow_family(prompt)
+    steps, megapixels, frames, batch, upscale = 0.0, None, 1, 1, 1.0
+    for node in prompt.values():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        number = {k: v for k, v in inputs.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        if "steps" in number:
+            taken = number["steps"]
+            if "end_at_step" in number or "start_at_step" in number:
+                taken = min(number.get("end_at_step", taken), taken) - number.get("start_at_step", 0)
+            steps += max(0, taken) * min(1.0, max(0.0, number.get("denoise", 1.0)))
+        if megapixels is None and "width" in number and "height" in number:
+            megapixels = number["width"] * number["height"] / 1e6
+            batch = int(number.get("batch_size", 1)) or 1
+        for key in ("length", "num_frames", "frames"):
+            if key in number:
+                frames = max(frames, int(number[key]))
+        if "total_second_length" in number:
+            frames = max(frames, int(number["total_second_length"] * FRAMEPACK_FPS))
+        if "upscale_by" in number:
+            upscale = max(upscale, number["upscale_by"])
+    megapixels = (megapixels or native) * upscale ** 2
+    return JOB_OVERHEAD + per_step * (steps or DEFAULT_STEPS) * megapixels * frames * batch
+
+
+class JobStore:
+    """SQLite table of jobs plus their state transitions. Thread-safe; one writer at a time."""
+
+    def __init__(self, path, synchronous="NORMAL"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: committed jobs survive a crash of this process or ComfyUI; FULL also a power loss
+        self.db.execute(f"PRAGMA synchronous={synchronous}")
+        self.db.executescript(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(queue_jobs)")}
+        for name, definition in COLUMNS.items():
+            if name not in columns:
+                self.db.execute(f"ALTER TABLE queue_jobs ADD COLUMN {name} {definition}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS queue_jobs_tenant ON queue_jobs(state, priority, tenant, seq)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS queue_jobs_sweep ON queue_jobs(sweep, state, seq)")
+        self.commits = 0
+
+    def insert_many(self, jobs):
+        """Insert (job_id, payload_json, tenant, priority, cost, sweep) tuples in one transaction.
+
+        Returns (seq, state, duplicate) per job; an existing job_id is left
+        untouched, which makes client retries of the same enqueue harmless.
+        """
+        now = time.time()
+        results = []
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for job_id, payload, tenant, priority, cost, sweep in jobs:
+                    cur = self.db.execute(
+                        "INSERT OR IGNORE INTO queue_jobs "
+                        "(job_id, state, payload, tenant, priority, cost, sweep, created, updated) "
+                        "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, payload, tenant, priority, cost, sweep, now, now))
+                    if cur.rowcount:
+                        self.db.execute("INSERT INTO queue_events (job_id, at, state) VALUES (?, ?, 'queued')",
+                                        (job_id, now))
+                        results.append((cur.lastrowid, "queued", False))
+                    else:
+                        seq, state = self.db.execute("SELECT seq, state FROM queue_jobs WHERE job_id = ?",
+                                                     (job_id,)).fetchone()
+                        results.append((seq, state, True))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.commits += 1
+        return results
+
+    def transition(self, job_id, state, detail=None, expect=None, **fields):
+        """Move a job to state (only from one of the expect states, if given). Returns True if it moved."""
+        now = time.time()
+        sets = ", ".join(["state = ?", "updated = ?"] + [f"{k} = ?" for k in fields])
+        where, params = "job_id = ?", [job_id]
+        if expect:
+            where += f" AND state IN ({', '.join('?' * len(expect))})"
+            params += list(expect)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self.db.execute(f"UPDATE queue_jobs SET {sets} WHERE {where}",
+                                      [state, now, *fields.values(), *params])
+                if cur.rowcount:
+                    self.db.execute("INSERT INTO queue_events (job_id, at, state, detail) VALUES (?, ?, ?, ?)",
+                                    (job_id, now, state, detail))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return cur.rowcount > 0
+
+    def candidates(self, per_queue):
+        """The oldest per_queue queued jobs of every (priority, tenant) queue, for the scheduler."""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {JOB_COLUMNS} FROM (SELECT *, ROW_NUMBER() OVER "
+                f"(PARTITION BY priority, tenant ORDER BY seq) AS n FROM queue_jobs WHERE state = 'queued') "
+                f"WHERE n <= ? ORDER BY seq", (per_queue,)).fetchall()
+        return [Job(*row) for row in rows]
+
+    def sweep_partners(self, job, count):
+        """Up to count other queued jobs of job's tenant and priority with its sweep key, oldest first."""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {JOB_COLUMNS} FROM queue_jobs WHERE sweep = ? AND state = 'queued' AND tenant = ? "
+                f"AND priority = ? AND job_id != ? ORDER BY seq LIMIT ?",
+                (job.sweep, job.tenant, job.priority, job.job_id, count)).fetchall()
+        return [Job(*row) for row in rows]
+
+    def active(self):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {JOB_COLUMNS.replace('payload', 'NULL')} FROM queue_jobs "
+                f"WHERE state IN ({', '.join('?' * len(ACTIVE))}) ORDER BY seq", ACTIVE).fetchall()
+        return [Job(*row) for row in rows]
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT job_id, seq, state, tenant, priority, cost, prompt_id, attempts, error, outputs, "
+                "created, updated FROM queue_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            events = self.db.execute("SELECT at, state, detail FROM queue_events WHERE job_id = ? ORDER BY rowid",
+                                     (job_id,)).fetchall()
+        job = job_row(row)
+        job["transitions"] = [{"at": at, "state": state, "detail": detail} for at, state, detail in events]
+        return job
+
+    def list(self, state=None, limit=50):
+        query = ("SELECT job_id, seq, state, tenant, priority, cost, prompt_id, attempts, error, NULL, "
+                 "created, updated FROM queue_jobs")
+        params = []
+        if state:
+            query += " WHERE state = ?"
+            params.append(state)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return [job_row(r) for r in self.db.execute(query, params).fetchall()]
+
+    def counts(self):
+        with self.lock:
+            counts = dict(self.db.execute("SELECT state, COUNT(*) FROM queue_jobs GROUP BY state").fetchall())
+            oldest = self.db.execute("SELECT MIN(created) FROM queue_jobs WHERE state = 'queued'").fetchone()[0]
+        return counts, oldest
+
+    def tenants(self):
+        """{tenant: (queued jobs, queued estimated seconds)}."""
+        with self.lock:
+            rows = self.db.execute("SELECT tenant, COUNT(*), SUM(cost) FROM queue_jobs "
+                                   "WHERE state = 'queued' GROUP BY tenant ORDER BY tenant").fetchall()
+        return {tenant: (count, cost) for tenant, count, cost in rows}
+
+
+JOB_COLUMNS = "job_id, state, prompt_id, attempts, tenant, priority, cost, sweep, batch_index, payload"
+Job = namedtuple("Job", JOB_COLUMNS)
+
+
+def job_row(row):
+    job_id, seq, state, tenant, priority, cost, prompt_id, attempts, error, outputs, created, updated = row
+    return {"job_id": job_id, "number": seq, "state": state, "tenant": tenant, "priority": PRIORITIES[priority],
+            "cost": round(cost, 1), "prompt_id": prompt_id, "attempts": attempts, "error": error,
+            "outputs": json.loads(outputs) if outputs else None, "created": created, "updated": updated}
+
+
+def new_job(body, tenant=None, priority=None):
+    """Row for JobStore.insert_many from a request body; raises ValueError on a malformed job.
+
+    tenant and priority are the request's defaults (X-Tenant/X-Priority
+    headers); the body's own fields take precedence.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get("prompt"), dict):
+        raise ValueError("a job needs a 'prompt' object (an API workflow)")
+    job_id = body.get("job_id") or body.get("prompt_id") or str(uuid.uuid4())
+    if not isinstance(job_id, str) or len(job_id) > JOB_ID_MAX:
+        raise ValueError(f"job_id must be a string of at most {JOB_ID_MAX} characters")
+    tenant = body.get("tenant") or tenant or DEFAULT_TENANT
+    if not isinstance(tenant, str) or len(tenant) > JOB_ID_MAX:
+        raise ValueError(f"tenant must be a string of at most {JOB_ID_MAX} characters")
+    priority = body.get("priority") or priority or "normal"
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    cost = body.get("cost")
+    if cost is None:
+        cost = estimate_cost(body["prompt"])
+    elif not isinstance(cost, (int, float)) or cost <= 0:
+        raise ValueError("cost must be a positive number of seconds")
+    payload = {"prompt": body["prompt"]}
+    for key in ("client_id", "extra_data"):
+        if key in body:
+            payload[key] = body[key]
+    return (job_id, json.dumps(payload, separators=(",", ":")), tenant, PRIORITIES.index(priority), float(cost),
+            sweep_key(payload))
+
+
+def sweep_nodes(prompt):
+    """(sampler id, empty latent id) if the graph can join a merged seed sweep, else None."""
+    try:
+        samplers = [k for k, node in prompt.items() if node.get("class_type") in SAMPLER_NODES]
+        if len(samplers) != 1 or prompt[samplers[0]]["class_type"] != "KSampler":
+            return None
+        inputs = prompt[samplers[0]]["inputs"]
+        link = inputs.get("latent_image")
+        if not isinstance(inputs.get("seed"), int) or inputs.get("sampler_name") not in SWEEP_SAMPLERS \
+                or not isinstance(link, list):
+            return None
+        latent = prompt[str(link[0])]
+        if latent["class_type"] not in LATENT_NODES or latent["inputs"].get("batch_size") != 1:
+            return None
+        downstream, frontier = set(), {samplers[0]}
+        while frontier:
+            frontier = {k for k, node in prompt.items() if k not in downstream and any(
+                isinstance(v, list) and len(v) == 2 and str(v[0]) in frontier for v in node["inputs"].values())}
+            downstream |= frontier
+        if any(prompt[k]["class_type"] not in PER_SAMPLE_NODES for k in downstream):
+            return None
+        return samplers[0], str(link[0])
+    except (AttributeError, KeyError, TypeError, IndexError):
+        return None
+
+
+def sweep_key(payload):
+    """Hash of a payload with the KSampler seed left out; jobs with equal keys form a seed sweep.
+
+    The client_id is part of the key: a merged prompt is sent with one
+    client_id, and ComfyUI sends its websocket events only to that client.
+    """
+    nodes = sweep_nodes(payload["prompt"])
+    if nodes is None:
+        return None
+    prompt = copy.deepcopy(payload["prompt"])
+    del prompt[nodes[0]]["inputs"]["seed"]
+    for node in prompt.values():
+        node.pop("_meta", None)
+    stripped = {"prompt": prompt, "client_id": payload.get("client_id"), "extra_data": payload.get("extra_data")}
+    return hashlib.sha256(json.dumps(stripped, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def merge_sweep(payloads):
+    """One payload that samples a seed sweep as a batch, image i with the seed of payloads[i]."""
+    merged = copy.deepcopy(payloads[0])
+    sampler_id, latent_id = sweep_nodes(merged["prompt"])
+    seeds = [p["prompt"][sampler_id]["inputs"]["seed"] for p in payloads]
+    merged["prompt"][latent_id]["inputs"]["batch_size"] = len(payloads)
+    merged["prompt"][sampler_id]["class_type"] = SEED_BATCH_NODE
+    merged["prompt"][sampler_id]["inputs"]["seeds"] = ",".join(str(seed) for seed in seeds)
+    return merged
+
+
+def split_outputs(outputs, index):
+    """The outputs of image index of a merged seed sweep."""
+    return {node: {key: value[index:index + 1] if key == "images" and isinstance(value, list) else value
+                   for key, value in output.items()}
+            for node, output in outputs.items()}
+
+
+def seed_batch_fit(prompt, vram):
+    """Samples of a sweep graph that fit in vram bytes at once, by the SAMPLING_MEMORY model."""
+    weights, factor = SAMPLING_MEMORY.get(workflow_family(prompt)[0], SAMPLING_MEMORY[None])
+    sampler_id, latent_id = sweep_nodes(prompt)
+    latent = prompt[latent_id]["inputs"]
+    width, height = (v if isinstance(v, int) else 1024 for v in (latent.get("width"), latent.get("height")))
+    area = (width // LATENT_SCALE) * (height // LATENT_SCALE)
+    if prompt[sampler_id]["inputs"].get("cfg", 1.0) != 1.0:
+        area *= 2  # cond and uncond
+    per_sample = area * 2 * 0.01 * factor * 2 ** 20
+    return int((vram - (weights + MEMORY_RESERVE_GB) * 2 ** 30) // per_sample)
+
+
+class Enqueuer:
+    """Group commit: jobs that arrive during a commit are written together by the next one."""
+
+    def __init__(self, store, max_batch=MAX_COMMIT_BATCH):
+        self.store = store
+        self.max_batch = max_batch
+        self.pending = []
+        self.ready = asyncio.Event()
+        self.batches = 0
+
+    async def add(self, jobs):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for job in jobs:
+            future = loop.create_future()
+            self.pending.append((job, future))
+            futures.append(future)
+        self.ready.set()
+        return await asyncio.gather(*futures)
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            if not self.pending:
+                self.ready.clear()
+            try:
+                results = await asyncio.to_thread(self.store.insert_many, [job for job, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def failure_reason(entry):
+    """(message, retryable) for a ComfyUI history entry with status 'error'."""
+    for kind, data in entry.get("status", {}).get("messages", []):
+        if kind == "execution_error":
+            exc_type = data.get("exception_type", "")
+            message = f"{exc_type}: {data.get('exception_message', '').strip()}"
+            retryable = "OutOfMemory" in exc_type or "out of memory" in message.lower()
+            return message[:2000], retryable
+        if kind == "execution_interrupted":
+            return "interrupted", False
+    return "execution failed", False
+
+
+class FairScheduler:
+    """Orders queued jobs: strict priority classes, weighted fair sharing between tenants.
+
+    Within a class this is start-time fair queueing on estimated cost. A
+    job's start tag is the later of its tenant's last finish tag and the
+    virtual time (the start tag of the last dispatched job); its finish tag
+    is start + cost / weight. The lowest start tag goes first, so a tenant
+    that was idle rejoins level with the others instead of with banked
+    credit. Tags are kept in memory and start level after a restart.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = weights or {}
+        self.finish = {}
+        self.vtime = 0.0
+
+    def weight(self, tenant):
+        return self.weights.get(tenant, 1.0)
+
+    def order(self, candidates, count):
+        """Up to count of candidates (in seq order) in the order they should be dispatched."""
+        queues = {}
+        for position, job in enumerate(candidates):
+            queues.setdefault((job.priority, job.tenant), []).append((position, job))
+        finish, vtime, picked = dict(self.finish), self.vtime, []
+        while queues and len(picked) < count:
+            best = min(priority for priority, _ in queues)
+            key = min((k for k in queues if k[0] == best),
+                      key=lambda k: (max(finish.get(k[1], 0.0), vtime), queues[k][0][0]))
+            _, job = queues[key].pop(0)
+            if not queues[key]:
+                del queues[key]
+            vtime = max(finish.get(job.tenant, 0.0), vtime)
+            finish[job.tenant] = vtime + job.cost / self.weight(job.tenant)
+            picked.append(job)
+        return picked
+
+    def charge(self, job):
+        self.vtime = max(self.finish.get(job.tenant, 0.0), self.vtime)
+        self.finish[job.tenant] = self.vtime + job.cost / self.weight(job.tenant)
+
+    def refund(self, job):
+        """Undo charge() for a job taken back from ComfyUI before it started."""
+        finish = self.finish.get(job.tenant, 0.0) - job.cost / self.weight(job.tenant)
+        self.finish[job.tenant] = max(finish, self.vtime)
+
+
+class Dispatcher:
+    """Feeds queued jobs to ComfyUI and follows them until they finish."""
+
+    def __init__(self, store, upstream, depth, max_attempts, backlog, scheduler, seed_batch=1):
+        self.store = store
+        self.upstream = upstream
+        self.depth = depth
+        self.max_attempts = max_attempts
+        self.backlog = backlog
+        self.scheduler = scheduler
+        self.seed_batch = seed_batch
+        self.seed_batch_node = None  # whether ComfyUI has SEED_BATCH_NODE; checked once per connection
+        self.vram = None
+        self.session = None
+        self.upstream_ok = None
+        self.wake = asyncio.Event()
+
+    async def run(self):
+        import aiohttp
+        backoff = POLL_INTERVAL
+        while True:
+            try:
+                await self.reconcile()
+                await self.fill()
+                if self.upstream_ok is not True:
+                    print(f"  ComfyUI reachable at {self.upstream}", flush=True)
+                self.upstream_ok, backoff = True, POLL_INTERVAL
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                if self.upstream_ok is not False:
+                    print(f"  ComfyUI unreachable ({e.__class__.__name__}); jobs stay queued", flush=True)
+                self.upstream_ok, backoff = False, min(backoff * 2, BACKOFF_MAX)
+                self.seed_batch_node = self.vram = None  # ComfyUI may come back with other nodes or GPUs
+            try:  # new jobs are scheduled at once, not at the next poll
+                await asyncio.wait_for(self.wake.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+    async def get_json(self, path):
+        async with self.session.get(self.upstream + path) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def reconcile(self):
+        """Settle submitting/submitted jobs against ComfyUI's queue and history."""
+        active = await asyncio.to_thread(self.store.active)
+        if not active:
+            return
+        queue = await self.get_json("/queue")
+        in_comfy = {item[1] for item in queue.get("queue_running", []) + queue.get("queue_pending", [])}
+        history = {}  # members of a merged sweep share one prompt
+        for job_id, state, prompt_id, attempts, *_, batch_index, _ in active:
+            pid = prompt_id or job_id
+            if pid in in_comfy:
+                if state == "submitting":  # POST /prompt went through before a restart
+                    await asyncio.to_thread(self.store.transition, job_id, "submitted", "found in ComfyUI queue",
+                                            expect=("submitting",), prompt_id=pid)
+                continue
+            if pid not in history:
+                history[pid] = (await self.get_json(f"/history/{pid}")).get(pid)
+            entry = history[pid]
+            status = (entry or {}).get("status", {})
+            if entry and status.get("status_str") == "success":
+                outputs = entry.get("outputs", {})
+                if batch_index is not None:
+                    outputs = split_outputs(outputs, batch_index)
+                await asyncio.to_thread(self.store.transition, job_id, "completed", expect=ACTIVE,
+                                        outputs=json.dumps(outputs))
+                continue
+            if entry and status.get("completed") is not None:
+                message, retryable = failure_reason(entry)
+                if not retryable or attempts >= self.max_attempts:
+                    await asyncio.to_thread(self.store.transition, job_id, "failed", message, expect=ACTIVE,
+                                            error=message)
+                    continue
+                if batch_index is not None:  # out of memory as a batch: retry on its own
+                    await asyncio.to_thread(self.store.transition, job_id, "queued", f"retry alone: {message}",
+                                            expect=ACTIVE, sweep=None)
+                    continue
+                await asyncio.to_thread(self.store.transition, job_id, "queued", f"retry: {message}",
+                                        expect=ACTIVE)
+                continue
+            # Neither queued nor finished: ComfyUI lost it (restart, crash) or never got it
+            if state == "submitted" and attempts >= self.max_attempts:
+                await asyncio.to_thread(self.store.transition, job_id, "failed", "lost by ComfyUI",
+                                        expect=ACTIVE, error=f"lost by ComfyUI {attempts} times")
+            else:
+                await asyncio.to_thread(self.store.transition, job_id, "queued", "not in ComfyUI; resubmitting",
+                                        expect=ACTIVE)
+
+    def has_room(self, active, job):
+        """At most depth prompts and backlog estimated seconds in ComfyUI; an idle ComfyUI takes any job."""
+        prompts = {a.prompt_id or a.job_id for a in active}
+        return not active or (len(prompts) < self.depth and sum(a.cost for a in active) + job.cost <= self.backlog)
+
+    async def fill(self):
+        active = await asyncio.to_thread(self.store.active)
+        candidates = await asyncio.to_thread(self.store.candidates, self.depth)
+        for job in self.scheduler.order(candidates, self.depth):
+            if not self.has_room(active, job):
+                # Stop at the first job that does not fit: skipping to smaller ones would starve it
+                if not any(a.priority > job.priority for a in active) or not await self.pull_back(active, job):
+                    return
+                active = await asyncio.to_thread(self.store.active)
+                if not self.has_room(active, job):
+                    return
+            jobs = [job] + (await self.sweep_partners(job, active) if job.sweep else [])
+            active += await self.submit(jobs)
+
+    async def sweep_partners(self, job, active):
+        """Queued jobs that differ from job only in the seed, to sample in one batch with it."""
+        limit = await self.seed_batch_limit(json.loads(job.payload)["prompt"])
+        if limit <= 1:
+            return []
+        room = self.backlog - sum(a.cost for a in active) - job.cost if active else float("inf")
+        client_id = json.loads(job.payload).get("client_id")
+        partners = []
+        for partner in await asyncio.to_thread(self.store.sweep_partners, job, limit - 1):
+            if json.loads(partner.payload).get("client_id") != client_id:
+                continue  # the merged prompt's events would only reach job's client
+            if partner.cost > room:
+                break
+            room -= partner.cost
+            partners.append(partner)
+        return partners
+
+    async def seed_batch_limit(self, prompt):
+        """Largest seed sweep of this graph to merge: --seed-batch, bounded by the memory model."""
+        if self.seed_batch <= 1:
+            return 1
+        if self.seed_batch_node is None:
+            self.seed_batch_node = SEED_BATCH_NODE in await self.get_json(f"/object_info/{SEED_BATCH_NODE}")
+            if not self.seed_batch_node:
+                print(f"  {SEED_BATCH_NODE} is not installed in ComfyUI; seed sweeps run one job at a time",
+                      flush=True)
+        if not self.seed_batch_node:
+            return 1
+        if self.vram is None:
+            devices = (await self.get_json("/system_stats")).get("devices", [])
+            self.vram = next((d.get("vram_total", 0) for d in devices if d.get("type") != "cpu"), 0)
+        if not self.vram:
+            return self.seed_batch
+        return max(1, min(self.seed_batch, seed_batch_fit(prompt, self.vram)))
+
+    async def submit(self, jobs):
+        """POST jobs to ComfyUI as one prompt, merged into a batch if there are several.
+
+        Returns the jobs ComfyUI queued (empty if none).
+        """
+        prompt_id = jobs[0].job_id if len(jobs) == 1 else f"sweep-{uuid.uuid4()}"
+        moved = []
+        for job in jobs:
+            # Recorded before the POST: a crash in between is settled by reconcile()
+            if await asyncio.to_thread(self.store.transition, job.job_id, "submitting", expect=("queued",),
+                                       attempts=job.attempts + 1, prompt_id=prompt_id,
+                                       batch_index=len(moved) if len(jobs) > 1 else None):
+                moved.append(job._replace(prompt_id=prompt_id))
+        if not moved:
+            return []  # cancelled meanwhile
+        payloads = [json.loads(job.payload) for job in moved]
+        body = dict(merge_sweep(payloads) if len(moved) > 1 else payloads[0], prompt_id=prompt_id)
+        try:
+            async with self.session.post(self.upstream + "/prompt", json=body) as resp:
+                text = await resp.text()
+                status = resp.status
+        except BaseException:
+            await self.requeue(moved, "ComfyUI unreachable")
+            raise
+        if status == 200:
+            submitted = []
+            for job in moved:
+                if await asyncio.to_thread(self.store.transition, job.job_id, "submitted", expect=("submitting",)):
+                    self.scheduler.charge(job)
+                    submitted.append(job)
+            if not submitted:  # cancelled while the POST was in flight
+                await self.cancel(moved[0].job_id, prompt_id)
+            return submitted
+        if 400 <= status < 500 and len(moved) > 1:  # the merged graph was rejected: submit them one by one
+            await self.requeue(moved, f"merged seed sweep rejected ({status})", sweep=None)
+            return []
+        if 400 <= status < 500:  # validation error: resubmitting cannot help
+            await asyncio.to_thread(self.store.transition, moved[0].job_id, "failed", f"rejected ({status})",
+                                    expect=("submitting",), error=text[:2000])
+            return []
+        await self.requeue(moved, f"ComfyUI returned {status}")
+        raise OSError(f"ComfyUI returned {status}")
+
+    async def requeue(self, jobs, detail, **fields):
+        """Queue jobs that did not reach ComfyUI again, without counting the attempt."""
+        for job in jobs:
+            await asyncio.to_thread(self.store.transition, job.job_id, "queued", detail, expect=("submitting",),
+                                    attempts=job.attempts, **fields)
+
+    async def pull_back(self, active, job):
+        """Take lower-priority jobs that ComfyUI has not started back into the queue. True if any moved."""
+        queue = await self.get_json("/queue")
+        pending = {item[1] for item in queue.get("queue_pending", [])}
+        victims = [a for a in active if a.priority > job.priority and a.state == "submitted"
+                   and (a.prompt_id or a.job_id) in pending]
+        if not victims:
+            return False
+        await self.session.post(self.upstream + "/queue",
+                                json={"delete": sorted({v.prompt_id or v.job_id for v in victims})})
+        queue = await self.get_json("/queue")
+        still = {item[1] for item in queue.get("queue_running", []) + queue.get("queue_pending", [])}
+        moved = False
+        for victim in victims:
+            pid = victim.prompt_id or victim.job_id
+            if pid in still or (await self.get_json(f"/history/{pid}")).get(pid):
+                continue  # started (or even finished) before the delete; reconcile() follows it
+            if await asyncio.to_thread(self.store.transition, victim.job_id, "queued",
+                                       f"taken back for {PRIORITIES[job.priority]}-priority {job.job_id}",
+                                       expect=("submitted",), attempts=victim.attempts - 1):
+                self.scheduler.refund(victim)
+                moved = True
+        return moved
+
+    async def cancel(self, job_id, prompt_id):
+        """Remove a submitted job from ComfyUI's queue, interrupting it if it is running."""
+        await self.session.post(self.upstream + "/queue", json={"delete": [prompt_id]})
+        queue = await self.get_json("/queue")
+        if any(item[1] == prompt_id for item in queue.get("queue_running", [])):
+            await self.session.post(self.upstream + "/interrupt", json={"prompt_id": prompt_id})
+
+
+class QueueService:
+    def __init__(self, store, dispatcher=None):
+        self.store = store
+        self.enqueuer = Enqueuer(store)
+        self.dispatcher = dispatcher
+        self.tasks = []
+
+    async def start(self, app):
+        import aiohttp
+        self.tasks.append(asyncio.create_task(self.enqueuer.run()))
+        if self.dispatcher is not None:
+            self.dispatcher.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+            self.tasks.append(asyncio.create_task(self.dispatcher.run()))
+
+    async def stop(self, app):
+        for task in self.tasks:
+            task.cancel()
+        if self.dispatcher is not None:
+            await self.dispatcher.session.close()
+
+    def notify(self):
+        if self.dispatcher is not None:
+            self.dispatcher.wake.set()
+
+    async def read_jobs(self, request):
+        from aiohttp import web
+        try:
+            body = await request.json()
+            bodies = body["jobs"] if isinstance(body, dict) and "jobs" in body else [body]
+            if not isinstance(bodies, list):
+                raise ValueError("'jobs' must be a list")
+            tenant, priority = request.headers.get("X-Tenant"), request.headers.get("X-Priority")
+            return [new_job(b, tenant, priority) for b in bodies]
+        except (ValueError, KeyError, TypeError) as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+
+    async def handle_enqueue(self, request):
+        from aiohttp import web
+        jobs = await self.read_jobs(request)
+        results = await self.enqueuer.add(jobs)
+        self.notify()
+        items = [{"job_id": job_id, "number": seq, "state": state, "duplicate": duplicate}
+                 for (job_id, *_), (seq, state, duplicate) in zip(jobs, results)]
+        return web.json_response({"jobs": items} if len(items) != 1 else items[0])
+
+    async def handle_prompt(self, request):
+        from aiohttp import web
+        jobs = (await self.read_jobs(request))[:1]
+        seq, _, _ = (await self.enqueuer.add(jobs))[0]
+        self.notify()
+        return web.json_response({"prompt_id": jobs[0][0], "number": seq, "node_errors": {}})
+
+    async def handle_get(self, request):
+        from aiohttp import web
+        job = await asyncio.to_thread(self.store.get, request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound()
+        return web.json_response(job)
+
+    async def handle_list(self, request):
+        from aiohttp import web
+        state = request.query.get("state")
+        limit = min(int(request.query.get("limit", "50")), 1000)
+        return web.json_response({"jobs": await asyncio.to_thread(self.store.list, state, limit)})
+
+    async def handle_cancel(self, request):
+        from aiohttp import web
+        job_id = request.match_info["job_id"]
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            raise web.HTTPNotFound()
+        # A submitting job is not in ComfyUI yet; submit() takes it back out once its POST returns
+        if job["state"] == "submitted" and self.dispatcher is not None:
+            prompt_id = job["prompt_id"] or job_id
+            active = await asyncio.to_thread(self.store.active)
+            # A job in a merged seed sweep only leaves ComfyUI with the last of its batch
+            if not any((a.prompt_id or a.job_id) == prompt_id and a.job_id != job_id for a in active):
+                await self.dispatcher.cancel(job_id, prompt_id)
+        moved = await asyncio.to_thread(self.store.transition, job_id, "cancelled", "cancelled by request",
+                                        expect=("queued",) + ACTIVE)
+        if not moved:
+            raise web.HTTPConflict(text=json.dumps({"error": f"job is {job['state']}"}),
+                                   content_type="application/json")
+        return web.json_response({"job_id": job_id, "state": "cancelled"})
+
+    async def handle_history(self, request):
+        """ComfyUI-style /history/<job id>, also for jobs that ran inside a merged seed sweep."""
+        from aiohttp import web
+        job_id = request.match_info["job_id"]
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["state"] not in ("completed", "failed"):
+            return web.json_response({})
+        completed = job["state"] == "completed"
+        status = {"status_str": "success" if completed else "error", "completed": completed, "messages": []}
+        return web.json_response({job_id: {"outputs": job["outputs"] or {}, "status": status}})
+
+    async def handle_stats(self, request):
+        from aiohttp import web
+        counts, oldest = await asyncio.to_thread(self.store.counts)
+        tenants = await asyncio.to_thread(self.store.tenants)
+        return web.json_response({"states": counts, "oldest_queued": oldest,
+                                  "tenants": {t: {"queued": n, "cost": round(c, 1)} for t, (n, c) in tenants.items()},
+                                  "commits": self.store.commits, "enqueue_batches": self.enqueuer.batches})
+
+    def app(self):
+        from aiohttp import web
+        app = web.Application(client_max_size=256 * 1024 ** 2)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        app.router.add_post("/jobs", self.handle_enqueue)
+        app.router.add_post("/prompt", self.handle_prompt)
+        app.router.add_post("/api/prompt", self.handle_prompt)
+        app.router.add_get("/jobs", self.handle_list)
+        app.router.add_get("/jobs/{job_id}", self.handle_get)
+        app.router.add_delete("/jobs/{job_id}", self.handle_cancel)
+        app.router.add_get("/history/{job_id}", self.handle_history)
+        app.router.add_get("/api/history/{job_id}", self.handle_history)
+        app.router.add_get("/queue/stats", self.handle_stats)
+        return app
+
+
+def cmd_serve(args, store):
+    from aiohttp import web
+    scheduler = FairScheduler(parse_weights(args.weights))
+    dispatcher = Dispatcher(store, get_url(args.url), args.depth, args.max_attempts, args.backlog, scheduler,
+                            args.seed_batch)
+    service = QueueService(store, dispatcher)
+    counts, _ = store.counts()
+    print(f"  Queue {store.path}: http://{args.listen}:{args.port} -> {dispatcher.upstream} "
+          f"(depth {args.depth}, backlog {args.backlog:g}s, seed batch {args.seed_batch})", flush=True)
+    if scheduler.weights:
+        print(f"  Weights: {', '.join(f'{t}={w:g}' for t, w in scheduler.weights.items())}", flush=True)
+    pending = {s: n for s, n in counts.items() if s not in FINAL}
+    if pending:
+        print(f"  Recovering: {', '.join(f'{n} {s}' for s, n in sorted(pending.items()))}", flush=True)
+    web.run_app(service.app(), host=args.listen, port=args.port, print=None)
+
+
+def cmd_status(args, store):
+    counts, oldest = store.counts()
+    print(f"  Database:   {store.path}")
+    for state in ("queued", "submitting", "submitted", "completed", "failed", "cancelled"):
+        print(f"  {state + ':':<11} {counts.get(state, 0)}")
+    if oldest:
+        print(f"  Oldest queued: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(oldest))}")
+    tenants = store.tenants()
+    if tenants:
+        print("  Queued per tenant:")
+        for tenant, (count, cost) in tenants.items():
+            print(f"    {tenant:<20} {count:>6} jobs  ~{cost / 60:.0f} min")
+
+
+def cmd_list(args, store):
+    jobs = store.list(args.state, args.limit)
+    for job in jobs:
+        when = time.strftime("%m-%d %H:%M:%S", time.localtime(job["updated"]))
+        error = f"  {job['error'].splitlines()[0][:60]}" if job["error"] else ""
+        print(f"  {job['number']:>7}  {job['job_id']:<36}  {job['state']:<10} {job['tenant']:<12} "
+              f"{job['priority']:<6} {job['cost']:>7.0f}s  {when}  x{job['attempts']}{error}")
+    if not jobs:
+        print("  No jobs.")
+
+
+def cmd_retry(args, store):
+    ids = args.job_ids or ([j["job_id"] for j in store.list("failed", 1 << 30)] if args.all_failed else [])
+    moved = sum(store.transition(job_id, "queued", "retry requested", expect=("failed",), attempts=0)
+                for job_id in ids)
+    print(f"  {moved} job(s) queued again")
+
+
+def cmd_cancel(args, store):
+    moved = sum(store.transition(job_id, "cancelled", "cancelled offline", expect=("queued",))
+                for job_id in args.job_ids)
+    print(f"  {moved} job(s) cancelled")
+    if moved < len(args.job_ids):
+        print("  Jobs already submitted to ComfyUI are cancelled with DELETE /jobs/<id> on the service.")
+
+
+async def run_bench(args, db_path):
+    import aiohttp
+    from aiohttp import web
+    store = JobStore(db_path)
+    service = QueueService(store)
+    service.enqueuer.max_batch = args.commit_batch
+    runner = web.AppRunner(service.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    graph = {"3": {"class_type": "KSampler", "inputs": {"seed": 0, "steps": 20, "cfg": 7.0, "model": ["4", 0]}},
+             "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd_xl_base_1.0.safetensors"}}}
+    latencies = []
+    counter = iter(range(args.jobs))
+
+    async def client(session):
+        for i in counter:
+            graph["3"]["inputs"]["seed"] = i
+            start = time.perf_counter()
+            async with session.post(f"http://127.0.0.1:{port}/jobs", json={"prompt": graph}) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    raise RuntimeError(f"enqueue returned {resp.status}")
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    await runner.cleanup()
+    counts, _ = store.counts()
+    latencies.sort()
+    return {"elapsed": elapsed, "stored": counts.get("queued", 0), "commits": store.commits,
+            "p50": statistics.median(latencies), "p99": latencies[int(len(latencies) * 0.99) - 1]}
+
+
+def cmd_bench(args):
+    with tempfile.TemporaryDirectory(prefix="comfyui-queue-bench-", dir=args.bench_dir) as tmp:
+        r = asyncio.run(run_bench(args, Path(tmp) / "queue.sqlite"))
+    print(f"  {args.jobs} enqueues over HTTP, {args.concurrency} concurrent clients, "
+          f"commit batch <= {args.commit_batch}")
+    print(f"  Throughput:  {args.jobs / r['elapsed']:,.0f} jobs/s ({r['elapsed']:.2f}s)")
+    print(f"  Latency:     p50 {r['p50'] * 1000:.1f} ms, p99 {r['p99'] * 1000:.1f} ms")
+    print(f"  Commits:     {r['commits']} ({args.jobs / max(r['commits'], 1):.1f} jobs per commit)")
+    if r["stored"] != args.jobs:
+        print(f"  ERROR: {r['stored']} jobs in the database, expected {args.jobs}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-queue",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=("serve", "status", "list", "retry", "cancel", "bench"))
+    parser.add_argument("job_ids", nargs="*", help="retry/cancel: job ids")
+    parser.add_argument("--db", type=str, default=None,
+                        help="database path or sqlite:/// URL (default: $FLOX_ENV_CACHE/queue.sqlite)")
+    parser.add_argument("--url", type=str, default=None,
+                        help="upstream ComfyUI URL (default: $COMFYUI_URL or http://127.0.0.1:8188)")
+    parser.add_argument("--listen", type=str, default="127.0.0.1", help="service listen address")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("COMFYUI_QUEUE_PORT", "8191")),
+                        help="service port (default: 8191)")
+    parser.add_argument("--depth", type=int, default=int(os.environ.get("COMFYUI_QUEUE_DEPTH", "2")),
+                        help="jobs submitted to ComfyUI at once (default: 2)")
+    parser.add_argument("--backlog", type=float, default=float(os.environ.get("COMFYUI_QUEUE_BACKLOG", "60")),
+                        help="estimated seconds of work submitted to ComfyUI at once (default: 60)")
+    parser.add_argument("--weights", type=str, default=os.environ.get("COMFYUI_QUEUE_WEIGHTS"),
+                        help="tenant weights, e.g. render=3,previews=1 (default: 1 each)")
+    parser.add_argument("--seed-batch", type=int, default=int(os.environ.get("COMFYUI_QUEUE_SEED_BATCH", "8")),
+                        help="most seed-sweep jobs merged into one batch, 1 = never merge (default: 8)")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="submissions before a lost or out-of-memory job fails (default: 3)")
+    parser.add_argument("--state", type=str, default=None, help="list: only jobs in this state")
+    parser.add_argument("--limit", type=int, default=50, help="list: number of jobs (default: 50)")
+    parser.add_argument("--all-failed", action="store_true", help="retry: every failed job")
+    parser.add_argument("--jobs", type=int, default=10000, help="bench: enqueues (default: 10000)")
+    parser.add_argument("--concurrency", type=int, default=64, help="bench: concurrent clients (default: 64)")
+    parser.add_argument("--commit-batch", type=int, default=MAX_COMMIT_BATCH,
+                        help=f"bench: max jobs per commit, 1 = commit each job (default: {MAX_COMMIT_BATCH})")
+    parser.add_argument("--bench-dir", type=str, default=None,
+                        help="bench: directory for the temporary database (default: system temp)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "bench":
+            cmd_bench(args)
+            return
+        store = JobStore(get_db_path(args.db))
+        commands = {"serve": cmd_serve, "status": cmd_status, "list": cmd_list,
+                    "retry": cmd_retry, "cancel": cmd_cancel}
+        commands[args.command](args, store)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    except ImportError as e:
+        print(f"ERROR: {e} (serve and bench need aiohttp; run them with the ComfyUI venv python)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""Caching proxy in front of ComfyUI: identical graphs are served from disk."""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+DESCRIPTION = """\
+Serve repeated ComfyUI API graphs from a result cache.
+
+Clients often resubmit the same API graph -- sdxl-txt2img.json with the
+fixed seed 42 and the same prompt -- and ComfyUI recomputes it unless that
+exact graph is still in its in-memory cache. This proxy sits in front of
+ComfyUI and forwards every request, except that POST /prompt is answered
+from disk when the same graph has completed before.
+
+The cache key is the SHA-256 of:
+  - the canonical graph: sorted keys, compact JSON, '_meta' removed
+  - the SHA-256 of every model file the graph names (memoized by size/mtime)
+  - the SHA-256 of every local input image the graph names
+
+On a hit the proxy returns a new prompt_id immediately, answers
+/history/<prompt_id> with the stored outputs, serves their files through
+/view, and sends the usual websocket events (execution_start, executed,
+executing None, execution_success) to the client's /ws connection. The
+last MAX_HISTORY hits are answered this way, like ComfyUI's own history
+limit. Misses are forwarded to ComfyUI; once they complete successfully
+their outputs are downloaded into the cache. One poller watches ComfyUI's
+/queue for all forwarded prompts and reads /history/<id> of those that
+have left it.
+
+A model file that has not been hashed yet is hashed in the background:
+until then, graphs that use it are forwarded without caching, so the first
+request for a new multi-GB model is not held up by hashing it.
+
+Commands:
+  serve    Run the proxy
+  stats    Show entries, size and hit counts
+  prune    Apply --ttl and --max-bytes now (serve does this periodically)
+  clear    Remove every entry
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_URL                  Upstream ComfyUI (default: http://127.0.0.1:$COMFYUI_PORT)
+  COMFYUI_PORT                 Upstream port (default: 8188)
+  COMFYUI_RESULT_CACHE_DIR     Cache directory (default: $FLOX_ENV_CACHE/result-cache)
+  COMFYUI_RESULT_CACHE_PORT    Proxy port (default: 8189)
+  COMFYUI_RESULT_CACHE_TTL     Entry lifetime (default: 7d)
+  COMFYUI_RESULT_CACHE_MAX_BYTES  Cache size limit (default: 20G)
+  COMFYUI_MODELS_DIR / COMFYUI_INPUT_DIR  Where model and input files are hashed from
+
+examples:
+  comfyui-result-cache serve                       Proxy :8189 -> :8188
+  comfyui-result-cache serve --port 8189 --ttl 1d --max-bytes 50G
+  comfyui-result-cache stats
+  comfyui-result-cache prune --max-bytes 10G
+
+Point clients at the proxy port instead of ComfyUI. Only successful runs
+are cached; the extra_data of a request (e.g. the UI workflow embedded in
+PNG metadata) is not part of the key, so a hit returns the files of the
+first run. Graphs with randomized seeds should pin the seed client-side
+(API graphs always carry a concrete value).
+"""
+
+INDEX_NAME = "index.sqlite"
+HASH_CHUNK = 16 * 1024 * 1024
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host",
+               "content-length", "proxy-connection", "te", "trailer"}
+CACHE_SUBFOLDER = "result-cache"
+POLL_INTERVAL = 1.0
+PENDING_TIMEOUT = 24 * 3600
+PRUNE_INTERVAL = 600
+MAX_HISTORY = 10000  # cache hits answered on /history, as ComfyUI's MAXIMUM_HISTORY_SIZE
+RESCAN_INTERVAL = 60  # least seconds between walks of the models dir for unknown model names
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+prefetch = load_sibling("comfyui-prefetch")
+
+
+def parse_age(text):
+    """Parse '7d', '12h', '2w' or a plain number of seconds."""
+    text = text.strip().lower()
+    if text[-1] in AGE_UNITS:
+        return float(text[:-1]) * AGE_UNITS[text[-1]]
+    return float(text)
+
+
+def parse_size(text):
+    """Parse '20G', '512M' or a byte count."""
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def get_url(override=None):
+    if override:
+        return override.rstrip("/")
+    if os.environ.get("COMFYUI_URL"):
+        return os.environ["COMFYUI_URL"].rstrip("/")
+    return f"http://127.0.0.1:{os.environ.get('COMFYUI_PORT', '8188')}"
+
+
+def get_cache_dir(override=None):
+    if override:
+        return Path(override)
+    if os.environ.get("COMFYUI_RESULT_CACHE_DIR"):
+        return Path(os.environ["COMFYUI_RESULT_CACHE_DIR"])
+    if os.environ.get("FLOX_ENV_CACHE"):
+        return Path(os.environ["FLOX_ENV_CACHE"]) / "result-cache"
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work"))) / ".result-cache"
+
+
+def get_input_dir():
+    if os.environ.get("COMFYUI_INPUT_DIR"):
+        return Path(os.environ["COMFYUI_INPUT_DIR"])
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work"))) / "input"
+
+
+def canonical_graph(graph):
+    """Compact, key-sorted JSON of an API graph without '_meta' (titles only)."""
+    clean = {}
+    for node_id, node in graph.items():
+        if isinstance(node, dict):
+            node = {k: v for k, v in node.items() if k != "_meta"}
+        clean[str(node_id)] = node
+    return json.dumps(clean, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ResultIndex:
+    """SQLite index of cached results and memoized file hashes; safe to use from several threads."""
+
+    def __init__(self, cache_dir):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(cache_dir / INDEX_NAME, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key      TEXT PRIMARY KEY,
+                outputs  TEXT NOT NULL,
+                size     INTEGER NOT NULL,
+                created  REAL NOT NULL,
+                accessed REAL NOT NULL,
+                hits     INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS results_created ON results(created);
+            CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed);
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path   TEXT PRIMARY KEY,
+                size   INTEGER NOT NULL,
+                mtime  REAL NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+        """)
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT outputs FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE results SET accessed = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self.db.commit()
+        return json.loads(row[0])
+
+    def add(self, key, outputs, size):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (key, outputs, size, created, accessed, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)", (key, json.dumps(outputs), size, now, now))
+            self.db.commit()
+
+    def remove(self, keys):
+        with self.lock:
+            self.db.executemany("DELETE FROM results WHERE key = ?", [(k,) for k in keys])
+            self.db.commit()
+
+    def totals(self):
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0), MIN(created) FROM results"
+            ).fetchone()
+
+    def expired(self, cutoff):
+        with self.lock:
+            return self.db.execute("SELECT key, size FROM results WHERE created < ?", (cutoff,)).fetchall()
+
+    def least_recent(self):
+        with self.lock:
+            return self.db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall()
+
+    def known_hash(self, path):
+        """Memoized sha256 of a file if its size and mtime are unchanged, else None."""
+        st = os.stat(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime, sha256 FROM file_hashes WHERE path = ?",
+                                  (str(path),)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return row[2]
+        return None
+
+    def file_hash(self, path):
+        """sha256 of a file, recomputed only when its size or mtime change."""
+        known = self.known_hash(path)
+        if known:
+            return known
+        st = os.stat(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO file_hashes (path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                            (str(path), st.st_size, st.st_mtime, digest.hexdigest()))
+            self.db.commit()
+        return digest.hexdigest()
+
+
+class ResultCache:
+    """Cached outputs on disk: <cache_dir>/<key>/<filename>, indexed in SQLite."""
+
+    def __init__(self, cache_dir, ttl, max_bytes, models_dir=None):
+        self.dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index = ResultIndex(cache_dir)
+        self.locator = prefetch.ModelLocator(prefetch.get_models_dir(models_dir))
+        self.input_dir = get_input_dir()
+        self.model_paths = {}  # model name -> path (None: not found at the last walk)
+        self.scanned = time.monotonic()
+        self.models_lock = threading.Lock()  # graph_key runs in several worker threads
+
+    def model_path(self, name):
+        """Path of a model name, walking the models dir again at most every RESCAN_INTERVAL."""
+        with self.models_lock:
+            if self.model_paths.get(name) is None and time.monotonic() - self.scanned > RESCAN_INTERVAL:
+                self.locator = prefetch.ModelLocator(self.locator.models_dir)  # pick up new downloads
+                self.scanned = time.monotonic()
+                self.model_paths = {n: p for n, p in self.model_paths.items() if p is not None}
+            if name not in self.model_paths:
+                self.model_paths[name] = self.locator.find(name)
+            return self.model_paths[name]
+
+    def graph_key(self, graph, unhashed=None):
+        """Key over the canonical graph and the contents of every file it references.
+
+        With an unhashed list, model files without a memoized hash are
+        appended to it instead of being hashed, and the key is None.
+        """
+        digest = hashlib.sha256(canonical_graph(graph).encode())
+        models = sorted(set(prefetch.model_names_in(graph)))
+        for name in models:
+            path = self.model_path(name)
+            file_hash = "missing"
+            if path is not None:
+                file_hash = self.index.known_hash(path) if unhashed is not None else self.index.file_hash(path)
+                if file_hash is None:
+                    unhashed.append(path)
+            digest.update(f"\0model:{name}:{file_hash}".encode())
+        for node in graph.values():
+            value = node.get("inputs", {}).get("image") if isinstance(node, dict) else None
+            if isinstance(value, str) and (self.input_dir / value).is_file():
+                digest.update(f"\0input:{value}:{self.index.file_hash(self.input_dir / value)}".encode())
+        return None if unhashed else digest.hexdigest()
+
+    def entry_dir(self, key):
+        return self.dir / key
+
+    def prune(self, dry_run=False):
+        """Drop entries older than the TTL, then least recently used ones over max_bytes."""
+        victims = []
+        if self.ttl:
+            victims += [k for k, _ in self.index.expired(time.time() - self.ttl)]
+        if self.max_bytes:
+            total = self.index.totals()[1]
+            for key, size in self.index.least_recent():
+                if total <= self.max_bytes:
+                    break
+                if key not in victims:
+                    victims.append(key)
+                    total -= size
+        freed = 0
+        for key in victims:
+            entry = self.entry_dir(key)
+            if entry.is_dir():
+                freed += sum(p.stat().st_size for p in entry.iterdir())
+                if not dry_run:
+                    shutil.rmtree(entry, ignore_errors=True)
+        if not dry_run:
+            self.index.remove(victims)
+        return len(victims), freed
+
+
+def output_files(outputs):
+    """Yield (node_id, kind, item) for every file entry in a history 'outputs' dict."""
+    for node_id, node_outputs in outputs.items():
+        for kind, items in node_outputs.items():
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if isinstance(item, dict) and "filename" in item:
+                    yield node_id, kind, item
+
+
+class Proxy:
+    def __init__(self, upstream, cache):
+        self.upstream = upstream
+        self.cache = cache
+        self.session = None
+        self.sockets = {}    # client_id -> proxied websocket
+        self.synthetic = OrderedDict()  # prompt_id -> history entry of a cache hit, oldest first
+        self.pending = {}    # prompt_id -> (cache key, deadline) of a forwarded miss
+        self.hashing = set()  # model files being hashed in the background
+        self.hits = self.misses = 0
+
+    async def start(self, app):
+        import aiohttp
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30),
+            auto_decompress=False,
+        )
+        app["pruner"] = asyncio.create_task(self.prune_loop())
+        app["collector"] = asyncio.create_task(self.collect_loop())
+
+    async def stop(self, app):
+        app["pruner"].cancel()
+        app["collector"].cancel()
+        await self.session.close()
+
+    async def prune_loop(self):
+        while True:
+            await asyncio.sleep(PRUNE_INTERVAL)
+            removed, freed = await asyncio.to_thread(self.cache.prune)
+            if removed:
+                print(f"  pruned {removed} entries ({freed / 1e6:.1f} MB)", flush=True)
+
+    # -- generic forwarding ------------------------------------------------
+
+    async def forward(self, request, body=None):
+        from aiohttp import web
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        data = body if body is not None else await request.read()
+        async with self.session.request(request.method, self.upstream + request.rel_url.path_qs,
+                                        headers=headers, data=data or None, allow_redirects=False) as resp:
+            out_headers = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS}
+            response = web.StreamResponse(status=resp.status, headers=out_headers)
+            await response.prepare(request)
+            async for chunk in resp.content.iter_chunked(1024 * 1024):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+    async def handle_any(self, request):
+        if request.path == "/ws" and request.headers.get("Upgrade", "").lower() == "websocket":
+            return await self.handle_ws(request)
+        return await self.forward(request)
+
+    async def handle_ws(self, request):
+        import aiohttp
+        from aiohttp import web
+        client_ws = web.WebSocketResponse(max_msg_size=0)
+        await client_ws.prepare(request)
+        client_id = request.query.get("clientId") or uuid.uuid4().hex
+        query = dict(request.query, clientId=client_id)
+        ws_url = self.upstream.replace("http", "ws", 1) + "/ws"
+        async with self.session.ws_connect(ws_url, params=query, max_msg_size=0) as upstream_ws:
+            self.sockets[client_id] = client_ws
+
+            async def pump_up():
+                async for msg in client_ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        await upstream_ws.send_str(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.BINARY:
+                        await upstream_ws.send_bytes(msg.data)
+                await upstream_ws.close()
+
+            async def pump_down():
+                async for msg in upstream_ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        await client_ws.send_str(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.BINARY:
+                        await client_ws.send_bytes(msg.data)
+                await client_ws.close()
+
+            try:
+                await asyncio.gather(pump_up(), pump_down())
+            finally:
+                if self.sockets.get(client_id) is client_ws:
+                    del self.sockets[client_id]
+        return client_ws
+
+    # -- cached endpoints --------------------------------------------------
+
+    async def handle_prompt(self, request):
+        from aiohttp import web
+        body = await request.read()
+        unhashed = []
+        try:
+            payload = json.loads(body)
+            graph = payload["prompt"]
+            key = await asyncio.to_thread(self.cache.graph_key, graph, unhashed)
+        except (ValueError, KeyError, TypeError, AttributeError, OSError):
+            return await self.forward(request, body)  # let ComfyUI report the error
+        if key is None:
+            for path in unhashed:
+                if path not in self.hashing:
+                    self.hashing.add(path)
+                    asyncio.create_task(self.hash_model(path))
+            return await self.forward(request, body)  # cacheable once its models are hashed
+
+        outputs = await asyncio.to_thread(self.cache.index.lookup, key)
+        if outputs is not None and self.cache.entry_dir(key).is_dir():
+            self.hits += 1
+            prompt_id = payload.get("prompt_id") or str(uuid.uuid4())
+            self.synthetic[prompt_id] = {
+                "prompt": [0, prompt_id, graph, payload.get("extra_data", {}), list(outputs)],
+                "outputs": outputs,
+                "status": {"status_str": "success", "completed": True,
+                           "messages": [["execution_cached", {"prompt_id": prompt_id, "nodes": list(graph)}]]},
+                "meta": {},
+            }
+            while len(self.synthetic) > MAX_HISTORY:
+                self.synthetic.popitem(last=False)
+            print(f"  hit  {key[:12]} -> {prompt_id}", flush=True)
+            asyncio.create_task(self.replay_events(payload.get("client_id"), prompt_id, outputs))
+            return web.json_response({"prompt_id": prompt_id, "number": 0, "node_errors": {}})
+
+        self.misses += 1
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        async with self.session.post(self.upstream + "/prompt", data=body, headers=headers) as resp:
+            text = await resp.text()
+            status = resp.status
+        if status == 200:
+            prompt_id = json.loads(text).get("prompt_id")
+            if prompt_id:
+                print(f"  miss {key[:12]} -> {prompt_id}", flush=True)
+                self.pending[prompt_id] = (key, time.monotonic() + PENDING_TIMEOUT)
+        return web.Response(status=status, text=text, content_type="application/json")
+
+    async def hash_model(self, path):
+        try:
+            print(f"  hashing {path.name}; its graphs are cached from the next request on", flush=True)
+            await asyncio.to_thread(self.cache.index.file_hash, path)
+        except OSError as e:
+            print(f"  cannot hash {path}: {e}", flush=True)
+        finally:
+            self.hashing.discard(path)
+
+    async def replay_events(self, client_id, prompt_id, outputs):
+        """Send the websocket events a client waits for after submitting a prompt."""
+        await asyncio.sleep(0)
+        ws = self.sockets.get(client_id)
+        if ws is None or ws.closed:
+            return
+        now = int(time.time() * 1000)
+        messages = [{"type": "execution_start", "data": {"prompt_id": prompt_id, "timestamp": now}},
+                    {"type": "execution_cached", "data": {"nodes": list(outputs), "prompt_id": prompt_id,
+                                                          "timestamp": now}}]
+        for node_id, output in outputs.items():
+            messages.append({"type": "executed", "data": {"node": node_id, "display_node": node_id,
+                                                          "output": output, "prompt_id": prompt_id}})
+        messages.append({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+        messages.append({"type": "execution_success", "data": {"prompt_id": prompt_id, "timestamp": now}})
+        for message in messages:
+            await ws.send_str(json.dumps(message))
+
+    async def get_json(self, path):
+        async with self.session.get(self.upstream + path) as resp:
+            return await resp.json() if resp.status == 200 else {}
+
+    async def collect_loop(self):
+        """Poll ComfyUI's /queue for all forwarded misses; collect those that have finished."""
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            if not self.pending:
+                continue
+            watched = list(self.pending.items())  # before /queue: later misses may not be in it yet
+            try:
+                queue = await self.get_json("/queue")
+                in_comfy = {item[1] for item in queue.get("queue_running", []) + queue.get("queue_pending", [])}
+                for prompt_id, (key, deadline) in watched:
+                    if prompt_id in in_comfy:
+                        if time.monotonic() > deadline:
+                            del self.pending[prompt_id]
+                        continue
+                    entry = (await self.get_json(f"/history/{prompt_id}")).get(prompt_id)
+                    del self.pending[prompt_id]  # finished, or lost in a ComfyUI restart
+                    if entry and entry.get("status", {}).get("status_str") == "success":
+                        await self.collect(key, entry)
+            except Exception as e:
+                print(f"  cannot poll ComfyUI: {e}", flush=True)
+
+    async def collect(self, key, entry):
+        """Copy the outputs of a finished history entry into the cache."""
+        outputs = entry.get("outputs", {})
+        files = list(output_files(outputs))
+        if not files:
+            return  # nothing on disk to serve (e.g. preview-less graphs)
+
+        target = self.cache.entry_dir(key)
+        staging = target.with_name(f".{key}.partial")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        size = 0
+        try:
+            for i, (_, _, item) in enumerate(files):
+                params = {"filename": item["filename"], "subfolder": item.get("subfolder", ""),
+                          "type": item.get("type", "output")}
+                stored = f"{i:03d}-{os.path.basename(item['filename'])}"
+                async with self.session.get(f"{self.upstream}/view", params=params) as resp:
+                    if resp.status != 200:
+                        raise OSError(f"/view returned {resp.status} for {item['filename']}")
+                    with open(staging / stored, "wb") as f:
+                        async for chunk in resp.content.iter_chunked(1024 * 1024):
+                            f.write(chunk)
+                size += (staging / stored).stat().st_size
+                item.update({"filename": stored, "subfolder": f"{CACHE_SUBFOLDER}/{key}", "type": "output"})
+        except Exception as e:
+            print(f"  not cached {key[:12]}: {e}", flush=True)
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        await asyncio.to_thread(self.cache.index.add, key, outputs, size)
+        print(f"  stored {key[:12]} ({len(files)} file(s), {size / 1e6:.1f} MB)", flush=True)
+
+    async def handle_history(self, request):
+        from aiohttp import web
+        prompt_id = request.match_info["prompt_id"]
+        if prompt_id in self.synthetic:
+            return web.json_response({prompt_id: self.synthetic[prompt_id]})
+        return await self.forward(request)
+
+    async def handle_view(self, request):
+        from aiohttp import web
+        subfolder = request.query.get("subfolder", "").replace("\\", "/")
+        if subfolder.startswith(CACHE_SUBFOLDER + "/"):
+            key = subfolder[len(CACHE_SUBFOLDER) + 1:]
+            name = os.path.basename(request.query.get("filename", ""))
+            path = self.cache.entry_dir(key) / name
+            if "/" in key or not name or not path.is_file():
+                raise web.HTTPNotFound()
+            return web.FileResponse(path)
+        return await self.forward(request)
+
+    async def handle_stats(self, request):
+        from aiohttp import web
+        count, size, hits, _ = await asyncio.to_thread(self.cache.index.totals)
+        return web.json_response({"entries": count, "bytes": size, "hits_total": hits,
+                                  "hits": self.hits, "misses": self.misses})
+
+
+def cmd_serve(args, cache):
+    from aiohttp import web
+    proxy = Proxy(get_url(args.url), cache)
+    app = web.Application(client_max_size=1024 ** 3)
+    app.on_startup.append(proxy.start)
+    app.on_cleanup.append(proxy.stop)
+    app.router.add_post("/prompt", proxy.handle_prompt)
+    app.router.add_post("/api/prompt", proxy.handle_prompt)
+    app.router.add_get("/history/{prompt_id}", proxy.handle_history)
+    app.router.add_get("/api/history/{prompt_id}", proxy.handle_history)
+    app.router.add_get("/view", proxy.handle_view)
+    app.router.add_get("/api/view", proxy.handle_view)
+    app.router.add_get("/result-cache/stats", proxy.handle_stats)
+    app.router.add_route("*", "/{tail:.*}", proxy.handle_any)
+    print(f"  Result cache {cache.dir}: http://{args.listen}:{args.port} -> {proxy.upstream}", flush=True)
+    web.run_app(app, host=args.listen, port=args.port, print=None)
+
+
+def cmd_stats(args, cache):
+    count, size, hits, oldest = cache.index.totals()
+    print(f"  Cache dir:  {cache.dir}")
+    print(f"  Entries:    {count}")
+    print(f"  Size:       {size / 1e6:.1f} MB (limit {cache.max_bytes / 1e6:.0f} MB)")
+    print(f"  Hits:       {hits}")
+    if oldest:
+        print(f"  Oldest:     {time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))}")
+
+
+def cmd_prune(args, cache):
+    removed, freed = cache.prune(dry_run=args.dry_run)
+    verb = "would be removed" if args.dry_run else "removed"
+    print(f"  {removed} entries {verb}, {freed / 1e6:.1f} MB")
+
+
+def cmd_clear(args, cache):
+    keys = [k for k, _ in cache.index.least_recent()]
+    for key in keys:
+        shutil.rmtree(cache.entry_dir(key), ignore_errors=True)
+    cache.index.remove(keys)
+    print(f"  {len(keys)} entries removed")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-result-cache",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=("serve", "stats", "prune", "clear"))
+    parser.add_argument("--url", type=str, default=None,
+                        help="upstream ComfyUI URL (default: $COMFYUI_URL or http://127.0.0.1:8188)")
+    parser.add_argument("--listen", type=str, default="127.0.0.1", help="proxy listen address")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("COMFYUI_RESULT_CACHE_PORT", "8189")),
+                        help="proxy port (default: 8189)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="cache directory (default: $FLOX_ENV_CACHE/result-cache)")
+    parser.add_argument("--ttl", type=str, default=os.environ.get("COMFYUI_RESULT_CACHE_TTL", "7d"),
+                        help="drop entries older than this, 0 to keep (default: 7d)")
+    parser.add_argument("--max-bytes", type=str, default=os.environ.get("COMFYUI_RESULT_CACHE_MAX_BYTES", "20G"),
+                        help="evict least recently used entries above this size (default: 20G)")
+    parser.add_argument("--models-dir", type=str, default=None,
+                        help="override model directory (default: ~/comfyui-work/models)")
+    parser.add_argument("--dry-run", action="store_true", help="prune: only report")
+    args = parser.parse_args()
+
+    cache = ResultCache(get_cache_dir(args.cache_dir), parse_age(args.ttl), parse_size(args.max_bytes),
+                        args.models_dir)
+    commands = {"serve": cmd_serve, "stats": cmd_stats, "prune": cmd_prune, "clear": cmd_clear}
+    try:
+        commands[args.command](args, cache)
+    except ImportError as e:
+        print(f"ERROR: {e} (serve needs aiohttp; run it with the ComfyUI venv python)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Split all-in-one checkpoints into shareable diffusion model, CLIP and VAE files."""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+DESCRIPTION = """\
+Split a single-file checkpoint into diffusion_models/, clip/ and vae/.
+
+sd_xl_base_1.0 and v1-5-pruned-emaonly arrive as one checkpoint that
+bundles the UNet, the text encoder(s) and the VAE. Every workflow that
+loads it with CheckpointLoaderSimple keeps its own copy of the encoders
+and VAE, even when another model already uses identical ones. This tool
+writes each part as a separate safetensors file so that workflows can
+load them with UNETLoader, CLIPLoader / DualCLIPLoader and VAELoader:
+
+  model.diffusion_model.*                 diffusion_models/<name>_unet
+  cond_stage_model.transformer.*          clip/<name>_clip_l     (SD 1.x)
+  cond_stage_model.model.*                clip/<name>_clip_h     (SD 2.x)
+  conditioner.embedders.0.transformer.*   clip/<name>_clip_l     (SDXL)
+  conditioner.embedders.1.model.*         clip/<name>_clip_g     (SDXL)
+  first_stage_model.*                     vae/<name>_vae
+
+Tensors are copied in chunks from a memory-mapped input, so memory use
+does not depend on the checkpoint size. A part whose tensors already
+exist byte for byte in a file of the same directory (the VAE shared by
+SDXL finetunes, the CLIP-L shared by SD 1.x models) is not written again;
+the existing file is used instead.
+
+The bundled API workflows that load the checkpoint are rewritten to the
+split loaders and saved as <workflow>-split.json, using the file names
+actually chosen (existing duplicates included). The bundled originals
+keep loading the checkpoint, so --drop-original needs the split
+workflows and lists what still names the deleted file.
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_MODELS_DIR          Override model directory
+  COMFYUI_WORK_DIR            Override work directory (models in $COMFYUI_WORK_DIR/models)
+
+examples:
+  comfyui-split-checkpoint sd_xl_base_1.0.safetensors           Split checkpoints/sd_xl_base_1.0
+  comfyui-split-checkpoint --dry-run v1-5-pruned-emaonly.safetensors
+  comfyui-split-checkpoint --drop-original sd_xl_base_1.0.safetensors v1-5-pruned-emaonly.safetensors
+
+Bare names are looked up in <models-dir>/checkpoints/. Split workflows
+are written to <work-dir>/user/default/workflows/split/ (--workflows-out);
+the ComfyUI browser loads these API-format files like any other workflow,
+and comfyui-bench / comfyui-prefetch accept their paths. Only safetensors
+checkpoints are supported.
+"""
+
+COMPONENTS = (
+    ("model.diffusion_model.", "diffusion_models", "unet"),
+    ("cond_stage_model.transformer.", "clip", "clip_l"),
+    ("cond_stage_model.model.", "clip", "clip_h"),
+    ("conditioner.embedders.0.transformer.", "clip", "clip_l"),
+    ("conditioner.embedders.1.model.", "clip", "clip_g"),
+    ("first_stage_model.", "vae", "vae"),
+)
+# Rebuilt by ComfyUI's text encoder loaders; leaving them out lets encoders from other sources match.
+IGNORED_SUFFIXES = ("position_ids",)
+CHUNK = 16 * 1024 * 1024
+
+
+def get_models_dir(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get(
+        "COMFYUI_MODELS_DIR",
+        os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")) + "/models"
+    ))
+
+
+def get_work_dir():
+    return Path(os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")))
+
+
+def get_workflows_dir():
+    flox_env = os.environ.get("FLOX_ENV")
+    if flox_env:
+        return Path(flox_env) / "share/comfyui/workflows/api"
+    return Path(__file__).resolve().parent.parent / "sources/workflows/api"
+
+
+def format_size(n):
+    return f"{n / 1024 ** 3:.1f} GB" if n >= 1024 ** 3 else f"{n / 1024 ** 2:.0f} MB"
+
+
+def read_header(path):
+    """(header dict, byte offset of the data section) of a safetensors file."""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        if length > os.fstat(f.fileno()).st_size - 8:
+            raise ValueError(f"{path} is not a safetensors file")
+        header = json.loads(f.read(length))
+    return header, 8 + length
+
+
+class Component:
+    """One part of a checkpoint: its tensors (renamed) and where they end up."""
+
+    def __init__(self, subdir, kind, filename):
+        self.subdir = subdir
+        self.kind = kind
+        self.filename = filename
+        self.tensors = {}  # name in the output -> header entry in the checkpoint
+        self.existing = None
+
+    @property
+    def size(self):
+        return sum(info["data_offsets"][1] - info["data_offsets"][0] for info in self.tensors.values())
+
+    def signature(self):
+        return {key: (info["dtype"], tuple(info["shape"])) for key, info in self.tensors.items()}
+
+
+def split_header(header, stem):
+    """Group the checkpoint's tensors into components; returns (components, number of unused tensors)."""
+    components, unused = {}, 0
+    for key, info in header.items():
+        if key == "__metadata__":
+            continue
+        for prefix, subdir, kind in COMPONENTS:
+            if key.startswith(prefix):
+                if not key.endswith(IGNORED_SUFFIXES):
+                    if kind not in components:
+                        components[kind] = Component(subdir, kind, f"{stem}_{kind}.safetensors")
+                    components[kind].tensors[key[len(prefix):]] = info
+                break
+        else:
+            unused += 1
+    return list(components.values()), unused
+
+
+def content_hash(mm, base, tensors):
+    """SHA-256 over names, dtypes, shapes and data of the given tensors, in name order."""
+    h = hashlib.sha256()
+    for key in sorted(tensors):
+        info = tensors[key]
+        h.update(f"{key}\0{info['dtype']}\0{info['shape']}\0".encode())
+        start, end = info["data_offsets"]
+        for offset in range(base + start, base + end, CHUNK):
+            h.update(mm[offset:min(offset + CHUNK, base + end)])
+    return h.hexdigest()
+
+
+def mapped(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def find_duplicate(component, mm, base, target_dir):
+    """An existing file in target_dir that holds every tensor of component with identical data."""
+    if not target_dir.is_dir():
+        return None
+    wanted = component.signature()
+    digest = None
+    for path in sorted(target_dir.rglob("*.safetensors")):
+        try:
+            header, other_base = read_header(path)
+        except (OSError, ValueError):
+            continue
+        if any(key not in header or (header[key]["dtype"], tuple(header[key]["shape"])) != sig
+               for key, sig in wanted.items()):
+            continue
+        if digest is None:
+            digest = content_hash(mm, base, component.tensors)
+        other = mapped(path)
+        try:
+            if content_hash(other, other_base, {key: header[key] for key in wanted}) == digest:
+                return path.relative_to(target_dir).as_posix()  # loader name, subfolder included
+        finally:
+            other.close()
+    return None
+
+
+def write_component(component, mm, base, dst, source_name):
+    """Write component's tensors to dst, copying the data in chunks."""
+    out, offset = {"__metadata__": {"split_from": source_name}}, 0
+    order = sorted(component.tensors.items(), key=lambda kv: kv[1]["data_offsets"][0])
+    for key, info in order:
+        start, end = info["data_offsets"]
+        out[key] = {"dtype": info["dtype"], "shape": info["shape"], "data_offsets": [offset, offset + end - start]}
+        offset += end - start
+    raw = json.dumps(out, separators=(",", ":")).encode()
+    raw += b" " * (-len(raw) % 8)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    partial = dst.with_name(f".{dst.name}.partial")
+    try:
+        with open(partial, "wb") as f:
+            f.write(struct.pack("<Q", len(raw)) + raw)
+            for _, info in order:
+                start, end = info["data_offsets"]
+                for offset in range(base + start, base + end, CHUNK):
+                    f.write(mm[offset:min(offset + CHUNK, base + end)])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, dst)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def split_checkpoint(path, models_dir, dedupe=True, dry_run=False):
+    """Split path into components; returns {kind: file name used}."""
+    header, base = read_header(path)
+    components, unused = split_header(header, path.name.rsplit(".", 1)[0])
+    kinds = {c.kind for c in components}
+    if "unet" not in kinds or "vae" not in kinds or not kinds & {"clip_l", "clip_h", "clip_g"}:
+        raise ValueError(f"{path.name}: not an all-in-one checkpoint (found: {', '.join(sorted(kinds)) or 'nothing'})")
+
+    print(f"  {path.name} ({format_size(path.stat().st_size)})")
+    mm = mapped(path)
+    try:
+        for component in components:
+            target_dir = models_dir / component.subdir
+            dst = target_dir / component.filename
+            if dedupe:
+                component.existing = find_duplicate(component, mm, base, target_dir)
+            if component.existing:
+                print(f"    {component.kind:<7s} {component.subdir}/{component.existing}  (identical, reused)")
+                continue
+            print(f"    {component.kind:<7s} {component.subdir}/{component.filename}  ({format_size(component.size)})")
+            if not dry_run:
+                write_component(component, mm, base, dst, path.name)
+                if hasattr(os, "posix_fadvise"):
+                    with open(dst, "rb") as f:
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        mm.close()
+    if unused:
+        print(f"    {unused} other tensor(s) (EMA, noise schedule) not needed by ComfyUI's loaders were left out")
+    return {c.kind: c.existing or c.filename for c in components}
+
+
+def split_workflow(graph, ckpt_name, parts):
+    """Copy of an API graph with CheckpointLoaderSimple(ckpt_name) replaced by split loaders, or None."""
+    loaders = [node_id for node_id, node in graph.items()
+               if node.get("class_type") == "CheckpointLoaderSimple" and node["inputs"].get("ckpt_name") == ckpt_name]
+    if not loaders:
+        return None
+    graph = json.loads(json.dumps(graph))
+    next_id = max(int(node_id) for node_id in graph if node_id.isdigit()) + 1
+    for node_id in loaders:
+        if "clip_g" in parts:
+            clip = {"inputs": {"clip_name1": parts["clip_l"], "clip_name2": parts["clip_g"], "type": "sdxl"},
+                    "class_type": "DualCLIPLoader", "_meta": {"title": "Load CLIP"}}
+        else:
+            clip = {"inputs": {"clip_name": parts.get("clip_l") or parts["clip_h"], "type": "stable_diffusion"},
+                    "class_type": "CLIPLoader", "_meta": {"title": "Load CLIP"}}
+        clip_id, vae_id = str(next_id), str(next_id + 1)
+        next_id += 2
+        graph[node_id] = {"inputs": {"unet_name": parts["unet"], "weight_dtype": "default"},
+                          "class_type": "UNETLoader", "_meta": {"title": "Load Diffusion Model"}}
+        graph[clip_id] = clip
+        graph[vae_id] = {"inputs": {"vae_name": parts["vae"]}, "class_type": "VAELoader", "_meta": {"title": "Load VAE"}}
+        for node in graph.values():
+            for name, value in node["inputs"].items():
+                if isinstance(value, list) and len(value) == 2 and value[0] == node_id:
+                    node["inputs"][name] = [(node_id, clip_id, vae_id)[value[1]], 0]
+    return graph
+
+
+def bundled_workflows():
+    """(path, graph) of every bundled API workflow."""
+    for path in sorted(get_workflows_dir().rglob("*.json")):
+        try:
+            graph = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if isinstance(graph, dict) and all(isinstance(node, dict) and "class_type" in node
+                                           for node in graph.values()):
+            yield path, graph
+
+
+def loads_checkpoint(graph, ckpt_name):
+    return any(node.get("class_type") == "CheckpointLoaderSimple" and node["inputs"].get("ckpt_name") == ckpt_name
+               for node in graph.values())
+
+
+def report_references(ckpt_name):
+    """Print the bundled workflows and COMFYUI_PREFETCH/COMFYUI_PIN entries that name ckpt_name."""
+    users = [path.stem for path, graph in bundled_workflows() if loads_checkpoint(graph, ckpt_name)]
+    for stem in users:
+        print(f"    {stem} still loads {ckpt_name}; use {stem}-split.json")
+    for var in ("COMFYUI_PREFETCH", "COMFYUI_PIN"):
+        for item in filter(None, (v.strip() for v in os.environ.get(var, "").split(","))):
+            if Path(item).stem in users or os.path.basename(item) == ckpt_name:
+                print(f"    ${var} entry {item!r} needs {ckpt_name}; point it at the split workflow")
+
+
+def write_workflows(ckpt_name, parts, out_dir):
+    written = []
+    for path, graph in bundled_workflows():
+        split = split_workflow(graph, ckpt_name, parts)
+        if split is None:
+            continue
+        out_dir.mkdir(parents=True, exist_ok=True)
+        target = out_dir / f"{path.stem}-split.json"
+        target.write_text(json.dumps(split, indent=2) + "\n")
+        written.append(target)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-split-checkpoint",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("checkpoints", nargs="+", help="checkpoint names (in checkpoints/) or paths")
+    parser.add_argument("--models-dir", type=str, default=None,
+                        help="models directory (default: $COMFYUI_WORK_DIR/models)")
+    parser.add_argument("--workflows-out", type=str, default=None,
+                        help="directory for the split workflows (default: <work-dir>/user/default/workflows/split)")
+    parser.add_argument("--no-workflows", action="store_true", help="do not write split workflows")
+    parser.add_argument("--no-dedupe", action="store_true", help="always write every part")
+    parser.add_argument("--drop-original", action="store_true",
+                        help="delete each checkpoint after splitting it (needs the split workflows)")
+    parser.add_argument("--dry-run", action="store_true", help="show what would be written")
+    args = parser.parse_args()
+    if args.drop_original and args.no_workflows:
+        parser.error("--drop-original needs the split workflows: the bundled ones still load the checkpoint")
+
+    models_dir = get_models_dir(args.models_dir)
+    out_dir = Path(args.workflows_out) if args.workflows_out else get_work_dir() / "user/default/workflows/split"
+
+    print("=" * 70)
+    print("  Checkpoint Split")
+    print("=" * 70)
+    print(f"  Models: {models_dir}")
+    print()
+
+    failed = False
+    for name in args.checkpoints:
+        path = Path(name)
+        if not path.exists() and len(path.parts) == 1:
+            path = models_dir / "checkpoints" / name
+        try:
+            parts = split_checkpoint(path, models_dir, dedupe=not args.no_dedupe, dry_run=args.dry_run)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  {name}: {e}")
+            failed = True
+            continue
+        if not args.no_workflows and not args.dry_run:
+            for target in write_workflows(path.name, parts, out_dir):
+                print(f"    workflow {target}")
+        if args.drop_original and not args.dry_run:
+            report_references(path.name)
+            path.unlink()
+            print(f"    removed {path.name}")
+        print()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Check the tiled upscaler (ComfyUI-TiledUpscale) against untiled processing."""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+
+DESCRIPTION = """\
+Check that TiledUpscaleRefine matches untiled processing on small images.
+
+The vendored ComfyUI-TiledUpscale extension cuts an image into
+overlapping tiles, processes them in batches and blends them back with
+feathered masks. This tool runs the same small images tiled and untiled
+and compares the results:
+
+  blend     Tiles processed by pixel-wise functions (identity, a tone
+            curve) and blended must reproduce the untiled result, for odd
+            sizes, several tile sizes, overlaps and batch sizes.
+            Needs no model.
+
+  refine    With --checkpoint: the full VAE encode -> KSampler -> VAE
+            decode pipeline on a --size image, once per --samplers entry
+            (default: euler and euler_ancestral).
+              - one tile covering the image == untiled refine (exact)
+              - tiles in batches of N == the same tiles one at a time
+                (within --tolerance; batched kernels round differently).
+                Ancestral/SDE samplers draw per-step noise per batch, so
+                for them the difference is reported, not checked
+              - small tiles vs untiled: PSNR, reported (diffusion sees a
+                different context per tile, so this is not exact);
+                --min-psnr turns it into a check
+
+The exit status is 1 if any check fails.
+"""
+
+EPILOG = """\
+environment variables:
+  FLOX_ENV_CACHE           Cache root (runtime at $FLOX_ENV_CACHE/comfyui-runtime)
+  COMFYUI_MODELS_DIR       Models directory (default: $COMFYUI_WORK_DIR/models)
+
+examples:
+  comfyui-tile-check
+  comfyui-tile-check --checkpoint v1-5-pruned-emaonly.safetensors
+  comfyui-tile-check --checkpoint sd_xl_base_1.0.safetensors --size 768x512 --tile 512 --device cuda
+  comfyui-tile-check --checkpoint v1-5-pruned-emaonly.safetensors --samplers dpmpp_2m,dpmpp_sde
+
+Run it with the ComfyUI venv python after comfyui-setup has linked the
+custom nodes. --checkpoint is a file name under models/checkpoints or a
+path. On CPU keep --size and --steps small.
+"""
+
+# Samplers that add noise while sampling, drawn for a whole batch from one seed
+NOISY_SAMPLERS = ("ancestral", "sde")
+
+BLEND_CASES = [  # (height, width, tile, overlap)
+    (64, 64, 64, 0),
+    (64, 64, 32, 8),
+    (136, 200, 64, 16),
+    (389, 517, 128, 32),
+    (517, 389, 96, 48),
+]
+
+
+def get_models_dir(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get(
+        "COMFYUI_MODELS_DIR",
+        os.environ.get("COMFYUI_WORK_DIR", str(Path.home() / "comfyui-work")) + "/models"
+    ))
+
+
+def get_runtime(override=None):
+    if override:
+        return Path(override)
+    return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui")) / "comfyui-runtime"
+
+
+def load_tiled_upscale(runtime, device):
+    sys.argv = ["main.py"] + (["--cpu"] if device == "cpu" else [])
+    os.chdir(runtime)
+    sys.path.insert(0, str(runtime))
+    spec = importlib.util.spec_from_file_location(
+        "tiled_upscale", runtime / "custom_nodes" / "ComfyUI-TiledUpscale" / "__init__.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def report(name, ok, detail):
+    print(f"  {'ok  ' if ok else 'FAIL'}  {name:<44} {detail}")
+    return ok
+
+
+def check_blend(tiled):
+    import torch
+
+    torch.manual_seed(0)
+    functions = {"identity": lambda t: t, "tone curve": lambda t: t * t * 0.8 + 0.1}
+    ok = True
+    for height, width, tile, overlap in BLEND_CASES:
+        image = torch.rand(height, width, 3)
+        for name, fn in functions.items():
+            untiled = fn(image)
+            worst = 0.0
+            for batch in (1, 3, 64):
+                out = tiled.run_tiled(image, tile, tile, overlap, batch, lambda t, i: fn(t))
+                worst = max(worst, (out - untiled).abs().max().item())
+            ok &= report(f"{width}x{height} tile {tile} overlap {overlap} {name}", worst < 1e-5,
+                         f"max error {worst:.1e}")
+    return ok
+
+
+def psnr(a, b):
+    import math
+    mse = (a - b).pow(2).mean().item()
+    return float("inf") if mse == 0 else 10 * math.log10(1.0 / mse)
+
+
+def check_refine(tiled, args):
+    import torch
+    import comfy.sd
+    import comfy.samplers
+    import folder_paths
+
+    path = Path(args.checkpoint)
+    if not path.exists():
+        path = get_models_dir(args.models_dir) / "checkpoints" / args.checkpoint
+    if not path.exists():
+        return report("refine", False, f"checkpoint not found: {args.checkpoint}")
+    print(f"\n  Loading {path.name}")
+    model, clip, vae = comfy.sd.load_checkpoint_guess_config(
+        str(path), output_vae=True, output_clip=True,
+        embedding_directory=folder_paths.get_folder_paths("embeddings"))[:3]
+    positive = clip.encode_from_tokens_scheduled(clip.tokenize("high quality, detailed, sharp focus"))
+    negative = clip.encode_from_tokens_scheduled(clip.tokenize("blurry, low quality"))
+
+    align = vae.spacial_compression_encode()
+    width, height = (v - v % align for v in args.size)
+    yy, xx = torch.meshgrid(torch.linspace(0, 1, height), torch.linspace(0, 1, width), indexing="ij")
+    torch.manual_seed(0)
+    image = torch.stack([xx, yy, (xx + yy) / 2], dim=-1) * 0.8 + torch.rand(height, width, 3) * 0.2
+    tile = args.tile or max(align * 8, (min(width, height) // 2) // align * align)
+    overlap = min(args.overlap, tile // 2)
+
+    ok = True
+    for sampler in args.samplers:
+        if sampler not in comfy.samplers.KSampler.SAMPLERS:
+            ok &= report(f"{sampler}", False, "unknown sampler")
+            continue
+        print(f"\n  Sampler {sampler}")
+        process = tiled.refiner(model, vae, positive, negative, args.seed, args.steps, args.cfg,
+                                sampler, "normal", args.denoise)
+        start = time.monotonic()
+        untiled = process(image.unsqueeze(0), [0])[0].float().cpu()
+        print(f"  Untiled refine of {width}x{height} in {time.monotonic() - start:.1f}s")
+        single = tiled.run_tiled(image, width, height, overlap, 1, process, align)
+        error = (single - untiled).abs().max().item()
+        ok &= report("one tile == untiled refine", error == 0, f"max error {error:.1e}")
+
+        one = tiled.run_tiled(image, tile, tile, overlap, 1, process, align)
+        batched = tiled.run_tiled(image, tile, tile, overlap, args.batch, process, align)
+        error = (one - batched).abs().max().item()
+        if any(tag in sampler for tag in NOISY_SAMPLERS):
+            report(f"tile {tile}: batch {args.batch} vs batch 1", True,
+                   f"max difference {error:.1e} (per-step noise is per batch)")
+        else:
+            ok &= report(f"tile {tile}: batch {args.batch} == batch 1", error <= args.tolerance,
+                         f"max error {error:.1e}")
+
+        value = psnr(batched, untiled)
+        passed = args.min_psnr is None or value >= args.min_psnr
+        ok &= report(f"tile {tile} overlap {overlap} vs untiled", passed, f"PSNR {value:.1f} dB")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-tile-check",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="checkpoint for the refine checks (file name under models/checkpoints, or a path)")
+    parser.add_argument("--size", type=str, default="512x384", help="refine: image WIDTHxHEIGHT (default: 512x384)")
+    parser.add_argument("--tile", type=int, default=0, help="refine: tile size (default: half the short side)")
+    parser.add_argument("--overlap", type=int, default=64, help="refine: tile overlap (default: 64)")
+    parser.add_argument("--batch", type=int, default=4, help="refine: tiles per batch (default: 4)")
+    parser.add_argument("--steps", type=int, default=4, help="refine: sampler steps (default: 4)")
+    parser.add_argument("--cfg", type=float, default=7.0, help="refine: CFG (default: 7.0)")
+    parser.add_argument("--denoise", type=float, default=0.25, help="refine: denoise (default: 0.25)")
+    parser.add_argument("--seed", type=int, default=42, help="refine: seed (default: 42)")
+    parser.add_argument("--samplers", type=str, default="euler,euler_ancestral",
+                        help="refine: samplers to check, comma-separated (default: euler,euler_ancestral)")
+    parser.add_argument("--tolerance", type=float, default=2e-2,
+                        help="refine: max pixel difference between batch sizes (default: 0.02)")
+    parser.add_argument("--min-psnr", type=float, default=None, help="refine: fail below this PSNR vs untiled")
+    parser.add_argument("--device", choices=("cpu", "cuda"), default="cpu", help="device (default: cpu)")
+    parser.add_argument("--models-dir", type=str, default=None, help="models directory")
+    parser.add_argument("--runtime", type=str, default=None,
+                        help="ComfyUI runtime directory (default: $FLOX_ENV_CACHE/comfyui-runtime)")
+    args = parser.parse_args()
+
+    try:
+        args.size = tuple(int(v) for v in args.size.lower().split("x"))
+        if len(args.size) != 2:
+            raise ValueError
+    except ValueError:
+        parser.error(f"--size must be WIDTHxHEIGHT, got {args.size!r}")
+    args.samplers = [s.strip() for s in args.samplers.split(",") if s.strip()]
+    runtime = get_runtime(args.runtime)
+    if not (runtime / "custom_nodes" / "ComfyUI-TiledUpscale").exists():
+        print(f"ERROR: ComfyUI-TiledUpscale not found in {runtime}/custom_nodes (run comfyui-setup first).")
+        sys.exit(1)
+
+    tiled = load_tiled_upscale(runtime, args.device)
+    print("  Blending (pixel-wise functions, tiled vs untiled)")
+    ok = check_blend(tiled)
+    if args.checkpoint:
+        ok &= check_refine(tiled, args)
+    else:
+        print("\n  Refine checks skipped (pass --checkpoint)")
+    print(f"\n  {'All checks passed' if ok else 'Some checks FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""Pick ComfyUI memory and cache flags from the machine and a workload profile."""
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DESCRIPTION = """\
+Choose ComfyUI's memory-mode and cache flags for a workload.
+
+ComfyUI decides how much of a model stays on the GPU and how many node
+outputs it caches without knowing what will run next. For a known
+workload the right choice follows from a few numbers: the size of the
+largest model, the size of all models a job uses, the activation memory
+of the workload, and the VRAM and RAM of the machine.
+
+Rules, in order:
+  --reserve-vram N  when other processes already hold VRAM (a desktop,
+                    another service), so ComfyUI does not plan with it
+  --highvram        every model of the workload plus activations fits:
+                    keep them all on the GPU between jobs
+  (normal)          the largest model fits, but not all of them:
+                    ComfyUI swaps models between jobs
+  --lowvram         the largest model does not fit: load it in parts
+  --novram          even a part does not fit
+  --cache-none      RAM cannot hold the offloaded models and cached
+                    outputs: recompute instead of caching
+  --cache-lru N     profiles with many different graphs (throughput
+                    serving) keep N node outputs, sized from free RAM
+  (classic cache)   everything else
+
+Profiles (model sizes as ComfyUI loads them):
+PROFILE_TABLE
+Commands:
+  show     Print the machine, the chosen flags and the reason for each (default)
+  flags    Print only the flags, one per line (used by comfyui-start);
+           reasons go to stderr
+  bench    Start ComfyUI once per profile and compare the bundled
+           workflows (see comfyui-bench)
+  list     List the profiles
+"""
+
+EPILOG = """\
+environment variables:
+  COMFYUI_PROFILE      Profile comfyui-start tunes for (unset: no tuning)
+  COMFYUI_DEVICE       Device comfyui-start uses (cpu disables tuning)
+
+examples:
+  comfyui-tune show --profile flux                  What would be chosen here, and why
+  comfyui-tune show --profile wan22-14b --vram 24G --ram 64G   ... on another machine
+  comfyui-tune bench --profiles none,flux --only flux          Measure the difference
+  COMFYUI_PROFILE=flux flox services restart comfyui
+
+'bench' runs every workflow with one warm-up and without unloading
+models between runs, so the flags' effect on model residency shows up.
+Profile 'none' starts ComfyUI without tuned flags, as a baseline.
+"""
+
+GB = 1024 ** 3
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+OS_RESERVE = 4 * GB           # RAM left to the OS and ComfyUI itself
+OTHER_VRAM_MIN = GB // 2      # VRAM in use by others before --reserve-vram is set
+NOVRAM_BELOW = 2 * GB
+LRU_RANGE = (8, 500)
+
+# largest: biggest single model; total: every model a job loads; activations: peak working memory.
+# lru_per_gb: node outputs worth caching per GB of free RAM, 0 for the classic cache.
+PROFILES = {
+    "sd15-throughput": {"largest": 2.2, "total": 2.2, "activations": 2.0, "lru_per_gb": 10,
+                        "about": "SD 1.5 serving many different prompts and graphs"},
+    "sdxl": {"largest": 5.1, "total": 6.9, "activations": 4.0, "lru_per_gb": 0,
+             "about": "SDXL base at 1024x1024"},
+    "flux": {"largest": 23.8, "total": 34.2, "activations": 6.0, "lru_per_gb": 0,
+             "about": "FLUX.1-dev bf16 with t5xxl fp16"},
+    "wan22-5b": {"largest": 10.0, "total": 18.1, "activations": 8.0, "lru_per_gb": 0,
+                 "about": "Wan 2.2 TI2V 5B fp16"},
+    "wan22-14b": {"largest": 14.3, "total": 35.6, "activations": 10.0, "lru_per_gb": 0,
+                  "about": "Wan 2.2 14B fp8 high/low-noise pair with umt5_xxl"},
+}
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def load_sibling(name):
+    """Import a sibling comfyui-*.py script (installed next to this one) as a module."""
+    path = Path(__file__).resolve().parent / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def gb(n):
+    return f"{n / GB:.1f} GB"
+
+
+def memory_info():
+    """(total RAM, available RAM) in bytes."""
+    try:
+        with open("/proc/meminfo") as f:
+            info = {line.split(":")[0]: int(line.split()[1]) * 1024 for line in f}
+        return info["MemTotal"], info.get("MemAvailable", info["MemTotal"])
+    except (OSError, KeyError, ValueError):
+        total = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        return total, total // 2
+
+
+def gpu_memory(device):
+    """(total VRAM, VRAM used by other processes) of the first GPU, or (None, 0)."""
+    if device in ("cpu", "mps"):
+        return None, 0
+    if shutil.which("nvidia-smi"):
+        try:
+            out = subprocess.run(["nvidia-smi", "--query-gpu=memory.total,memory.used",
+                                  "--format=csv,noheader,nounits", "--id=0"],
+                                 capture_output=True, text=True, timeout=10, check=True).stdout
+            total, used = (int(v) * 1024 ** 2 for v in out.strip().split(","))
+            return total, used
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info(0)
+            return total, total - free
+    except Exception:
+        pass
+    return None, 0
+
+
+def decide(profile, device, vram, vram_used, ram_total):
+    """Flags for a profile on this machine, with one reason per decision."""
+    flags, reasons = [], []
+    if device == "cpu":
+        return flags, ["CPU mode: ComfyUI's VRAM and cache flags do not apply"]
+    largest, total = profile["largest"] * GB, profile["total"] * GB
+    activations = profile["activations"] * GB
+
+    offloaded = total  # model bytes kept in RAM while not on the GPU
+    if vram is None:
+        reasons.append(f"{device}: no dedicated VRAM to plan with, memory mode left to ComfyUI")
+    else:
+        usable = vram
+        if vram_used >= OTHER_VRAM_MIN:
+            reserve = math.ceil((vram_used + OTHER_VRAM_MIN) / (GB / 2)) / 2
+            flags += ["--reserve-vram", f"{reserve:g}"]
+            usable -= reserve * GB
+            reasons.append(f"--reserve-vram {reserve:g}: {gb(vram_used)} of VRAM is already used by other processes")
+        if usable >= total + activations:
+            flags.append("--highvram")
+            reasons.append(f"--highvram: all models ({gb(total)}) plus activations ({gb(activations)}) "
+                           f"fit in {gb(usable)} of VRAM, so they stay loaded between jobs")
+        elif usable >= largest:
+            reasons.append(f"normal VRAM: the largest model ({gb(largest)}) fits in {gb(usable)}, but not all "
+                           f"models ({gb(total)}) with activations; ComfyUI swaps them between jobs")
+        elif usable >= NOVRAM_BELOW + activations / 2:
+            flags.append("--lowvram")
+            reasons.append(f"--lowvram: the largest model ({gb(largest)}) does not fit in {gb(usable)}, "
+                           f"so its weights are loaded in parts")
+        else:
+            flags.append("--novram")
+            reasons.append(f"--novram: {gb(usable)} of VRAM is too little to hold model parts next to activations")
+
+        if "--highvram" in flags:
+            offloaded = 0
+        else:
+            offloaded = max(0, total - max(0, usable - activations))
+
+    headroom = ram_total - OS_RESERVE - offloaded
+    if headroom < 0:
+        flags.append("--cache-none")
+        reasons.append(f"--cache-none: {gb(ram_total)} of RAM cannot hold the models that do not fit on the "
+                       f"GPU ({gb(offloaded)}) and cached outputs; nodes are recomputed instead")
+    elif profile["lru_per_gb"]:
+        size = max(LRU_RANGE[0], min(LRU_RANGE[1], int(headroom / GB * profile["lru_per_gb"])))
+        flags += ["--cache-lru", str(size)]
+        reasons.append(f"--cache-lru {size}: varied graphs reuse fewer outputs than the classic cache keeps; "
+                       f"{gb(headroom)} of RAM headroom allows {size} cached node outputs")
+    else:
+        reasons.append(f"classic cache: {gb(headroom)} of RAM headroom, and repeated graphs of this workload "
+                       f"reuse the outputs of the last run")
+    return flags, reasons
+
+
+def machine(args):
+    ram_total, ram_available = memory_info()
+    if args.ram:
+        ram_total = ram_available = parse_size(args.ram)
+    if args.vram:
+        vram, vram_used = parse_size(args.vram), 0
+        device = args.device if args.device not in ("auto", "cpu") else "cuda"
+    else:
+        device = args.device if args.device != "auto" else detect_device()
+        vram, vram_used = gpu_memory(device)
+    return device, vram, vram_used, ram_total, ram_available
+
+
+def detect_device():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+        if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+            return "mps"
+    except ImportError:
+        pass
+    return "cpu"
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        print(f"ERROR: unknown profile '{name}' (choose from: {', '.join(PROFILES)})", file=sys.stderr)
+        sys.exit(1)
+    return PROFILES[name]
+
+
+def cmd_show(args):
+    device, vram, vram_used, ram_total, ram_available = machine(args)
+    flags, reasons = decide(get_profile(args.profile), device, vram, vram_used, ram_total)
+    print(f"  Profile: {args.profile} ({PROFILES[args.profile]['about']})")
+    print(f"  Device:  {device}" + (f", {gb(vram)} VRAM ({gb(vram_used)} in use)" if vram else ""))
+    print(f"  RAM:     {gb(ram_total)} ({gb(ram_available)} available)")
+    print(f"  Flags:   {' '.join(flags) or '(none)'}")
+    for reason in reasons:
+        print(f"    - {reason}")
+
+
+def cmd_flags(args):
+    device, vram, vram_used, ram_total, _ = machine(args)
+    flags, reasons = decide(get_profile(args.profile), device, vram, vram_used, ram_total)
+    for reason in reasons:
+        print(f"  Tune:    {reason}", file=sys.stderr)
+    for flag in flags:
+        print(flag)
+
+
+def cmd_list(args):
+    for name, p in PROFILES.items():
+        print(f"  {name:<16s} largest {p['largest']:>5.1f} GB, all {p['total']:>5.1f} GB, "
+              f"activations {p['activations']:>4.1f} GB  {p['about']}")
+
+
+def cmd_bench(args):
+    bench = load_sibling("comfyui-bench")
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("ERROR: aiohttp is not installed (run this with the ComfyUI venv python).")
+        sys.exit(1)
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    for name in profiles:
+        if name != "none":
+            get_profile(name)
+    workflows = bench.find_workflows(bench.get_workflows_dir(args.workflows_dir), args.only)
+    if not workflows:
+        print("  ERROR: no API workflows found.")
+        sys.exit(1)
+
+    print()
+    print("=" * 70)
+    print("  ComfyUI profile comparison")
+    print("=" * 70)
+    print(f"  Profiles:  {', '.join(profiles)}")
+    print(f"  Workflows: {len(workflows)}  (size<={args.size} steps<={args.steps}, "
+          f"{args.warmup} warm-up + {args.repeat} measured, models kept loaded)")
+    print()
+
+    columns = {}
+    for name in profiles:
+        print(f"  [{name}]")
+        run_args = argparse.Namespace(url=None, port=args.port, seed=42, size=args.size, steps=args.steps,
+                                      repeat=args.repeat, warmup=args.warmup, timeout=args.timeout,
+                                      keep_logs=args.keep_logs, device=args.device,
+                                      profile=None if name == "none" else name, cold=False)
+        try:
+            _, columns[name] = asyncio.run(bench.run_benchmarks(run_args, workflows))
+        except RuntimeError as e:
+            print(f"    ERROR: {e}")
+            columns[name] = {}
+        print()
+
+    width = max(12, *(len(p) + 2 for p in profiles))
+    print(f"  {'workflow':<36s}" + "".join(f"{p:>{width}s}" for p in profiles))
+    for workflow, _ in workflows:
+        cells = []
+        for name in profiles:
+            result = columns[name].get(workflow, {})
+            cells.append(f"{result['wall_seconds']:.2f}s" if result.get("status") == "ok"
+                         else result.get("status", "-"))
+        print(f"  {workflow:<36s}" + "".join(f"{c:>{width}s}" for c in cells))
+
+    if args.output:
+        report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                  "settings": {"size": args.size, "steps": args.steps, "repeat": args.repeat, "warmup": args.warmup},
+                  "profiles": columns}
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\n  Results written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-tune",
+        description=DESCRIPTION.replace("PROFILE_TABLE\n", "".join(
+            f"  {name:<16s} {p['about']}\n" for name, p in PROFILES.items())),
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", choices=("show", "flags", "bench", "list"), default="show")
+    parser.add_argument("--profile", type=str, default=os.environ.get("COMFYUI_PROFILE"),
+                        help="workload profile (default: $COMFYUI_PROFILE)")
+    parser.add_argument("--device", type=str, default=os.environ.get("COMFYUI_DEVICE", "auto"),
+                        help="device: auto, cpu, cuda, mps, ... (default: $COMFYUI_DEVICE or auto)")
+    parser.add_argument("--vram", type=str, default=None, help="plan for this much VRAM instead of detecting it")
+    parser.add_argument("--ram", type=str, default=None, help="plan for this much RAM instead of detecting it")
+    parser.add_argument("--profiles", type=str, default="none," + ",".join(PROFILES),
+                        help="bench: comma-separated profiles to compare ('none' = untuned)")
+    parser.add_argument("--only", type=str, default=None, help="bench: workflow families to run (e.g. flux)")
+    parser.add_argument("--workflows-dir", type=str, default=None, help="bench: API workflow directory")
+    parser.add_argument("--port", type=int, default=8199, help="bench: server port (default: 8199)")
+    parser.add_argument("--size", type=int, default=1024, help="bench: maximum width/height (default: 1024)")
+    parser.add_argument("--steps", type=int, default=8, help="bench: maximum sampler steps (default: 8)")
+    parser.add_argument("--repeat", type=int, default=2, help="bench: measured runs per workflow (default: 2)")
+    parser.add_argument("--warmup", type=int, default=1, help="bench: discarded runs per workflow (default: 1)")
+    parser.add_argument("--timeout", type=int, default=1800, help="bench: per-run timeout (default: 1800)")
+    parser.add_argument("--output", type=str, default=None, help="bench: write the results as JSON")
+    parser.add_argument("--keep-logs", action="store_true", help="bench: keep the server logs")
+    args = parser.parse_args()
+
+    if args.command in ("show", "flags") and not args.profile:
+        parser.error(f"{args.command} needs --profile or COMFYUI_PROFILE")
+    if args.command == "bench" and args.device == "auto":
+        args.device = "gpu"
+    {"show": cmd_show, "flags": cmd_flags, "bench": cmd_bench, "list": cmd_list}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Precompressed copy of the ComfyUI frontend for cache-friendly serving."""
+import argparse
+import gzip
+import importlib.metadata
+import importlib.util
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DESCRIPTION = """\
+Precompress the ComfyUI frontend so static assets cost the server nothing.
+
+The frontend (comfyui-frontend-package in the venv) ships several MB of
+JavaScript and CSS. ComfyUI serves these files uncompressed, and every
+new browser session on a remote workstation downloads all of them. This
+tool makes a writable copy of the frontend and adds .gz (and .br, if the
+brotli module is installed) variants next to each text asset:
+
+  $FLOX_ENV_CACHE/frontend/<version>-<build time>/   copy + variants
+  $FLOX_ENV_CACHE/frontend/current        -> the copy comfyui-start uses
+
+comfyui-start passes --front-end-root pointing at this copy. ComfyUI
+serves static files with aiohttp's FileResponse, which already picks
+index.js.br or index.js.gz when the browser accepts them and answers
+If-None-Match with 304. The files are sent with sendfile, so nothing is
+compressed on ComfyUI's event loop.
+
+The vendored ComfyUI-StaticAssets extension adds the caching headers.
+Files under /assets/ have content hashes in their names (index-B2xQ9f.js)
+and are marked immutable for a year. Everything else is revalidated by
+ETag, and the copy gets fresh mtimes on each build, so ETags change
+whenever the frontend does.
+
+Commands:
+  build    Create the copy for the installed frontend version (default;
+           does nothing when it is already current)
+  status   Show the current copy and its compression ratios
+"""
+
+EPILOG = """\
+environment variables:
+  FLOX_ENV_CACHE              Cache root (copies under $FLOX_ENV_CACHE/frontend)
+  COMFYUI_STATIC_ASSETS       Set to 0 to serve the frontend package directly
+
+examples:
+  comfyui-web-assets build                   What comfyui-setup runs in the background
+  comfyui-web-assets build --force           Rebuild the current version
+  comfyui-web-assets status
+
+Run it with the ComfyUI venv python so the installed frontend package is
+found (or pass --source). Browsers only ask for brotli over HTTPS; plain
+HTTP sessions get the gzip variants. Variants are kept only when at least 10%
+smaller than the original. Builds go to a temporary directory first and
+'current' is switched atomically, so a running server never sees a
+half-written copy.
+"""
+
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".json", ".svg", ".map", ".txt", ".xml", ".wasm", ".ttf", ".otf"}
+MIN_SIZE = 1024
+MIN_SAVING = 0.10
+SOURCE_MARKER = ".source"
+# Vite/Rollup output names: index-DlR3hbZs.js (hash has a digit or capital)
+HASHED_NAME = re.compile(r"[-.](?=[A-Za-z0-9_]*[A-Z0-9])[A-Za-z0-9_]{8,}\.\w+$")
+
+
+def get_frontend_root():
+    return Path(os.environ.get("FLOX_ENV_CACHE", Path.home() / ".cache/comfyui")) / "frontend"
+
+
+def find_frontend():
+    """(static dir, version, dist-info dir) of the installed comfyui-frontend-package."""
+    spec = importlib.util.find_spec("comfyui_frontend_package")
+    if spec is None or not spec.submodule_search_locations:
+        return None, None, None
+    static = Path(list(spec.submodule_search_locations)[0]) / "static"
+    dist = importlib.metadata.distribution("comfyui-frontend-package")
+    metadata = [f for f in dist.files or () if f.name == "METADATA" and f.parent.name.endswith(".dist-info")]
+    dist_info = Path(dist.locate_file(metadata[0])).parent if metadata else static
+    return static, dist.version, dist_info
+
+
+def compress(path):
+    """Write path.gz / path.br next to path when they save enough. Returns (original, gz, br) sizes."""
+    data = path.read_bytes()
+    sizes = [len(data), 0, 0]
+    variants = [(".gz", 1, lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", 2, lambda d: brotli.compress(d, quality=11)))
+    for suffix, slot, encode in variants:
+        packed = encode(data)
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            path.with_name(path.name + suffix).write_bytes(packed)
+            sizes[slot] = len(packed)
+    return sizes
+
+
+def cmd_build(args):
+    root = get_frontend_root()
+    if args.source:
+        static, version, source = Path(args.source), args.version or "custom", Path(args.source)
+    else:
+        static, version, source = find_frontend()
+    if static is None or not (static / "index.html").exists():
+        print("ERROR: comfyui-frontend-package not found (run with the ComfyUI venv python or pass --source).")
+        sys.exit(1)
+
+    current = root / "current"
+    marker = current / SOURCE_MARKER
+    if not args.force and marker.exists() and marker.read_text().strip() == str(source):
+        print(f"  Frontend {version} is already precompressed ({current.resolve()})")
+        return
+
+    root.mkdir(parents=True, exist_ok=True)
+    target = root / f"{version}-{time.strftime('%Y%m%d%H%M%S')}"
+    staging = root / f".{target.name}.{os.getpid()}"
+    started = time.monotonic()
+    # copyfile, not copy2: fresh mtimes make the ETags differ from any earlier build
+    shutil.copytree(static, staging, copy_function=shutil.copyfile)
+    candidates = [p for p in staging.rglob("*")
+                  if p.is_file() and p.suffix.lower() in COMPRESSIBLE and p.stat().st_size >= MIN_SIZE]
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(compress, candidates))
+    (staging / SOURCE_MARKER).write_text(f"{source}\n")
+
+    # Repoint 'current' at the finished copy. A running ComfyUI resolved the
+    # old link at startup, so the previous copy stays until the next build.
+    previous = current.resolve() if current.is_symlink() else None
+    staging.rename(target)
+    link = root / f".current.{os.getpid()}"
+    link.symlink_to(target.name)
+    os.replace(link, current)
+    for entry in root.iterdir():
+        if entry.is_dir() and not entry.is_symlink() and entry not in (target, previous):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    original = sum(r[0] for r in results)
+    gz = sum(r[1] or r[0] for r in results)
+    br = sum(r[2] or r[0] for r in results)
+    print(f"  Frontend {version}: {len(candidates)} text assets, {original / 1e6:.1f} MB")
+    print(f"    gzip:   {gz / 1e6:.1f} MB")
+    if brotli is not None:
+        print(f"    brotli: {br / 1e6:.1f} MB")
+    else:
+        print("    brotli: skipped (module not installed)")
+    print(f"  Built {target} in {time.monotonic() - started:.1f}s")
+
+
+def cmd_status(args):
+    current = get_frontend_root() / "current"
+    if not (current / "index.html").exists():
+        print("  No precompressed frontend (run 'comfyui-web-assets build').")
+        return
+    target = current.resolve()
+    original = gz = br = 0
+    count = 0
+    for path in target.rglob("*"):
+        if path.suffix in (".gz", ".br") or not path.is_file():
+            continue
+        size = path.stat().st_size
+        original += size
+        gz_path, br_path = path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")
+        gz += gz_path.stat().st_size if gz_path.exists() else size
+        br += br_path.stat().st_size if br_path.exists() else size
+        count += gz_path.exists() or br_path.exists()
+    hashed = sum(1 for p in (target / "assets").rglob("*")
+                 if p.suffix not in (".gz", ".br") and HASHED_NAME.search(p.name)) \
+        if (target / "assets").is_dir() else 0
+    print(f"  Current:    {target}")
+    marker = current / SOURCE_MARKER
+    print(f"  Source:     {marker.read_text().strip() if marker.exists() else '-'}")
+    print(f"  Files:      {count} precompressed, {hashed} content-hashed under assets/")
+    brotli_total = f", {br / 1e6:.1f} MB brotli" if any(target.rglob("*.br")) else ""
+    print(f"  Total:      {original / 1e6:.1f} MB, {gz / 1e6:.1f} MB gzip{brotli_total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="comfyui-web-assets",
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", default="build", choices=("build", "status"))
+    parser.add_argument("--source", type=str, default=None,
+                        help="frontend static directory (default: the installed comfyui-frontend-package)")
+    parser.add_argument("--version", type=str, default=None, help="version label for --source")
+    parser.add_argument("--force", action="store_true", help="rebuild even if current")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="parallel compression threads (default: all CPUs)")
+    args = parser.parse_args()
+
+    {"build": cmd_build, "status": cmd_status}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Cached, batched Ultralytics detection for FaceDetailer and friends.
+
+FaceDetailer runs its bbox detector once per image: each call converts the
+image to PIL and runs the YOLO model on it alone. A retried or re-upscaled
+job detects the same faces again, and the detector file is loaded again
+whenever ComfyUI's execution cache has dropped the provider's output.
+
+This extension wraps the YOLO model inside Impact Subpack's
+BBOX_DETECTOR/SEGM_DETECTOR objects. Every call the detectors make goes
+through a process-wide LRU cache keyed by sha256(image pixels), the model
+file (path, size, mtime) and the call arguments (confidence), so a repeat
+detection returns the stored boxes and masks without touching the model.
+
+- CachedUltralyticsDetector: UltralyticsDetectorProvider with the wrapped
+  model, kept loaded across jobs (one instance per model file).
+- BatchDetect: runs the detector on a whole IMAGE batch in one model call
+  per DETECT_BATCH images and fills the cache. Wire its BBOX_DETECTOR
+  output into FaceDetailer with the same threshold as bbox_threshold, and
+  FaceDetailer's per-image calls become cache hits. Works with the stock
+  provider's detectors too.
+
+Cache size: $COMFYUI_DETECTION_CACHE entries (default 256; 0 disables).
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from typing_extensions import override
+
+import folder_paths
+import nodes
+from comfy_api.latest import ComfyExtension, io
+
+DETECT_BATCH = 16
+# Arguments that do not change the result
+IGNORED_KWARGS = {"device", "verbose", "stream"}
+
+log = logging.getLogger("DetectionCache")
+
+
+class DetectionCache:
+    """LRU of slimmed Ultralytics results, shared by all wrapped models."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+CACHE = DetectionCache(int(os.environ.get("COMFYUI_DETECTION_CACHE", "256")))
+# Providers by model file, so a job after a cache flush reuses the loaded model
+PROVIDERS = {}
+
+
+def image_digest(image):
+    """sha256 of an image as the detector sees it (PIL image or HxWxC uint8 array)."""
+    pixels = np.ascontiguousarray(np.asarray(image))
+    h = hashlib.sha256(str(pixels.shape).encode())
+    h.update(pixels.data)
+    return h.hexdigest()
+
+
+def to_pil(image):
+    """IMAGE [H, W, C] float tensor -> PIL image, the same way Impact's tensor2pil converts it.
+
+    Ultralytics reads numpy arrays as BGR, so the model must get PIL images
+    here, like it does from Impact.
+    """
+    return Image.fromarray(np.clip(255. * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+
+
+def slim(result):
+    """Result on the CPU without its copy of the input image (the shape is kept)."""
+    result = result.cpu()
+    result.orig_img = np.broadcast_to(np.zeros((), dtype=np.uint8), result.orig_img.shape)
+    return result
+
+
+class CachedModel:
+    """Drop-in for an Ultralytics YOLO model whose predictions go through CACHE."""
+
+    def __init__(self, model, model_key):
+        self.model = model
+        self.model_key = model_key
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def key(self, digest, kwargs):
+        args = sorted((k, repr(v)) for k, v in kwargs.items() if k not in IGNORED_KWARGS)
+        return (self.model_key, digest, tuple(args))
+
+    def __call__(self, source, **kwargs):
+        single = not isinstance(source, (list, tuple))
+        images = [source] if single else list(source)
+        keys = [self.key(image_digest(image), kwargs) for image in images]
+        results = [CACHE.get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        for start in range(0, len(missing), DETECT_BATCH):
+            batch = missing[start:start + DETECT_BATCH]
+            predicted = self.model([images[i] for i in batch], **kwargs)
+            for i, result in zip(batch, predicted):
+                results[i] = slim(result)
+                CACHE.put(keys[i], results[i])
+        return results[:1] if single else results
+
+
+def model_key(path):
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def wrap_detector(detector, key):
+    """Wrap the YOLO model of an Impact detector in place; returns the wrapper (None if not wrappable)."""
+    model = getattr(detector, "bbox_model", None)
+    if model is None:
+        return None
+    if not isinstance(model, CachedModel):
+        detector.bbox_model = model = CachedModel(model, key)
+    return model
+
+
+def ultralytics_models():
+    names = folder_paths.folder_names_and_paths
+    bbox = ["bbox/" + x for x in folder_paths.get_filename_list("ultralytics_bbox")] \
+        if "ultralytics_bbox" in names else []
+    segm = ["segm/" + x for x in folder_paths.get_filename_list("ultralytics_segm")] \
+        if "ultralytics_segm" in names else []
+    return bbox + segm
+
+
+class CachedUltralyticsDetector(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="CachedUltralyticsDetector",
+            display_name="Ultralytics Detector (Cached)",
+            category="ImpactPack",
+            description="UltralyticsDetectorProvider whose detections are cached by image hash and model, "
+                        "with the model kept loaded between jobs.",
+            inputs=[io.Combo.Input("model_name", options=ultralytics_models())],
+            outputs=[io.Custom("BBOX_DETECTOR").Output(), io.Custom("SEGM_DETECTOR").Output()],
+        )
+
+    @classmethod
+    def execute(cls, model_name) -> io.NodeOutput:
+        provider = nodes.NODE_CLASS_MAPPINGS.get("UltralyticsDetectorProvider")
+        if provider is None:
+            raise RuntimeError("UltralyticsDetectorProvider not found (ComfyUI-Impact-Subpack is not loaded)")
+        path = folder_paths.get_full_path("ultralytics", model_name)
+        key = model_key(path)
+        if key not in PROVIDERS:
+            for stale in [k for k in PROVIDERS if k.startswith(os.path.realpath(path) + ":")]:
+                del PROVIDERS[stale]
+            bbox_detector, segm_detector = provider().doit(model_name)[:2]
+            wrapped = wrap_detector(bbox_detector, key)
+            if wrapped is not None and getattr(segm_detector, "bbox_model", None) is wrapped.model:
+                segm_detector.bbox_model = wrapped  # both share one YOLO model
+            PROVIDERS[key] = bbox_detector, segm_detector
+            log.info("Loaded %s", model_name)
+        return io.NodeOutput(*PROVIDERS[key])
+
+
+class BatchDetect(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="BatchDetect",
+            display_name="Detect Batch (Cached)",
+            category="ImpactPack",
+            description="Run a bbox detector on the whole image batch at once and cache the results, so a "
+                        "FaceDetailer using the returned detector finds them without running the model.",
+            inputs=[
+                io.Custom("BBOX_DETECTOR").Input("bbox_detector"),
+                io.Image.Input("image"),
+                io.Float.Input("threshold", default=0.5, min=0.0, max=1.0, step=0.01,
+                               tooltip="Must equal the bbox_threshold of the FaceDetailer using the detector."),
+            ],
+            outputs=[io.Custom("BBOX_DETECTOR").Output()],
+        )
+
+    @classmethod
+    def execute(cls, bbox_detector, image, threshold) -> io.NodeOutput:
+        model = getattr(bbox_detector, "bbox_model", None)
+        if model is None:
+            log.warning("%s has no YOLO model; detections are not cached", type(bbox_detector).__name__)
+            return io.NodeOutput(bbox_detector)
+        if not isinstance(model, CachedModel):
+            path = getattr(model, "ckpt_path", None)
+            key = model_key(path) if path and os.path.exists(path) else f"{type(model).__name__}:{id(model)}"
+            model = wrap_detector(bbox_detector, key)
+        hits, misses = CACHE.hits, CACHE.misses
+        # Same call as Impact's inference_bbox, one model run per DETECT_BATCH uncached images
+        model([to_pil(frame) for frame in image], conf=threshold)
+        log.info("%d images: %d cached, %d detected", image.shape[0],
+                 CACHE.hits - hits, CACHE.misses - misses)
+        return io.NodeOutput(bbox_detector)
+
+
+class DetectionCacheExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [CachedUltralyticsDetector, BatchDetect]
+
+
+async def comfy_entrypoint() -> DetectionCacheExtension:
+    return DetectionCacheExtension()
@@ -0,0 +1,59 @@
+"""Copy every prompt's execution events to comfyui-metrics websocket clients.
+
+ComfyUI sends execution_start, executing, executed, execution_cached and
+the final success/error/interrupted event only to the websocket of the
+client that queued the prompt. comfyui-metrics connects with a client id
+starting with "comfyui-metrics-"; this extension sends those events to
+such sockets as well, so the exporter sees the node timings of every
+client. Progress and preview messages are not copied. Nothing changes
+while no exporter is connected.
+
+Any websocket client can pick such an id, so the copies are stripped of
+what the exporter does not need: the outputs (file names, text) of
+executed and the node inputs and outputs of execution_error. Prompt ids,
+node ids, timings and error messages of every client are still visible
+to anyone who can reach the server.
+"""
+from typing_extensions import override
+
+from comfy_api.latest import ComfyExtension, io
+from server import PromptServer
+
+MONITOR_PREFIX = "comfyui-metrics-"
+EVENTS = frozenset(("execution_start", "execution_cached", "executing", "executed",
+                    "execution_success", "execution_error", "execution_interrupted"))
+# Payload fields that are not copied to monitors.
+PRIVATE = {"executed": ("output",), "execution_error": ("current_inputs", "current_outputs")}
+
+
+def install(server):
+    send_sync = server.send_sync
+    if getattr(send_sync, "copies_to_monitors", False):
+        return
+
+    def send_sync_with_monitors(event, data, sid=None):
+        send_sync(event, data, sid)
+        if sid is None or event not in EVENTS:
+            return
+        try:
+            monitors = [s for s in tuple(server.sockets) if s.startswith(MONITOR_PREFIX) and s != sid]
+        except RuntimeError:  # sockets changed while being copied
+            return
+        if monitors and event in PRIVATE and isinstance(data, dict):
+            data = {k: v for k, v in data.items() if k not in PRIVATE[event]}
+        for monitor in monitors:
+            send_sync(event, data, monitor)
+
+    send_sync_with_monitors.copies_to_monitors = True
+    server.send_sync = send_sync_with_monitors
+
+
+class MetricsEventsExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return []
+
+
+async def comfy_entrypoint() -> MetricsEventsExtension:
+    install(PromptServer.instance)
+    return MetricsEventsExtension()
@@ -0,0 +1,91 @@
+"""KSampler over a batch where every sample has its own seed.
+
+KSampler draws the noise for a whole latent batch from one seed, so image
+i of a batch differs from the image a batch_size 1 job with some seed
+would give. KSamplerSeedBatch takes one seed per sample and builds each
+sample's noise exactly as KSampler does for a single image with that
+seed. A seed sweep (the same graph queued N times with different seeds)
+can then run as one sampler pass over an N-image batch: comfyui-queue
+merges such jobs into one graph with this node and hands each job its
+own image back.
+
+The samples match the single-image runs up to the rounding of batched
+kernels, as long as the sampler adds no noise of its own while sampling:
+ancestral and SDE samplers draw that noise for the whole batch from the
+first seed.
+"""
+import torch
+from typing_extensions import override
+
+import comfy.sample
+import comfy.samplers
+import comfy.utils
+import latent_preview
+from comfy_api.latest import ComfyExtension, io
+
+
+def parse_seeds(seeds):
+    try:
+        return [int(s) for s in seeds.replace(",", " ").split()]
+    except ValueError:
+        raise ValueError(f"seeds must be integers separated by commas, got {seeds!r}")
+
+
+def batch_noise(latent, seeds):
+    """Noise for each sample from its own seed, as prepare_noise makes it for a batch of one."""
+    return torch.cat([comfy.sample.prepare_noise(latent[i:i + 1], seed) for i, seed in enumerate(seeds)])
+
+
+class KSamplerSeedBatch(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="KSamplerSeedBatch",
+            display_name="KSampler (Seed per Sample)",
+            category="sampling",
+            description="KSampler where each latent in the batch gets the noise of its own seed, so the batch "
+                        "reproduces separate single-image runs with those seeds.",
+            inputs=[
+                io.Model.Input("model"),
+                io.Int.Input("seed", default=0, min=0, max=0xffffffffffffffff,
+                             tooltip="Seed for noise the sampler adds while sampling (ancestral/SDE samplers)."),
+                io.String.Input("seeds", default="0",
+                                tooltip="One seed per latent in the batch, separated by commas."),
+                io.Int.Input("steps", default=20, min=1, max=10000),
+                io.Float.Input("cfg", default=8.0, min=0.0, max=100.0, step=0.1, round=0.01),
+                io.Combo.Input("sampler_name", options=comfy.samplers.KSampler.SAMPLERS),
+                io.Combo.Input("scheduler", options=comfy.samplers.KSampler.SCHEDULERS),
+                io.Conditioning.Input("positive"),
+                io.Conditioning.Input("negative"),
+                io.Latent.Input("latent_image"),
+                io.Float.Input("denoise", default=1.0, min=0.0, max=1.0, step=0.01),
+            ],
+            outputs=[io.Latent.Output()],
+        )
+
+    @classmethod
+    def execute(cls, model, seed, seeds, steps, cfg, sampler_name, scheduler, positive, negative,
+                latent_image, denoise) -> io.NodeOutput:
+        # Same as nodes.common_ksampler, except for the noise
+        latent = comfy.sample.fix_empty_latent_channels(model, latent_image["samples"])
+        seeds = parse_seeds(seeds)
+        if len(seeds) != latent.shape[0]:
+            raise ValueError(f"{len(seeds)} seeds for a batch of {latent.shape[0]} latents")
+        noise = batch_noise(latent, seeds)
+        callback = latent_preview.prepare_callback(model, steps)
+        samples = comfy.sample.sample(model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent,
+                                      denoise=denoise, noise_mask=latent_image.get("noise_mask"), callback=callback,
+                                      disable_pbar=not comfy.utils.PROGRESS_BAR_ENABLED, seed=seed)
+        out = latent_image.copy()
+        out["samples"] = samples
+        return io.NodeOutput(out)
+
+
+class SeedBatchExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [KSamplerSeedBatch]
+
+
+async def comfy_entrypoint() -> SeedBatchExtension:
+    return SeedBatchExtension()
@@ -0,0 +1,57 @@
+"""Caching headers for the precompressed frontend (comfyui-web-assets.py).
+
+ComfyUI marks .js and .css responses "no-cache", so every page load
+revalidates each bundle. Files under /assets/ are Vite output whose names
+contain a content hash (index-DlR3hbZs.js): a changed file gets a new
+name, so this extension marks them immutable for a year. Responses for
+files that have .gz/.br variants also get "Vary: Accept-Encoding", so
+shared caches keep the compressed and plain bodies apart. The encoding
+itself is chosen by aiohttp's FileResponse.
+"""
+import logging
+import re
+
+from aiohttp import web
+from typing_extensions import override
+
+from comfy_api.latest import ComfyExtension, io
+from server import PromptServer
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Vite/Rollup output names: index-DlR3hbZs.js (hash has a digit or capital)
+HASHED_NAME = re.compile(r"[-.](?=[A-Za-z0-9_]*[A-Z0-9])[A-Za-z0-9_]{8,}\.\w+$")
+COMPRESSIBLE = (".js", ".mjs", ".css", ".html", ".json", ".svg", ".map", ".txt", ".xml", ".wasm", ".ttf", ".otf")
+
+
+@web.middleware
+async def static_cache_headers(request, handler):
+    response = await handler(request)
+    if request.method not in ("GET", "HEAD") or not isinstance(response, web.FileResponse):
+        return response
+    path = request.path
+    if path.startswith("/assets/") and HASHED_NAME.search(path):
+        response.headers["Cache-Control"] = IMMUTABLE
+    if path == "/" or path.endswith(COMPRESSIBLE):
+        response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def install(app):
+    if static_cache_headers in app.middlewares:
+        return
+    try:
+        # Outermost, so these headers win over ComfyUI's own cache middleware
+        app.middlewares.insert(0, static_cache_headers)
+    except RuntimeError:  # app already frozen (server started)
+        logging.warning("[StaticAssets] server already started; caching headers not installed")
+
+
+class StaticAssetsExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return []
+
+
+async def comfy_entrypoint() -> StaticAssetsExtension:
+    install(PromptServer.instance.app)
+    return StaticAssetsExtension()
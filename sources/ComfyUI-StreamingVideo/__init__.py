@@ -0,0 +1,306 @@
+"""Long videos without holding the whole clip in RAM.
+
+VAEDecodeToDisk decodes a video latent in overlapping temporal windows,
+crossfades the overlaps and writes each finished frame to a file in the
+temp directory. Its IMAGE output is a copy-on-write memory map of that
+file, so the decoded clip lives in the page cache instead of process
+memory and peak RSS is bounded by the window size, not the clip length.
+The file is unlinked as soon as it is mapped; the space is freed with the
+tensor.
+
+StreamVideo encodes frames by streaming them into ffmpeg. Video combine
+nodes convert the whole IMAGE batch to an 8-bit array (and often a list
+of PIL images) before encoding, so a 60-second FramePack or Wan clip
+needs several extra copies of every frame in RAM. StreamVideo
+starts one ffmpeg process per video and writes rgb24 frames to its stdin
+in chunks of `chunk_frames`: the only extra memory is one chunk, however
+long the clip. Encode speed (frames per second) is logged and shown on
+the node.
+
+ffmpeg is taken from PATH, or from imageio-ffmpeg when it is installed.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import torch
+from typing_extensions import override
+
+import comfy.utils
+import folder_paths
+from comfy_api.latest import ComfyExtension, io
+
+FORMATS = {
+    "h264-mp4": ("mp4", ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "medium",
+                         "-crf", "{crf}", "-movflags", "+faststart"]),
+    "h265-mp4": ("mp4", ["-c:v", "libx265", "-pix_fmt", "yuv420p", "-preset", "medium",
+                         "-crf", "{crf}", "-tag:v", "hvc1", "-movflags", "+faststart"]),
+    "vp9-webm": ("webm", ["-c:v", "libvpx-vp9", "-pix_fmt", "yuv420p", "-crf", "{crf}", "-b:v", "0",
+                          "-row-mt", "1"]),
+    "prores-mov": ("mov", ["-c:v", "prores_ks", "-profile:v", "3", "-pix_fmt", "yuv422p10le"]),
+}
+
+log = logging.getLogger("StreamingVideo")
+
+
+def find_ffmpeg():
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        raise RuntimeError("ffmpeg not found on PATH and imageio-ffmpeg is not installed")
+
+
+def to_rgb24(frames):
+    """[N, H, W, C] float frames in 0..1 -> contiguous uint8 [N, H, W, 3] array."""
+    if frames.shape[-1] == 1:
+        frames = frames.expand(*frames.shape[:-1], 3)
+    elif frames.shape[-1] == 4:
+        frames = frames[..., :3]
+    scaled = frames.clamp(0, 1).mul_(255).round_()  # one float copy of the chunk
+    return scaled.to(torch.uint8).contiguous().cpu().numpy()
+
+
+class FFmpegStream:
+    """One ffmpeg process reading raw frames from stdin until close()."""
+
+    def __init__(self, path, width, height, frame_rate, format, crf):
+        _, codec_args = FORMATS[format]
+        self.path = path
+        self.frames = 0
+        self.encode_seconds = 0.0
+        self.closed = False
+        self.stderr = tempfile.TemporaryFile()
+        cmd = [find_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(frame_rate),
+               "-i", "-",
+               # yuv420p needs even dimensions
+               "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+               *[a.format(crf=crf) for a in codec_args], path]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.stderr)
+
+    def write(self, frames):
+        start = time.monotonic()
+        try:
+            self.proc.stdin.write(to_rgb24(frames).data)
+        except BrokenPipeError:
+            self.close()  # raises with ffmpeg's message
+        self.encode_seconds += time.monotonic() - start
+        self.frames += frames.shape[0]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        start = time.monotonic()
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        code = self.proc.wait()
+        self.encode_seconds += time.monotonic() - start
+        self.stderr.seek(0)
+        message = self.stderr.read().decode(errors="replace").strip()
+        self.stderr.close()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg exited with {code}: {message[-500:]}")
+
+    @property
+    def fps(self):
+        return self.frames / self.encode_seconds if self.encode_seconds else 0.0
+
+
+class FrameStore:
+    """Float32 frames written to an unlinked temp file, read back as a memory map."""
+
+    def __init__(self, count, height, width, channels):
+        self.shape = (count, height, width, channels)
+        temp_dir = folder_paths.get_temp_directory()
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="frames-", suffix=".f32", dir=temp_dir)
+        self.file = os.fdopen(fd, "r+b")
+        self.file.truncate(count * height * width * channels * 4)
+        self.frame_bytes = height * width * channels * 4
+
+    def write(self, index, frames):
+        # pwrite-style writes keep the store out of this process's RSS
+        self.file.seek(index * self.frame_bytes)
+        self.file.write(frames.to(device="cpu", dtype=torch.float32).contiguous().numpy().data)
+
+    def tensor(self):
+        self.file.flush()
+        frames = np.memmap(self.path, dtype=np.float32, mode="c", shape=self.shape)
+        self.file.close()
+        os.unlink(self.path)  # mapping stays valid; space is freed with the tensor
+        return torch.from_numpy(frames)
+
+
+def frame_scale(vae):
+    """Latent frame count -> decoded frame count (ComfyUI's upscale_ratio[0])."""
+    ratio = vae.upscale_ratio
+    t = ratio[0] if isinstance(ratio, (tuple, list)) else 1
+    return t if callable(t) else (lambda n: n * t)
+
+
+def window_starts(length, window, overlap):
+    overlap = min(overlap, window - 1)
+    return list(range(0, max(length - overlap, 1), window - overlap))
+
+
+def decode_to_store(vae, samples, window, overlap, progress=None):
+    """Decode [B, C, T, H, W] latents window by window into a FrameStore.
+
+    Window i covers latents [s, e) and decodes to L frames. Causal video
+    VAEs decode a window's first latent to one frame instead of four, so
+    windows are aligned at their end: frames [scale(e) - L, scale(e)).
+    Frames shared with the previous window are crossfaded linearly from
+    the previous window to the new one; only the previous window's
+    unwritten tail is held in memory.
+    """
+    if samples.dim() == 4:  # image latents: plain batches, no overlap
+        samples = samples.movedim(0, 1).unsqueeze(0)
+        overlap, scale, image_batch = 0, (lambda n: n), True
+    else:
+        scale, image_batch = frame_scale(vae), False
+        if scale(2) != 2 * scale(1):  # causal: windows need a shared latent to line up
+            overlap = max(overlap, 1)
+    batch, length = samples.shape[0], samples.shape[2]
+    starts = window_starts(length, window, overlap)
+    total = scale(length)
+    store = None
+
+    for b in range(batch):
+        cursor, tail = 0, None  # frames before cursor are written; tail starts at cursor
+        for i, s in enumerate(starts):
+            e = min(s + window, length)
+            chunk = samples[b:b + 1, :, s:e]
+            if image_batch:
+                chunk = chunk.squeeze(0).movedim(0, 1)
+            frames = vae.decode(chunk)
+            if frames.dim() == 5:
+                frames = frames[0]
+            if store is None:
+                store = FrameStore(batch * total, *frames.shape[1:])
+            base = b * total
+            offset = scale(e) - frames.shape[0]
+
+            if tail is not None:
+                if offset < cursor:  # more overlap than the tail holds
+                    frames, offset = frames[cursor - offset:], cursor
+                keep = min(offset - cursor, tail.shape[0])
+                store.write(base + cursor, tail[:keep])
+                if offset > cursor + tail.shape[0]:  # gap: hold the last frame
+                    gap = offset - cursor - tail.shape[0]
+                    store.write(base + cursor + tail.shape[0], tail[-1:].expand(gap, *tail.shape[1:]))
+                shared = min(tail.shape[0] - keep, frames.shape[0])
+                if shared > 0:
+                    w = torch.arange(1, shared + 1, dtype=torch.float32).div_(shared + 1).view(-1, 1, 1, 1)
+                    blended = tail[keep:keep + shared].float() * (1 - w) + frames[:shared].float() * w
+                    store.write(base + offset, blended)
+                frames, offset = frames[shared:], offset + max(shared, 0)
+            tail, cursor = frames, offset
+            if progress is not None:
+                progress(b * len(starts) + i + 1, batch * len(starts))
+        store.write(base + cursor, tail[:total - cursor])
+    return store.tensor()
+
+
+def output_path(filename_prefix, width, height, ext):
+    output_dir = folder_paths.get_output_directory()
+    folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(filename_prefix, output_dir, width, height)
+    name = f"{filename}_{counter:05}_.{ext}"
+    return os.path.join(folder, name), name, subfolder
+
+
+class StreamVideo(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="StreamVideo",
+            display_name="Stream Video (ffmpeg)",
+            category="image/video",
+            description="Encode frames to a video by streaming them into ffmpeg in chunks, "
+                        "so memory use does not grow with clip length.",
+            inputs=[
+                io.Image.Input("images"),
+                io.Float.Input("frame_rate", default=24.0, min=1.0, max=240.0, step=1.0),
+                io.String.Input("filename_prefix", default="video/ComfyUI"),
+                io.Combo.Input("format", options=list(FORMATS), default="h264-mp4"),
+                io.Int.Input("crf", default=19, min=0, max=63,
+                             tooltip="Quality: lower is better and larger (ignored for ProRes)."),
+                io.Int.Input("chunk_frames", default=16, min=1, max=1024,
+                             tooltip="Frames converted and written to ffmpeg at a time."),
+            ],
+            outputs=[io.String.Output(display_name="filename")],
+            is_output_node=True,
+        )
+
+    @classmethod
+    def execute(cls, images, frame_rate, filename_prefix, format, crf, chunk_frames) -> io.NodeOutput:
+        total, height, width = images.shape[0], images.shape[1], images.shape[2]
+        path, name, subfolder = output_path(filename_prefix, width, height, FORMATS[format][0])
+        stream = FFmpegStream(path, width, height, frame_rate, format, crf)
+        pbar = comfy.utils.ProgressBar(total)
+        try:
+            for start in range(0, total, chunk_frames):
+                chunk = images[start:start + chunk_frames]
+                stream.write(chunk)
+                pbar.update(chunk.shape[0])
+        finally:
+            stream.close()
+        summary = f"{stream.frames} frames in {stream.encode_seconds:.1f}s ({stream.fps:.1f} fps)"
+        log.info("Encoded %s: %s", name, summary)
+        return io.NodeOutput(path, ui={
+            "images": [{"filename": name, "subfolder": subfolder, "type": "output"}],
+            "animated": (True,),
+            "text": [summary],
+        })
+
+
+class VAEDecodeToDisk(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="VAEDecodeToDisk",
+            display_name="VAE Decode (Chunked, to Disk)",
+            category="latent",
+            description="Decode a video latent in overlapping temporal windows and keep the frames in a "
+                        "memory-mapped file, so peak memory follows the window size instead of the clip length.",
+            inputs=[
+                io.Latent.Input("samples"),
+                io.Vae.Input("vae"),
+                io.Int.Input("window_latents", default=8, min=2, max=256,
+                             tooltip="Latent frames decoded at once."),
+                io.Int.Input("overlap_latents", default=1, min=0, max=64,
+                             tooltip="Latent frames shared by neighbouring windows and crossfaded."),
+            ],
+            outputs=[io.Image.Output()],
+        )
+
+    @classmethod
+    def execute(cls, samples, vae, window_latents, overlap_latents) -> io.NodeOutput:
+        pbar = comfy.utils.ProgressBar(1)
+        start = time.monotonic()
+        images = decode_to_store(vae, samples["samples"], window_latents, overlap_latents, pbar.update_absolute)
+        log.info("Decoded %d frames in %d windows in %.1fs", images.shape[0], pbar.total, time.monotonic() - start)
+        return io.NodeOutput(images)
+
+
+class StreamingVideoExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [
+            StreamVideo,
+            VAEDecodeToDisk,
+        ]
+
+
+async def comfy_entrypoint() -> StreamingVideoExtension:
+    return StreamingVideoExtension()
@@ -0,0 +1,355 @@
+"""Text encoding with a persistent on-disk conditioning cache.
+
+FLUX (t5xxl), SD3.5 and Wan 2.2 (umt5_xxl) jobs spend much of a cold start
+loading and running the text encoder for prompts that were encoded many
+times before. CachedTextEncode takes its CLIP input lazily: on a cache hit
+the input is never requested, so the loader upstream does not run and the
+conditioning is read back from disk. On a miss the loader's output is
+requested like CLIPTextEncode would, so ComfyUI's execution cache keeps
+the encoders loaded between the prompts of a sweep, the prompt is encoded
+and the result stored.
+
+Only a CLIP input connected straight to CLIPLoader, DualCLIPLoader,
+TripleCLIPLoader or QuadrupleCLIPLoader is cached, because the key is
+built from that loader's files and settings. Any other source (a
+checkpoint's CLIP, a LoRA in between) is encoded every time.
+
+Cache layout ($COMFYUI_TEXT_CACHE_DIR, default
+$FLOX_ENV_CACHE/text-encoder-cache):
+
+    index.bin           memory-mapped table: key digest, bytes, last access
+    hashes.json         sha256 of encoder files, memoized by size and mtime
+    <key>.safetensors   conditioning tensors plus JSON metadata
+
+Keys are sha256(ComfyUI version, embeddings directory listing, loader
+type, encoder file hashes, other loader inputs, prompt). Entries are
+evicted least recently used first once the cache exceeds
+$COMFYUI_TEXT_CACHE_BUDGET (default 10G). One ComfyUI process per cache
+directory.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from typing_extensions import override
+
+import folder_paths
+from comfy_api.latest import ComfyExtension, io
+
+try:
+    from comfyui_version import __version__ as COMFYUI_VERSION
+except ImportError:
+    COMFYUI_VERSION = "unknown"
+
+FORMAT_VERSION = "1"
+INDEX_MAGIC = b"TECIDX01"
+INDEX_HEADER = 16
+RECORD = struct.Struct("<32sQd")  # key digest, entry bytes, last access time
+INDEX_SLOTS = 65536
+EMPTY_KEY = bytes(32)
+HASH_CHUNK = 16 * 1024 * 1024
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+# Loaders whose output is keyed by these text_encoders file inputs
+LOADERS = {
+    "CLIPLoader": ("clip_name",),
+    "DualCLIPLoader": ("clip_name1", "clip_name2"),
+    "TripleCLIPLoader": ("clip_name1", "clip_name2", "clip_name3"),
+    "QuadrupleCLIPLoader": ("clip_name1", "clip_name2", "clip_name3", "clip_name4"),
+}
+
+log = logging.getLogger("TextEncodeCache")
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def get_cache_dir():
+    if os.environ.get("COMFYUI_TEXT_CACHE_DIR"):
+        return Path(os.environ["COMFYUI_TEXT_CACHE_DIR"])
+    if os.environ.get("FLOX_ENV_CACHE"):
+        return Path(os.environ["FLOX_ENV_CACHE"]) / "text-encoder-cache"
+    return Path.home() / ".cache/comfyui/text-encoder-cache"
+
+
+class EncoderHashes:
+    """sha256 of encoder files, recomputed only when size or mtime change."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.known = json.load(f)
+        except (OSError, ValueError):
+            self.known = {}
+
+    def get(self, file_path):
+        st = os.stat(file_path)
+        entry = self.known.get(file_path)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return entry["sha256"]
+        log.info("Hashing text encoder %s (once per file version)", os.path.basename(file_path))
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        self.known[file_path] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest.hexdigest()}
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.known, f, indent=2)
+        os.replace(tmp, self.path)
+        return self.known[file_path]["sha256"]
+
+
+class ConditioningCache:
+    """Conditioning entries on disk with an mmap'd fixed-slot LRU index."""
+
+    def __init__(self, cache_dir, budget):
+        self.dir = cache_dir
+        self.budget = budget
+        self.dir.mkdir(parents=True, exist_ok=True)
+        index_path = self.dir / "index.bin"
+        size = INDEX_HEADER + INDEX_SLOTS * RECORD.size
+        if not index_path.exists() or index_path.stat().st_size != size:
+            with open(index_path, "wb") as f:
+                f.write(INDEX_MAGIC.ljust(INDEX_HEADER, b"\0"))
+                f.truncate(size)
+        self._file = open(index_path, "r+b")
+        self.index = mmap.mmap(self._file.fileno(), size)
+        if self.index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            self.index[:] = bytes(size)
+            self.index[:len(INDEX_MAGIC)] = INDEX_MAGIC
+
+        # In-memory view of the index; slots whose file is gone are cleared
+        self.slots, self.free, self.bytes = {}, [], 0
+        for slot in range(INDEX_SLOTS):
+            key, nbytes, _ = self._read(slot)
+            if key == EMPTY_KEY:
+                self.free.append(slot)
+            elif not self.entry_path(key.hex()).exists():
+                self._write(slot, EMPTY_KEY, 0, 0.0)
+                self.free.append(slot)
+            else:
+                self.slots[key] = slot
+                self.bytes += nbytes
+        self.free.reverse()
+
+    def _read(self, slot):
+        return RECORD.unpack_from(self.index, INDEX_HEADER + slot * RECORD.size)
+
+    def _write(self, slot, key, nbytes, atime):
+        RECORD.pack_into(self.index, INDEX_HEADER + slot * RECORD.size, key, nbytes, atime)
+
+    def entry_path(self, key_hex):
+        return self.dir / f"{key_hex}.safetensors"
+
+    def contains(self, key_hex):
+        return bytes.fromhex(key_hex) in self.slots and self.entry_path(key_hex).exists()
+
+    def get(self, key_hex):
+        key = bytes.fromhex(key_hex)
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        try:
+            conditioning = load_conditioning(self.entry_path(key_hex))
+        except Exception as e:
+            log.warning("Dropping unreadable cache entry %s: %s", key_hex, e)
+            self._remove(key)
+            return None
+        _, nbytes, _ = self._read(slot)
+        self._write(slot, key, nbytes, time.time())
+        return conditioning
+
+    def put(self, key_hex, conditioning):
+        path = self.entry_path(key_hex)
+        if not save_conditioning(path, conditioning):
+            return
+        key = bytes.fromhex(key_hex)
+        if key in self.slots:
+            slot = self.slots[key]
+            self.bytes -= self._read(slot)[1]
+        else:
+            if not self.free:
+                self._evict_one()
+            slot = self.free.pop()
+            self.slots[key] = slot
+        nbytes = path.stat().st_size
+        self._write(slot, key, nbytes, time.time())
+        self.bytes += nbytes
+        while self.bytes > self.budget and len(self.slots) > 1:
+            self._evict_one(exclude=key)
+        self.index.flush()
+
+    def _evict_one(self, exclude=None):
+        victim = min((k for k in self.slots if k != exclude), key=lambda k: self._read(self.slots[k])[2])
+        self._remove(victim)
+
+    def _remove(self, key):
+        slot = self.slots.pop(key)
+        self.bytes -= self._read(slot)[1]
+        self._write(slot, EMPTY_KEY, 0, 0.0)
+        self.free.append(slot)
+        self.entry_path(key.hex()).unlink(missing_ok=True)
+
+
+def save_conditioning(path, conditioning):
+    """Store [[tensor, {extras}], ...] as safetensors; False if not serializable."""
+    import torch
+    from safetensors.torch import save_file
+
+    tensors, meta = {}, []
+    for i, (cond, extras) in enumerate(conditioning):
+        tensors[f"{i}.cond"] = cond.detach().to("cpu").contiguous()
+        plain = {}
+        for name, value in extras.items():
+            if isinstance(value, torch.Tensor):
+                tensors[f"{i}.{name}"] = value.detach().to("cpu").contiguous()
+            elif value is None or isinstance(value, (bool, int, float, str)):
+                plain[name] = value
+            else:
+                # Hooks, callables and other objects cannot be restored from disk
+                return False
+        meta.append(plain)
+    tmp = path.with_name(f".{path.name}.tmp")
+    save_file(tensors, str(tmp), metadata={"conditioning": json.dumps(meta), "version": FORMAT_VERSION})
+    os.replace(tmp, path)
+    return True
+
+
+def load_conditioning(path):
+    from safetensors import safe_open
+
+    with safe_open(str(path), framework="pt", device="cpu") as f:
+        meta = json.loads(f.metadata()["conditioning"])
+        names = list(f.keys())
+        conditioning = []
+        for i, plain in enumerate(meta):
+            extras = dict(plain)
+            for name in names:
+                prefix, _, key = name.partition(".")
+                if prefix == str(i) and key != "cond":
+                    extras[key] = f.get_tensor(name)
+            conditioning.append([f.get_tensor(f"{i}.cond"), extras])
+    return conditioning
+
+
+_cache = None
+_hashes = None
+
+
+def get_cache():
+    global _cache, _hashes
+    if _cache is None:
+        cache_dir = get_cache_dir()
+        budget = parse_size(os.environ.get("COMFYUI_TEXT_CACHE_BUDGET", "10G"))
+        _cache = ConditioningCache(cache_dir, budget)
+        _hashes = EncoderHashes(cache_dir / "hashes.json")
+    return _cache, _hashes
+
+
+def embeddings_listing():
+    """Name, size and mtime of every file in the embeddings directories."""
+    listing = []
+    for root in folder_paths.get_folder_paths("embeddings"):
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                listing.append(f"{os.path.relpath(path, root)}:{st.st_size}:{st.st_mtime}")
+    return sorted(listing)
+
+
+def cache_key(prompt, unique_id, text, hashes):
+    """Key for the conditioning of text, or None if the CLIP input is not a known loader."""
+    node = (prompt or {}).get(str(unique_id), {})
+    link = node.get("inputs", {}).get("clip")
+    if not isinstance(link, list) or len(link) != 2:
+        return None
+    loader = prompt.get(str(link[0]), {})
+    files = LOADERS.get(loader.get("class_type"))
+    if files is None:
+        return None
+
+    key = hashlib.sha256()
+    for part in (FORMAT_VERSION, COMFYUI_VERSION, *embeddings_listing(), loader["class_type"]):
+        key.update(part.encode() + b"\0")
+    for name, value in sorted(loader.get("inputs", {}).items()):
+        if isinstance(value, list):
+            return None  # computed by another node
+        if name in files:
+            path = folder_paths.get_full_path("text_encoders", value)
+            if path is None:
+                return None
+            value = hashes.get(path)
+        key.update(f"{name}={value}".encode() + b"\0")
+    key.update(text.encode())
+    return key.hexdigest()
+
+
+class CachedTextEncode(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="CachedTextEncode",
+            display_name="Text Encode (Disk Cache)",
+            category="advanced/conditioning",
+            description="Encode a prompt like CLIPTextEncode, reusing conditioning cached on disk. "
+                        "On a cache hit the CLIP loader does not run.",
+            inputs=[
+                io.Clip.Input("clip", lazy=True),
+                io.String.Input("text", multiline=True, dynamic_prompts=True),
+            ],
+            outputs=[io.Conditioning.Output()],
+            hidden=[io.Hidden.prompt, io.Hidden.unique_id],
+        )
+
+    @classmethod
+    def check_lazy_status(cls, text, clip=None):
+        cache, hashes = get_cache()
+        key_hex = cache_key(cls.hidden.prompt, cls.hidden.unique_id, text, hashes)
+        if clip is None and (key_hex is None or not cache.contains(key_hex)):
+            return ["clip"]
+        return []
+
+    @classmethod
+    def execute(cls, text, clip=None) -> io.NodeOutput:
+        cache, hashes = get_cache()
+        key_hex = cache_key(cls.hidden.prompt, cls.hidden.unique_id, text, hashes)
+        if key_hex is not None:
+            conditioning = cache.get(key_hex)
+            if conditioning is not None:
+                log.info("Text encoder cache hit")
+                return io.NodeOutput(conditioning)
+        if clip is None:
+            raise RuntimeError("Text encoder cache entry became unreadable; queue the prompt again")
+
+        conditioning = clip.encode_from_tokens_scheduled(clip.tokenize(text))
+        if key_hex is not None:
+            try:
+                cache.put(key_hex, conditioning)
+            except OSError as e:
+                log.warning("Could not store text encoder cache entry: %s", e)
+        return io.NodeOutput(conditioning)
+
+
+class TextEncodeCacheExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [
+            CachedTextEncode,
+        ]
+
+
+async def comfy_entrypoint() -> TextEncodeCacheExtension:
+    return TextEncodeCacheExtension()
@@ -0,0 +1,266 @@
+"""Tiled upscale and img2img refine with batched tiles.
+
+The upscale workflows use UltimateSDUpscale, which samples one tile at a
+time: a 2x SDXL upscale of a 1024 image is four sequential sampler runs,
+each too small to keep the GPU busy. Sampling the whole image at once
+instead runs out of memory at large sizes.
+
+TiledUpscaleRefine upscales the image (with an upscale model, then
+Lanczos to the exact factor), cuts it into equally sized overlapping
+tiles and refines them in batches: one VAE encode, one sampler run and
+one VAE decode per batch. Tiles are blended with feathered masks that
+ramp linearly across the overlap, so seams do not show.
+
+With tile_size or batch_size at 0 they are chosen from free memory: the
+tile is the model's native resolution (512 for SD1.5, 1024 otherwise),
+shrunk until one tile fits, and the batch is as many tiles as fit at once
+after the model weights. Each tile gets its own initial noise (seed, tile
+index), and a tile that covers the whole image gives exactly the untiled
+result. With samplers that add no noise while sampling (euler, dpmpp_2m,
+uni_pc, ...) the result does not depend on the batch size either.
+Ancestral and SDE samplers draw their per-step noise for a whole batch
+from one seed; each batch uses seed + its first tile index, so tiles do
+not share that noise, but the result changes with the batch size.
+comfyui-tile-check verifies the exact cases and reports the rest.
+"""
+import logging
+import math
+
+import torch
+import torch.nn.functional as F
+from typing_extensions import override
+
+import comfy.latent_formats
+import comfy.model_management
+import comfy.sample
+import comfy.samplers
+import comfy.utils
+from comfy_api.latest import ComfyExtension, io
+
+MAX_BATCH = 16
+MIN_TILE = 256
+UPSCALE_TILE = 512
+UPSCALE_OVERLAP = 32
+
+log = logging.getLogger("TiledUpscale")
+
+
+def tile_starts(size, tile, overlap, align):
+    """Tile offsets along one axis, multiples of align, overlapping by at least overlap."""
+    if size <= tile:
+        return [0]
+    stride = max(tile - overlap, align)
+    count = math.ceil((size - tile) / stride) + 1
+    while True:
+        step = (size - tile) / (count - 1)
+        starts = sorted({min(size - tile, round(i * step / align) * align) for i in range(count)})
+        # Snapping to align can widen a gap; add a tile until none exceeds the stride
+        if all(b - a <= stride for a, b in zip(starts, starts[1:])):
+            return starts
+        count += 1
+
+
+def feather_mask(tile_h, tile_w, y, x, height, width, feather):
+    """[tile_h, tile_w, 1] weights ramping up over feather pixels on edges shared with other tiles."""
+    def ramp(length, start, end):
+        weights = torch.ones(length)
+        n = min(feather, length // 2)
+        if n > 0:
+            rise = (torch.arange(n, dtype=torch.float32) + 0.5) / n
+            if start:
+                weights[:n] = rise
+            if end:
+                weights[-n:] = torch.minimum(weights[-n:], rise.flip(0))
+        return weights
+
+    wy = ramp(tile_h, y > 0, y + tile_h < height)
+    wx = ramp(tile_w, x > 0, x + tile_w < width)
+    return (wy[:, None] * wx[None, :]).unsqueeze(-1)
+
+
+def run_tiled(image, tile_w, tile_h, overlap, batch_size, process, align=8, progress=None):
+    """Blend process() over overlapping tiles of one [H, W, C] image.
+
+    process(tiles, indices) gets [N, tile_h, tile_w, C] tiles and their
+    indices in the grid and returns tiles of the same size. The image is
+    padded (edge pixels repeated) to a multiple of align for the VAE.
+    """
+    height, width, channels = image.shape
+    pad_h, pad_w = -height % align, -width % align
+    if pad_h or pad_w:
+        image = F.pad(image.movedim(-1, 0).unsqueeze(0), (0, pad_w, 0, pad_h), mode="replicate")[0].movedim(0, -1)
+    padded_h, padded_w = height + pad_h, width + pad_w
+    tile_h, tile_w = min(tile_h, padded_h), min(tile_w, padded_w)
+    positions = [(y, x) for y in tile_starts(padded_h, tile_h, overlap, align)
+                 for x in tile_starts(padded_w, tile_w, overlap, align)]
+
+    out = torch.zeros(padded_h, padded_w, channels)
+    weight = torch.zeros(padded_h, padded_w, 1)
+    for first in range(0, len(positions), batch_size):
+        group = positions[first:first + batch_size]
+        tiles = torch.stack([image[y:y + tile_h, x:x + tile_w] for y, x in group])
+        result = process(tiles, list(range(first, first + len(group)))).to(device="cpu", dtype=torch.float32)
+        for (y, x), tile in zip(group, result):
+            mask = feather_mask(tile_h, tile_w, y, x, padded_h, padded_w, overlap)
+            out[y:y + tile_h, x:x + tile_w] += tile * mask
+            weight[y:y + tile_h, x:x + tile_w] += mask
+        if progress is not None:
+            progress(len(group))
+    return (out / weight)[:height, :width]
+
+
+def native_tile(model):
+    return 512 if isinstance(model.model.latent_format, comfy.latent_formats.SD15) else 1024
+
+
+def tile_memory(model, vae, tile_w, tile_h):
+    """Peak bytes for one tile: the larger of sampling (cond + uncond) and VAE encode/decode."""
+    ratio = vae.spacial_compression_encode()
+    latent = [1, vae.latent_channels, tile_h // ratio, tile_w // ratio]
+    sampling = model.model.memory_required([2] + latent[1:])
+    encode = vae.memory_used_encode([1, 3, tile_h, tile_w], vae.vae_dtype)
+    decode = vae.memory_used_decode(latent, vae.vae_dtype)
+    return max(sampling, encode, decode)
+
+
+def memory_budget(model):
+    """Free bytes on the torch device once the model's remaining weights are loaded."""
+    device = comfy.model_management.get_torch_device()
+    free = comfy.model_management.get_free_memory(device)
+    unloaded = max(0, model.model_size() - model.loaded_size())
+    return max(0, free - unloaded - comfy.model_management.minimum_inference_memory())
+
+
+def choose_tiling(model, vae, width, height, tile_size, batch_size, overlap):
+    """(tile_w, tile_h, overlap, batch, tiles, budget); tile_size/batch_size 0 means derive from memory."""
+    align = vae.spacial_compression_encode()
+    padded_w, padded_h = width + -width % align, height + -height % align
+    budget = memory_budget(model)
+    if tile_size <= 0:
+        tile_size = native_tile(model)
+        while tile_size > MIN_TILE and tile_memory(model, vae, min(tile_size, padded_w),
+                                                   min(tile_size, padded_h)) > budget:
+            tile_size -= 128
+    tile_w, tile_h = min(tile_size, padded_w), min(tile_size, padded_h)
+    overlap = min(overlap, min(tile_w, tile_h) // 2)
+    tiles = len(tile_starts(padded_w, tile_w, overlap, align)) * len(tile_starts(padded_h, tile_h, overlap, align))
+    if batch_size <= 0:
+        batch_size = min(MAX_BATCH, max(1, int(budget // tile_memory(model, vae, tile_w, tile_h))))
+    return tile_w, tile_h, overlap, max(1, min(batch_size, tiles)), tiles, budget
+
+
+def refiner(model, vae, positive, negative, seed, steps, cfg, sampler_name, scheduler, denoise, index_offset=0):
+    """process() for run_tiled: encode, sample and decode a batch of tiles."""
+    def process(tiles, indices):
+        latent = vae.encode(tiles)
+        batch_inds = [index_offset + i for i in indices]
+        # As nodes.common_ksampler, but the sampler's own noise (ancestral/SDE) is seeded per batch
+        noise = comfy.sample.prepare_noise(latent, seed, batch_inds)
+        samples = comfy.sample.sample(model, noise, steps, cfg, sampler_name, scheduler, positive, negative,
+                                      latent, denoise=denoise, disable_pbar=True,
+                                      seed=(seed + batch_inds[0]) % 2 ** 64)
+        return vae.decode(samples)
+    return process
+
+
+def upscale_with_model(upscale_model, image):
+    """Same as ImageUpscaleWithModel: tiled, halving the tile size on OOM."""
+    device = comfy.model_management.get_torch_device()
+    memory_required = comfy.model_management.module_size(upscale_model.model)
+    memory_required += (UPSCALE_TILE * UPSCALE_TILE * 3) * image.element_size() * max(upscale_model.scale, 1.0) * 384.0
+    memory_required += image.nelement() * image.element_size()
+    comfy.model_management.free_memory(memory_required, device)
+    upscale_model.to(device)
+    in_img = image.movedim(-1, -3).to(device)
+    tile = UPSCALE_TILE
+    try:
+        while True:
+            try:
+                steps = in_img.shape[0] * comfy.utils.get_tiled_scale_steps(
+                    in_img.shape[3], in_img.shape[2], tile_x=tile, tile_y=tile, overlap=UPSCALE_OVERLAP)
+                pbar = comfy.utils.ProgressBar(steps)
+                out = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile,
+                                              overlap=UPSCALE_OVERLAP, upscale_amount=upscale_model.scale, pbar=pbar)
+                break
+            except comfy.model_management.OOM_EXCEPTION:
+                tile //= 2
+                if tile < 128:
+                    raise
+    finally:
+        upscale_model.to("cpu")
+    return torch.clamp(out.movedim(-3, -1), min=0, max=1.0)
+
+
+def resize(image, width, height):
+    if image.shape[2] == width and image.shape[1] == height:
+        return image
+    return comfy.utils.common_upscale(image.movedim(-1, 1), width, height, "lanczos", "disabled").movedim(1, -1)
+
+
+class TiledUpscaleRefine(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="TiledUpscaleRefine",
+            display_name="Tiled Upscale & Refine (Batched)",
+            category="image/upscaling",
+            description="Upscale, then refine overlapping tiles in batches sized to free memory, "
+                        "blended with feathered masks.",
+            inputs=[
+                io.Image.Input("image"),
+                io.Model.Input("model"),
+                io.Conditioning.Input("positive"),
+                io.Conditioning.Input("negative"),
+                io.Vae.Input("vae"),
+                io.Float.Input("upscale_by", default=2.0, min=0.05, max=8.0, step=0.05),
+                io.Int.Input("seed", default=0, min=0, max=0xffffffffffffffff, control_after_generate=True),
+                io.Int.Input("steps", default=20, min=1, max=10000),
+                io.Float.Input("cfg", default=7.0, min=0.0, max=100.0, step=0.1, round=0.01),
+                io.Combo.Input("sampler_name", options=comfy.samplers.KSampler.SAMPLERS),
+                io.Combo.Input("scheduler", options=comfy.samplers.KSampler.SCHEDULERS),
+                io.Float.Input("denoise", default=0.25, min=0.0, max=1.0, step=0.01),
+                io.Int.Input("tile_size", default=0, min=0, max=4096, step=8,
+                             tooltip="Tile width and height in pixels; 0 picks the model's native size, "
+                                     "reduced until a tile fits in free memory."),
+                io.Int.Input("tile_overlap", default=64, min=0, max=512, step=8,
+                             tooltip="Pixels shared by neighbouring tiles and feathered together."),
+                io.Int.Input("batch_size", default=0, min=0, max=64,
+                             tooltip="Tiles sampled at once; 0 fits as many as free memory allows."),
+                io.UpscaleModel.Input("upscale_model", optional=True),
+            ],
+            outputs=[io.Image.Output()],
+        )
+
+    @classmethod
+    def execute(cls, image, model, positive, negative, vae, upscale_by, seed, steps, cfg, sampler_name,
+                scheduler, denoise, tile_size, tile_overlap, batch_size, upscale_model=None) -> io.NodeOutput:
+        width, height = round(image.shape[2] * upscale_by), round(image.shape[1] * upscale_by)
+        if upscale_model is not None:
+            image = upscale_with_model(upscale_model, image)
+        image = resize(image[..., :3], width, height)
+        if denoise <= 0:
+            return io.NodeOutput(image)
+
+        align = vae.spacial_compression_encode()
+        tile_w, tile_h, overlap, batch, tiles, budget = choose_tiling(model, vae, width, height, tile_size,
+                                                                      batch_size, tile_overlap)
+        log.info("%dx%d: %d tiles of %dx%d, %d per batch (%.1f GB free for sampling)",
+                 width, height, tiles, tile_w, tile_h, batch, budget / 1024 ** 3)
+
+        pbar = comfy.utils.ProgressBar(tiles * image.shape[0])
+        results = []
+        for b in range(image.shape[0]):
+            process = refiner(model, vae, positive, negative, seed, steps, cfg, sampler_name, scheduler,
+                              denoise, index_offset=b * tiles)
+            results.append(run_tiled(image[b], tile_w, tile_h, overlap, batch, process, align, pbar.update))
+        return io.NodeOutput(torch.stack(results))
+
+
+class TiledUpscaleExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [TiledUpscaleRefine]
+
+
+async def comfy_entrypoint() -> TiledUpscaleExtension:
+    return TiledUpscaleExtension()